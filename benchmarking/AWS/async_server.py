@@ -0,0 +1,204 @@
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps, loads
+
+import uvicorn
+
+from idp_wrapper import IdPWrapper
+
+sys.path.append("../../src")
+
+from helper import BpGroupHelper, pack, unpack
+from msm import precompute_vk
+from rp import RP
+from request import Request
+from credproof import CredProof
+from wire import CONTENT_TYPE, encode_sig
+
+"""
+Async (ASGI) version of server.py with the same routes. The event loop only reads the requests and writes the answers,
+the decoding and the crypto run on a pool of worker threads. bplib calls into C through cffi which releases the GIL,
+so the pairings of different requests overlap and a slow provide_id does not block the health checks
+The request and the proof can also be sent in the binary format of wire.py with Content-Type CONTENT_TYPE, and a client
+that accepts CONTENT_TYPE gets the signature back in binary
+"""
+
+WORKERS = os.cpu_count() or 1  # The threads that run the crypto
+MAX_PENDING = 64  # The requests waiting for or running on a worker, after that we answer 503 straight away
+MAX_CONNECTIONS = 256  # The open connections, after that uvicorn answers 503
+MAX_BODY = 2 ** 20  # The maximum size of a request body in bytes
+KEEP_ALIVE = 30  # Seconds to keep an idle connection open
+JSON = "application/json"
+
+# Static fields
+keys = None  # (idp, aggr_vk), replaced as a whole by /idp/set
+rp = RP(b"Domain")
+pool = None
+pending = 0
+
+# Start the lib
+BpGroupHelper.setup(4)
+
+
+# make packet for client
+def format(load):
+    return dumps({
+        "status": "OK",
+        "load": load,
+    })
+
+
+"""
+------------------------------------ Wrappers for the functionality --------------------------------------------------
+"""
+
+
+def get_keys():
+    """
+    :return: The idp and the aggr_vk of the same /idp/set, read once per request
+    """
+    current = keys
+    if current is None:
+        raise Exception("The keys are not set, call /idp/set first")
+    return current
+
+
+def set_keys_wrapper(body, binary, accept_binary):
+    """ Just sets the keys"""
+    global keys
+    data = loads(body.decode("utf-8"))
+    new_idp = IdPWrapper().getIdP(unpack(data["sk"]), unpack(data["vk"]))
+    new_aggr_vk = unpack(data["aggr_vk"])
+    precompute_vk(new_aggr_vk)
+    # One assignment of both, a request on another worker gets either the old pair or the new one
+    keys = (new_idp, new_aggr_vk)
+    return JSON, dumps({"status": "OK"}).encode()
+
+
+def provide_id_wrapper(body, binary, accept_binary):
+    """Return the sig"""
+    idp, aggr_vk = get_keys()
+    if binary:
+        id_request = Request.from_bytes(body)
+    else:
+        id_request = Request.from_json(loads(body.decode("utf-8"))["request"])
+    sig_prime = idp.provide_id(id_request, aggr_vk)
+    if accept_binary:
+        if sig_prime == 0:
+            return JSON, dumps({"status": "Request Rejected"}).encode()  # There is no sig to encode
+        return CONTENT_TYPE, encode_sig(sig_prime)
+    return JSON, format(pack(sig_prime)).encode()
+
+
+def verify_id_wrapper(body, binary, accept_binary):
+    _, aggr_vk = get_keys()
+    if binary:
+        id_proof = CredProof.from_bytes(body)
+    else:
+        id_proof = CredProof.from_json(loads(body.decode("utf-8"))["proof"])
+    if rp.verify_id(id_proof, aggr_vk):
+        return JSON, dumps({"status": "OK"}).encode()
+    return JSON, dumps({"Status": "Verification Failed"}).encode()
+
+
+def handle(wrapper, body, binary, accept_binary):
+    """
+    Runs on a worker thread. Same error answers as the Flask server
+    """
+    try:
+        return wrapper(memoryview(body) if binary else body, binary, accept_binary)
+    except KeyError as e:
+        return JSON, dumps({"status": "Key ERROR", "message": e.args}).encode()
+    except Exception as e:
+        return JSON, dumps({"status": "ERROR", "message": e.args}).encode()
+
+
+"""
+------------------------------------ Web App ---------------------------------------------------------
+"""
+ROUTES = {
+    "/idp/set": set_keys_wrapper,
+    "/idp/provideid": provide_id_wrapper,
+    "/rp/verifyid": verify_id_wrapper,
+}
+
+
+async def send_response(send, body, status=200, content_type=JSON):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def read_body(receive):
+    """
+    :return: The body of the request or None if it is larger than MAX_BODY
+    """
+    body = bytearray()
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY:
+            return None
+        if not message.get("more_body", False):
+            return bytes(body)
+
+
+async def lifespan(receive, send):
+    global pool
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            pool = ThreadPoolExecutor(WORKERS)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            pool.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    global pending
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    path, method = scope["path"], scope["method"]
+    # /
+    # Return just ok to make sure the server is running fine, never waits for the workers
+    if path == "/":
+        return await send_response(send, dumps({"status": "OK"}).encode())
+    wrapper = ROUTES.get(path)
+    if wrapper is None:
+        return await send_response(send, dumps({"status": "ERROR", "message": "Not found."}).encode(), 404)
+    if method != "POST":
+        return await send_response(send, dumps({"status": "ERROR", "message": "Use POST method."}).encode())
+    body = await read_body(receive)
+    if body is None:
+        return await send_response(send, dumps({"status": "ERROR", "message": "Request too large."}).encode(), 413)
+    # Bounded queue of the workers, when it is full we refuse the request instead of letting the latency grow
+    if pending >= MAX_PENDING:
+        return await send_response(send, dumps({"status": "ERROR", "message": "Server busy."}).encode(), 503)
+    headers = dict(scope["headers"])
+    binary = headers.get(b"content-type", b"").split(b";")[0].strip() == CONTENT_TYPE.encode()
+    accept_binary = CONTENT_TYPE.encode() in headers.get(b"accept", b"")
+    pending += 1
+    try:
+        content_type, answer = await asyncio.get_running_loop().run_in_executor(pool, handle, wrapper, body, binary,
+                                                                                 accept_binary)
+    finally:
+        pending -= 1
+    await send_response(send, answer, content_type=content_type)
+
+
+"""
+------------------------------------ start of the program ---------------------------------------------------------
+"""
+if __name__ == "__main__":
+    port = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        WORKERS = int(sys.argv[2])
+    uvicorn.run(app, host="0.0.0.0", port=port, timeout_keep_alive=KEEP_ALIVE, limit_concurrency=MAX_CONNECTIONS,
+                log_level="warning")
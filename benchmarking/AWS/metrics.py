@@ -0,0 +1,167 @@
+import threading
+
+"""
+Latency histograms and request counters of the server. The histograms are HDR style: the values are whole
+microseconds, every power of two is split in SUB_BUCKETS / 2 buckets so the error of a value is below 1 / 64 at any
+scale, and the buckets are fixed so histograms can be added together and kept in shared memory between the workers
+of the pre-fork mode
+"""
+
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 2 ** SUB_BUCKET_BITS  # Every value below this has its own bucket
+HALF = SUB_BUCKETS // 2
+MAX_SHIFT = 25  # Values up to 2^32 us, about an hour, larger ones go to the last bucket
+BUCKETS = SUB_BUCKETS + MAX_SHIFT * HALF
+PERCENTILES = [50, 90, 99, 99.9]
+TIME_UNIT = 10 ** 6  # For us
+
+
+def bucket(value):
+    """
+    :param value: A value in us as an int
+    :return: The index of its bucket
+    """
+    if value < SUB_BUCKETS:
+        return max(value, 0)
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return min(SUB_BUCKETS + (shift - 1) * HALF + (value >> shift) - HALF, BUCKETS - 1)
+
+
+def bucket_value(index):
+    """
+    :param index: The index of a bucket
+    :return: The largest value of the bucket
+    """
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index - SUB_BUCKETS) // HALF + 1
+    return (((index - SUB_BUCKETS) % HALF + HALF + 1) << shift) - 1
+
+
+class Histogram:
+    """
+    The counts of the buckets of one histogram, either its own list or a part of a larger (shared) array
+    """
+
+    def __init__(self, counts=None, offset=0):
+        """
+        :param counts: The array of the counts, a new list by default
+        :param offset: Where the buckets of this histogram start in counts
+        """
+        self.counts = counts if counts is not None else [0] * BUCKETS
+        self.offset = offset
+
+    def record(self, seconds):
+        self.counts[self.offset + bucket(int(seconds * TIME_UNIT))] += 1
+
+    def buckets(self):
+        return self.counts[self.offset:self.offset + BUCKETS]
+
+    def add(self, other):
+        for i, count in enumerate(other.buckets()):
+            self.counts[self.offset + i] += count
+
+    def reset(self):
+        for i in range(BUCKETS):
+            self.counts[self.offset + i] = 0
+
+    def total(self):
+        return sum(self.buckets())
+
+    def percentile(self, p, buckets=None):
+        """
+        :param p: The percentile from 0 to 100
+        :return: The value in seconds that p percent of the values are not above
+        """
+        buckets = buckets if buckets is not None else self.buckets()
+        rank = max(1, -(-sum(buckets) * p // 100))
+        seen = 0
+        for i, count in enumerate(buckets):
+            seen += count
+            if seen >= rank:
+                return bucket_value(i) / TIME_UNIT
+        return 0
+
+    def summary(self):
+        """
+        :return: The count, the mean, the percentiles and the max in ms
+        """
+        buckets = self.buckets()
+        count = sum(buckets)
+        if not count:
+            return {"count": 0}
+        result = {"count": count,
+                  "mean": sum(bucket_value(i) * c for i, c in enumerate(buckets)) / count / TIME_UNIT * 1000}
+        for p in PERCENTILES:
+            result["p%s" % p] = self.percentile(p, buckets) * 1000
+        result["max"] = bucket_value(max(i for i, c in enumerate(buckets) if c)) / TIME_UNIT * 1000
+        return result
+
+
+class Metrics:
+    """
+    The requests, the errors and the latency histograms of the stages of every route. With a multiprocessing context
+    everything is in shared memory so all the forked workers add to the same metrics
+    """
+
+    def __init__(self, routes, stages, errors, context=None):
+        """
+        :param routes: The routes to keep metrics for
+        :param stages: The stages of a request, the histograms of each route
+        :param errors: The types of errors
+        :param context: A multiprocessing context to share the metrics between processes, None for one process
+        """
+        self.routes, self.stages, self.errors = routes, stages, errors
+        counters = len(routes) * (1 + len(errors))
+        buckets = len(routes) * len(stages) * BUCKETS
+        if context is None:
+            self.counters, self.buckets, self.lock = [0] * counters, [0] * buckets, threading.Lock()
+        else:
+            self.counters = context.Array("q", counters, lock=False)
+            self.buckets = context.Array("q", buckets, lock=False)
+            self.lock = context.Lock()
+
+    def counter(self, route, error=None):
+        return self.routes.index(route) * (1 + len(self.errors)) + (self.errors.index(error) + 1 if error else 0)
+
+    def histogram(self, route, stage):
+        index = self.routes.index(route) * len(self.stages) + self.stages.index(stage)
+        return Histogram(self.buckets, index * BUCKETS)
+
+    def record(self, route, stages, error=None):
+        """
+        :param route: The route of the request
+        :param stages: {stage: seconds} of the request
+        :param error: The type of the error of the request or None
+        """
+        with self.lock:
+            self.counters[self.counter(route)] += 1
+            if error:
+                self.counters[self.counter(route, error)] += 1
+            for stage, seconds in stages.items():
+                self.histogram(route, stage).record(seconds)
+
+    def reset(self):
+        with self.lock:
+            for i in range(len(self.counters)):
+                self.counters[i] = 0
+            for i in range(len(self.buckets)):
+                self.buckets[i] = 0
+
+    def report(self):
+        """
+        :return: {route: {"requests", "errors": {type: count}, "latency": {stage: summary in ms}}}
+        """
+        with self.lock:
+            report = {}
+            for route in self.routes:
+                requests = self.counters[self.counter(route)]
+                if not requests:
+                    continue
+                latency = {stage: self.histogram(route, stage).summary() for stage in self.stages}
+                report[route] = {
+                    "requests": requests,
+                    "errors": {error: self.counters[self.counter(route, error)] for error in self.errors},
+                    "latency": {stage: summary for stage, summary in latency.items() if summary["count"]},
+                }
+            return report
@@ -9,4 +9,4 @@ sudo apt -y install python3-pip;
 sudo pip3 install petlib;
 git clone https://github.com/moonkace24/Corrected_bplib.git;
 sudo python3 Corrected_bplib/setup.py install;
-sudo pip3 install numpy; sudo pip3 install flask;
+sudo pip3 install numpy; sudo pip3 install flask; sudo pip3 install uvicorn;
@@ -1,28 +1,60 @@
+import multiprocessing
+import signal
+import socket
 import sys
 from json import dumps, loads
 
-from flask import Flask, request
+import time
+from flask import Flask, request, Response, g
+from werkzeug.serving import make_server
 
 from idp_wrapper import IdPWrapper
+from metrics import Metrics
 
 sys.path.append("../src")
 
 from helper import BpGroupHelper, pack, unpack
+from stagetimer import StageTimer
+from msm import precompute_vk
 from rp import RP
 from request import Request
 from credproof import CredProof
+from wire import CONTENT_TYPE, encode_sig
 
 """
 Code strongly inspired by https://github.com/asonnino/coconut-timing
+
+Run with python server.py port [workers]. With more than one worker the server pre-forks: the group parameters and
+their tables are set up once here and the forked workers inherit them, all of them accepting on the same socket. The
+body of the last /idp/set is kept in shared memory so the keys reach every worker, each one loads them before its next
+request. Every worker keeps its own ledger
+
+GET /metrics returns the requests, the errors and the latency histograms of every route, POST /metrics returns them
+and starts over. /idp/provideid and /rp/verifyid are split in the stages decode, zkp, pairing, sign and encode, the
+time of a request outside of them is only in total. Every response has the stages in a Server-Timing header. In the
+pre-fork mode the metrics are in shared memory and cover all the workers
 """
 
+MAX_KEYS = 2 ** 16  # The maximum size of the body of /idp/set in the pre-fork mode
+ROUTES = ["/", "/idp/set", "/idp/provideid", "/rp/verifyid", "/metrics"]
+STAGES = ["total", "decode", "zkp", "pairing", "sign", "encode"]
+# The KeyError and Exception branches of the routes, and the requests whose credential or proof was rejected
+ERRORS = ["key_error", "error", "rejected"]
+
 # Static fields
 idp = None
 aggr_vk = None
 rp = RP(b"Domain")
+# Pre-fork mode, the last /idp/set body and its version shared between the workers
+shared_keys = None
+shared_version = None
+keys_version = 0  # The version of the keys this process has loaded
+metrics = Metrics(ROUTES, STAGES, ERRORS)
+timer = StageTimer()
 
 # Start the lib
 BpGroupHelper.setup(4)
+BpGroupHelper.stage_timer = timer
 
 
 # make packet for client
@@ -44,17 +76,78 @@ def set_keys_wrapper(data):
     idp = IdPWrapper().getIdP(unpack(data["sk"]), unpack(data["vk"]))
     global aggr_vk
     aggr_vk = unpack(data["aggr_vk"])
+    precompute_vk(aggr_vk)
+
+
+def share_keys(body):
+    """
+    In the pre-fork mode publish the body of /idp/set to the other workers
+
+    :param body: The body of the request as bytes
+    """
+    global keys_version
+    if shared_version is None:
+        return
+    if len(body) >= MAX_KEYS:
+        raise Exception("Keys too large")
+    with shared_version.get_lock():
+        shared_keys.value = body
+        shared_version.value += 1
+        keys_version = shared_version.value
+
+
+def sync_keys():
+    """
+    In the pre-fork mode load the keys if another worker got newer ones
+    """
+    global keys_version
+    if shared_version is None or shared_version.value == keys_version:
+        return
+    with shared_version.get_lock():
+        body, version = shared_keys.value, shared_version.value
+    set_keys_wrapper(loads(body.decode("utf-8")))
+    keys_version = version
 
 
 def provide_id_wrapper(data):
     """Return the sig"""
-    id_request = Request.from_json(data["request"])
+    with timer.stage("decode"):
+        id_request = Request.from_json(data["request"])
+    sig_prime = provide_id(id_request)
+    with timer.stage("encode"):
+        return format(pack(sig_prime))
+
+
+def provide_id_binary_wrapper(data):
+    """Return the sig, the request is in the binary format of wire.py"""
+    with timer.stage("decode"):
+        id_request = Request.from_bytes(memoryview(data))
+    sig_prime = provide_id(id_request)
+    with timer.stage("encode"):
+        if request.accept_mimetypes[CONTENT_TYPE]:
+            if sig_prime == 0:
+                return dumps({"status": "Request Rejected"})  # There is no sig to encode
+            return Response(encode_sig(sig_prime), content_type=CONTENT_TYPE)
+        return format(pack(sig_prime))
+
+
+def provide_id(id_request):
     sig_prime = idp.provide_id(id_request, aggr_vk)
-    return format(pack(sig_prime))
+    if sig_prime == 0:
+        g.error = "rejected"
+    return sig_prime
 
 
 def verify_id_wrapper(data):
-    id_proof = CredProof.from_json(data["proof"])
+    with timer.stage("decode"):
+        id_proof = CredProof.from_json(data["proof"])
+    return rp.verify_id(id_proof, aggr_vk)
+
+
+def verify_id_binary_wrapper(data):
+    """The proof is in the binary format of wire.py"""
+    with timer.stage("decode"):
+        id_proof = CredProof.from_bytes(memoryview(data))
     return rp.verify_id(id_proof, aggr_vk)
 
 
@@ -65,6 +158,28 @@ app = Flask(__name__)
 app.secret_key = None
 
 
+@app.before_request
+def before_request():
+    # Before sync_keys, after_request still runs and needs them if loading the keys fails
+    g.start_time, g.error = time.perf_counter(), None
+    timer.begin()
+    sync_keys()
+
+
+@app.after_request
+def after_request(response):
+    """
+    Add the times of the stages to the metrics and to the Server-Timing header
+    """
+    stages = timer.end()
+    stages["total"] = time.perf_counter() - g.start_time
+    response.headers["Server-Timing"] = ", ".join("%s;dur=%.3f" % (stage, stages[stage] * 1000)
+                                                  for stage in STAGES if stage in stages)
+    if request.url_rule is not None and request.url_rule.rule in ROUTES:
+        metrics.record(request.url_rule.rule, stages, g.error)
+    return response
+
+
 # /
 # Return just ok to make sure the server is running fine
 @app.route("/", methods=["Get", "Post"])
@@ -80,10 +195,13 @@ def set_idp_keys():
         try:
             data = loads(request.data.decode("utf-8"))
             set_keys_wrapper(data)
+            share_keys(request.data)
             return dumps({"status": "OK"})
         except KeyError as e:
+            g.error = "key_error"
             return dumps({"status": "Key ERROR", "message": e.args})
         except Exception as e:
+            g.error = "error"
             return dumps({"status": "ERROR", "message": e.args})
     else:
         return dumps({"status": "ERROR", "message": "Use POST method."})
@@ -95,11 +213,15 @@ def set_idp_keys():
 def idp_provide_id():
     if request.method == "POST":
         try:
+            if request.mimetype == CONTENT_TYPE:
+                return provide_id_binary_wrapper(request.get_data())
             data = loads(request.data.decode("utf-8"))
             return provide_id_wrapper(data)
         except KeyError as e:
+            g.error = "key_error"
             return dumps({"status": "Key ERROR", "message": e.args})
         except Exception as e:
+            g.error = "error"
             return dumps({"status": "ERROR", "message": e.args})
     else:
         return dumps({"status": "ERROR", "message": "Use POST method."})
@@ -111,21 +233,74 @@ def idp_provide_id():
 def rp_verify_id():
     if request.method == "POST":
         try:
-            data = loads(request.data.decode("utf-8"))
-            if verify_id_wrapper(data):
-                return dumps({"status": "OK"})
-            return dumps({"Status": "Verification Failed"})
+            if request.mimetype == CONTENT_TYPE:
+                verified = verify_id_binary_wrapper(request.get_data())
+            else:
+                verified = verify_id_wrapper(loads(request.data.decode("utf-8")))
+            with timer.stage("encode"):
+                if verified:
+                    return dumps({"status": "OK"})
+                g.error = "rejected"
+                return dumps({"Status": "Verification Failed"})
         except KeyError as e:
+            g.error = "key_error"
             return dumps({"status": "Key ERROR", "message": e.args})
         except Exception as e:
+            g.error = "error"
             return dumps({"status": "ERROR", "message": e.args})
     else:
         return dumps({"status": "ERROR", "message": "Use POST method."})
 
 
+# /metrics
+# The requests, the errors and the latency histograms of every route, POST also starts them over
+@app.route("/metrics", methods=["Get", "Post"])
+def get_metrics():
+    report = metrics.report()
+    if request.method == "POST":
+        metrics.reset()
+    return dumps({"status": "OK", "metrics": report})
+
+
 """
 ------------------------------------ start of the program ---------------------------------------------------------
 """
+def serve_worker(fd):
+    """
+    Serve the requests of the shared socket in a forked worker
+    """
+    make_server("0.0.0.0", 0, app, fd=fd).serve_forever()
+
+
+def serve_prefork(port, workers):
+    """
+    Bind the socket and fork the workers that share it
+
+    :param port: The port to listen to
+    :param workers: The number of worker processes, normally one per core
+    """
+    global shared_keys, shared_version, metrics
+    context = multiprocessing.get_context("fork")
+    shared_keys = context.Array("c", MAX_KEYS, lock=False)
+    shared_version = context.Value("i", 0)
+    metrics = Metrics(ROUTES, STAGES, ERRORS, context)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("0.0.0.0", port))
+    sock.listen(128)
+    processes = [context.Process(target=serve_worker, args=(sock.fileno(),), daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    # On SIGTERM exit normally so the daemon workers are terminated with us
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    for process in processes:
+        process.join()
+
+
 if __name__ == "__main__":
     port = int(sys.argv[1])
-    app.run("0.0.0.0", port)
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    if workers > 1:
+        serve_prefork(port, workers)
+    else:
+        app.run("0.0.0.0", port)
@@ -0,0 +1,131 @@
+import asyncio
+import csv
+import subprocess
+import sys
+import time
+from json import dumps, loads
+
+import httpx
+
+sys.path.append("../../src")
+from helper import BpGroupHelper, pack, agg_key
+from client import Client
+from idp import setup_idps
+from opener import Opener
+from wire import CONTENT_TYPE, decode_sig
+
+"""
+Local load test of the Flask server against the async one. Both are started on this machine, get the same keys and
+then receive the same provide_id and verify_id requests with a fixed number of requests in flight, both in JSON and in
+the binary format of wire.py
+"""
+BINARY_HEADERS = {"content-type": CONTENT_TYPE, "accept": CONTENT_TYPE}
+
+SERVERS = [("flask", "server.py", 5000), ("async", "async_server.py", 5001)]
+CONCURRENCY = [1, 4, 16, 64]
+REQUESTS = 200  # Requests per route and concurrency
+TIME_UNIT = 1000  # For ms
+
+
+def build_url(port, route):
+    return f"http://127.0.0.1:{port}{route}"
+
+
+def start_server(script, port, *args):
+    """
+    Start the server and wait until it answers
+
+    :param args: Extra command line arguments of the server
+    :return: The process of the server
+    """
+    process = subprocess.Popen([sys.executable, script, str(port)] + [str(arg) for arg in args])
+    for _ in range(100):
+        try:
+            if loads(httpx.get(build_url(port, "/")).text)["status"] == "OK":
+                return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+    process.kill()
+    raise Exception("The server %s did not start" % script)
+
+
+def percentile(latencies, p):
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))]
+
+
+def check_response(response):
+    if response.headers.get("content-type") == CONTENT_TYPE:
+        decode_sig(response.content)
+    else:
+        assert loads(response.text)["status"] == "OK"
+
+
+async def load_test(port, route, data, headers, concurrency):
+    """
+    Keep concurrency requests in flight until REQUESTS are answered, over keep-alive connections
+
+    :return: (requests per second, list of the latencies in seconds)
+    """
+    latencies = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+        async def worker(n):
+            for _ in range(n):
+                start_time = time.perf_counter()
+                response = await client.post(build_url(port, route), content=data, headers=headers)
+                latencies.append(time.perf_counter() - start_time)
+                check_response(response)
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*[worker(REQUESTS // concurrency + (i < REQUESTS % concurrency))
+                               for i in range(concurrency)])
+        elapsed_time = time.perf_counter() - start_time
+    return REQUESTS / elapsed_time, latencies
+
+
+def start_test():
+    attributes = [(b"hidden1", True), (b"hidden2", True), (b"hidden3", True), (b"public1", False)]
+    BpGroupHelper.setup(len(attributes))
+    idps = setup_idps(1, 1)
+    aggr_vk = agg_key([idp.vk for idp in idps])
+    client = Client(attributes, aggr_vk)
+    openers = [Opener() for _ in range(3)]
+    request = client.request_id(2, openers)
+    client.agg_cred([client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps])
+    keys = dumps({"sk": pack(idps[0].sk), "vk": pack(idps[0].vk), "aggr_vk": pack(aggr_vk)})
+    proof = client.prove_id(b"Domain")
+    routes = [("/idp/provideid", "json", dumps({"request": request.to_json()}), {}),
+              ("/idp/provideid", "binary", request.to_bytes(), BINARY_HEADERS),
+              ("/rp/verifyid", "json", dumps({"proof": proof.to_json()}), {}),
+              ("/rp/verifyid", "binary", proof.to_bytes(), BINARY_HEADERS)]
+
+    with open("../data/server_load_test.csv", mode="w", newline="") as file:
+        fieldnames = ["server", "route", "format", "concurrency", "throughput", "p50", "p99"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for name, script, port in SERVERS:
+            process = start_server(script, port)
+            try:
+                assert loads(httpx.post(build_url(port, "/idp/set"), content=keys).text)["status"] == "OK"
+                for route, wire_format, data, headers in routes:
+                    for concurrency in CONCURRENCY:
+                        throughput, latencies = asyncio.run(load_test(port, route, data, headers, concurrency))
+                        p50 = percentile(latencies, 50) * TIME_UNIT
+                        p99 = percentile(latencies, 99) * TIME_UNIT
+                        writer.writerow({"server": name,
+                                         "route": route,
+                                         "format": wire_format,
+                                         "concurrency": concurrency,
+                                         "throughput": throughput,
+                                         "p50": p50,
+                                         "p99": p99})
+                        print(name, route, wire_format, concurrency, throughput, p50, p99)
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    start_test()
+    print("DONE")
@@ -1,9 +1,8 @@
 import asyncio
 import csv
+import time
 from typing import List, Tuple
 
-import httpx
-
 from client_helper import *
 
 sys.path.append("../../src")
@@ -13,6 +12,7 @@ from client import Client
 from idp import IdP, setup_idps
 from rp import RP
 from opener import Opener, check_sig, deanonymize
+from issuance import ThresholdIssuer
 
 ITERATIONS = 100
 
@@ -21,53 +21,30 @@ ITERATIONS = 100
 """
 
 
-def get_t_number(numbers):
-    sorted_numbers = sorted(numbers)
-    return sorted_numbers[threshold_idp - 1]
-
-
-async def async_request_id(request):
-    """
-    Asynchronously send a request for credentials in all the IdPS
-    :param request: The request to send
-    :return: The signatures returned and the smaller t time it took to return all
-    """
-    json = {"request": request.to_json()}
-    async with httpx.AsyncClient() as client:
-        tasks = [send_request(client, addr, ROUTE_IDP_PROVIDEID, json) for addr in SERVER_ADDR]
-        results = await asyncio.gather(*tasks)
-    sigs = []
-    numbers = []
-    for r in results:
-        assert r["status"] == "OK"
-        sig = unpack(r["load"])
-        sigs.append(sig)
-        numbers.append(r["elapsed"])
-    elapsed_time = get_t_number(numbers)
-    return sigs, elapsed_time
-
-
 async def measure_threshold_latency():
     """
-    Asynchronous function that keeps sending requests to the IdPs with different thresholds.
+    Asynchronous function that keeps requesting credentials from the IdPs with different thresholds. The issuance
+    returns as soon as threshold valid shares are in, so it follows the threshold-th fastest IdP
     Saves the results in a .csv file
     """
     client = Client(attributes, aggr_vk)
     openers = [Opener() for _ in range(total_opener)]
     request = client.request_id(threshold_opener, openers)
+    urls = [build_url(addr, 80, "") for addr in SERVER_ADDR]
+    vks = [idp.vk for idp in idps]
     with open('../data/latency.csv', 'w', newline='') as file:
         fieldnames = ["Threshold", "Time"]
         writer = csv.DictWriter(file, fieldnames)
         writer.writeheader()
-        for i in range(1, len(SERVER_ADDR) + 1):
-            threshold_idp = i
+        for threshold_idp in range(1, len(SERVER_ADDR) + 1):
             print("Starting with IdPs:", threshold_idp)
-            for _ in range(ITERATIONS):
-                sigs_prime, elapsed_time = await async_request_id(request)
-                sigs = [client.unbind_sig(sig_prime) for sig_prime in sigs_prime]
-                client.agg_cred(sigs)
-                assert client.verify_sig()
-                writer.writerow({fieldnames[0]: threshold_idp, fieldnames[1]: elapsed_time * 1000}, )
+            async with ThresholdIssuer(client, urls, threshold_idp, vks) as issuer:
+                for _ in range(ITERATIONS):
+                    start_time = time.perf_counter()
+                    await issuer.issue(request)
+                    elapsed_time = time.perf_counter() - start_time
+                    assert client.verify_sig()
+                    writer.writerow({fieldnames[0]: threshold_idp, fieldnames[1]: elapsed_time * 1000}, )
 
 
 """
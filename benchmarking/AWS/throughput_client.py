@@ -1,93 +1,231 @@
+import argparse
 import asyncio
 import csv
+import sys
 import time
-from typing import List, Tuple
+from json import dumps, loads
 
 import httpx
 
-from client_helper import *
+from client_helper import SERVER_ADDR, ROUTE_IDP_PROVIDEID, ROUT_RP_VERIFYID, ROUTE_IDP_SET
+from metrics import Histogram, PERCENTILES
 
 sys.path.append("../../src")
 import helper
 from helper import BpGroupHelper, pack, unpack
 from client import Client
-from idp import IdP, setup_idps
-from rp import RP
-from opener import Opener, check_sig, deanonymize
+from idp import setup_idps
+from opener import Opener
+from wire import CONTENT_TYPE, decode_sig
+
+"""
+Open-loop load generator for one IdP or RP server. The requests are sent at a fixed arrival rate whether or not the
+previous ones are answered, and the latency of a request is measured from the time it should have been sent. A slow
+server therefore shows up in the latency and is not hidden by a client that waits for it (coordinated omission). The
+rate is ramped step by step until the server cannot keep up, the knee of the throughput curve:
+
+    python throughput_client.py --target provideid --start 5 --step 5 --max 100
+    python throughput_client.py --target verifyid --binary
+
+The requests and the proofs are generated before the test, POOL distinct ones that are sent round robin. After every
+step the /metrics of server.py are read and reset, so the server side p99 is next to the client side one
+"""
+
+PORT = 80
+TARGETS = {"provideid": ROUTE_IDP_PROVIDEID, "verifyid": ROUT_RP_VERIFYID}
+BINARY_HEADERS = {"content-type": CONTENT_TYPE, "accept": CONTENT_TYPE}
+POOL = 500  # Distinct requests or proofs
+START_RATE = 5  # Requests per second of the first step
+STEP_RATE = 5
+MAX_RATE = 200
+DURATION = 10  # Seconds of every step
+PAUSE = 2  # Seconds between the steps so the server drains its queue
+KNEE = 0.95  # The server keeps up while it answers at least this fraction of the rate
+CONNECTIONS = 512  # The requests that can be in flight, more wait for a connection and that counts in their latency
+TIMEOUT = 60  # Seconds before a request counts as an error
+TIME_UNIT = 1000  # For ms
+OUTPUT = "../data/throughput.csv"
+
+total_idp = 2
+threshold_idp = 1
+total_opener = 3
+threshold_opener = 2
+attributes = [(b"hidden1", True), (b"hidden2", True), (b"hidden3", True), (b"public1", False)]
 
-MAX_REQUESTS = 10
 
 """
 ------------------------------------ Functions ---------------------------------------------------------
 """
 
 
-async def async_request_id(request):
+def build_url(host, port, route):
+    return f"http://{host}:{port}{route}"
+
+
+def generate_pool(target, size, binary):
+    """
+    Set up the keys and generate the distinct bodies to send
+
+    :param target: "provideid" or "verifyid"
+    :param size: The number of bodies
+    :param binary: True for the binary format of wire.py, False for JSON
+    :return: The keys for /idp/set in JSON and the list of the bodies
+    """
+    BpGroupHelper.setup(len(attributes))
+    idps = setup_idps(threshold_idp, total_idp)
+    aggr_vk = helper.agg_key([idp.vk for idp in idps])
+    keys = dumps({"sk": pack(idps[0].sk), "vk": pack(idps[0].vk), "aggr_vk": pack(aggr_vk)})
+    openers = [Opener() for _ in range(total_opener)]
+    bodies = []
+    if target == "provideid":
+        # A new client for every request so each one has its own user id and attributes commitment
+        for _ in range(size):
+            request = Client(helper.sort_attributes(attributes), aggr_vk).request_id(threshold_opener, openers)
+            bodies.append(request.to_bytes() if binary else dumps({"request": request.to_json()}))
+        return keys, bodies
+    # Every proof of a client is different, a few clients share the pool
+    clients = [Client(helper.sort_attributes(attributes), aggr_vk) for _ in range(min(size, 10))]
+    for client in clients:
+        request = client.request_id(threshold_opener, openers)
+        sigs = [client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps[:threshold_idp]]
+        client.agg_cred(sigs + [None] * (total_idp - threshold_idp))
+    for i in range(size):
+        proof = clients[i % len(clients)].prove_id(b"Domain")
+        bodies.append(proof.to_bytes() if binary else dumps({"proof": proof.to_json()}))
+    return keys, bodies
+
+
+def check_response(response):
     """
-    Asynchronously send a request for credentials in all the IdPS
-    :param request: The request to send
+    :return: True if the server answered with a sig or an OK status, False for errors and rejections
     """
-    json = {"request": request.to_json()}
-    async with httpx.AsyncClient() as client:
-        tasks = [send_request(client, SERVER_ADDR[0], ROUTE_IDP_PROVIDEID, json)]
-        results = await asyncio.gather(*tasks)
-    for r in results:
-        assert r["status"] == "OK"
+    if response.status_code != 200:
+        return False
+    if response.headers.get("content-type") == CONTENT_TYPE:
+        decode_sig(response.content)
+        return True
+    data = loads(response.text)
+    if data.get("status") != "OK":
+        return False  # An error, a rejected request in binary or a proof that failed verification
+    # A rejected request in JSON is still OK, with the sig 0 as the load
+    return "load" not in data or unpack(data["load"]) != 0
 
 
-async def async_send_parallel_requests(number_of_requests, request):
+async def run_step(client, url, bodies, headers, rate, duration):
     """
-    Just a wrapper function that genertes the total number of requests we need
-    :param number_of_requests: The number of requests to send
-    :param request: The request
+    Send rate requests per second for duration seconds without waiting for the answers, then wait for all of them
+
+    :return: (latency Histogram from the intended send time, service Histogram from the actual send time, the number
+    of requests, the number of errors, the seconds from the first send to the last answer)
     """
-    tasks = [async_request_id(request) for _ in range(number_of_requests)]
+    latency, service = Histogram(), Histogram()
+    errors = 0
+
+    async def send(body, intended):
+        nonlocal errors
+        start_time = time.perf_counter()
+        try:
+            ok = check_response(await client.post(url, content=body, headers=headers))
+        except (httpx.HTTPError, ValueError):
+            ok = False
+        end_time = time.perf_counter()
+        latency.record(end_time - intended)
+        service.record(end_time - start_time)
+        errors += not ok
+
+    count = int(rate * duration)
+    tasks = []
+    start_time = time.perf_counter()
+    for i in range(count):
+        intended = start_time + i / rate
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send(bodies[i % len(bodies)], intended)))
     await asyncio.gather(*tasks)
+    return latency, service, count, errors, time.perf_counter() - start_time
 
 
-async def measure_throughput_latency():
+async def server_p99(client, host, port, route):
     """
-    Keep increasing the number of requests and measure how long an IdP takes to respond to them
+    Read and reset the metrics of server.py
+
+    :return: The p99 in ms of the route on the server since the last call, None if the server has no /metrics
     """
-    client = Client(attributes, aggr_vk)
-    openers = [Opener() for _ in range(total_opener)]
-    request = client.request_id(threshold_opener, openers)
-    with open('../data/throughput.csv', 'w', newline='') as file:
-        fieldnames = ["Number_of_Requests", "Time"]
+    try:
+        response = await client.post(build_url(host, port, "/metrics"))
+        return loads(response.text)["metrics"][route]["latency"]["total"]["p99"]
+    except (httpx.HTTPError, ValueError, KeyError):
+        return None
+
+
+async def ramp(host, port, target, bodies, headers, rates, duration, writer):
+    """
+    Run one step per rate until the server cannot keep up
+
+    :return: The highest rate the server kept up with, None if it could not keep up with the first one
+    """
+    route = TARGETS[target]
+    url = build_url(host, port, route)
+    knee = None
+    limits = httpx.Limits(max_connections=CONNECTIONS, max_keepalive_connections=CONNECTIONS)
+    async with httpx.AsyncClient(limits=limits, timeout=TIMEOUT) as client:
+        await server_p99(client, host, port, route)  # Start the metrics of the server from zero
+        for rate in rates:
+            latency, service, count, errors, elapsed = await run_step(client, url, bodies, headers, rate, duration)
+            throughput = (count - errors) / elapsed
+            row = {"target": target, "rate": rate, "requests": count, "errors": errors, "throughput": throughput,
+                   "server_p99": await server_p99(client, host, port, route)}
+            for p in PERCENTILES:
+                row["p%s" % p] = latency.percentile(p) * TIME_UNIT
+            row["max"] = latency.summary()["max"]
+            row["service_p99"] = service.percentile(99) * TIME_UNIT
+            writer.writerow(row)
+            print(target, "rate %s/s" % rate, "throughput %.1f/s" % throughput, "errors %s" % errors,
+                  "p50 %.1fms p99 %.1fms" % (row["p50"], row["p99"]))
+            if errors or throughput < KNEE * rate:
+                break
+            knee = rate
+            await asyncio.sleep(PAUSE)
+    return knee
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-loop load test of /idp/provideid or /rp/verifyid")
+    parser.add_argument("--host", default=SERVER_ADDR[0])
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--target", choices=sorted(TARGETS), action="append",
+                        help="the route to load, can be given more than once, both by default")
+    parser.add_argument("--binary", action="store_true", help="send the binary format of wire.py instead of JSON")
+    parser.add_argument("--start", type=float, default=START_RATE, help="the rate of the first step per second")
+    parser.add_argument("--step", type=float, default=STEP_RATE, help="how much the rate grows every step")
+    parser.add_argument("--max", type=float, default=MAX_RATE, help="the rate of the last step")
+    parser.add_argument("--duration", type=float, default=DURATION, help="the seconds of every step")
+    parser.add_argument("--pool", type=int, default=POOL, help="the number of distinct requests or proofs")
+    parser.add_argument("--output", default=OUTPUT, help="the CSV file of the results")
+    args = parser.parse_args()
+
+    rates = []
+    while args.start + len(rates) * args.step <= args.max:
+        rates.append(args.start + len(rates) * args.step)
+    headers = BINARY_HEADERS if args.binary else {}
+    with open(args.output, "w", newline="") as file:
+        fieldnames = ["target", "rate", "requests", "errors", "throughput"] + ["p%s" % p for p in PERCENTILES] + \
+                     ["max", "service_p99", "server_p99"]
         writer = csv.DictWriter(file, fieldnames)
         writer.writeheader()
-        for n in range(1, MAX_REQUESTS+1):
-            time.sleep(1)
-            print(f"Sending {n} parallel requests...")
-            start_time = time.perf_counter()
-            await async_send_parallel_requests(n, request)
-            elapsed_time = time.perf_counter() - start_time
-            print(elapsed_time)
-            writer.writerow({fieldnames[0]: n, fieldnames[1]: elapsed_time}, )
+        for target in args.target or sorted(TARGETS):
+            keys, bodies = generate_pool(target, args.pool, args.binary)
+            response = httpx.post(build_url(args.host, args.port, ROUTE_IDP_SET), content=keys)
+            assert loads(response.text)["status"] == "OK"
+            print("Generated %s %s bodies, keys set" % (len(bodies), target))
+            knee = asyncio.run(ramp(args.host, args.port, target, bodies, headers, rates, args.duration, writer))
+            print(target, "knee:", "%s/s" % knee if knee is not None else "below %s/s" % rates[0])
 
 
 """
 ------------------------------------ start of the program ---------------------------------------------------------
 """
 if __name__ == "__main__":
-    attributes: List[Tuple[bytes, bool]] = [
-        (b"hidden1", True),
-        (b"hidden2", True),
-        (b"hidden3", True),
-        (b"public1", False)]
-    test_connection()
-    print("Test connection: OKAY")
-    BpGroupHelper.setup(len(attributes))
-    total_opener = 3
-    threshold_opener = 2
-    total_idp = 2
-    threshold_idp = 1
-
-    idps = setup_idps(threshold_idp, total_idp)
-    print("Keys set: OKAY")
-    vk = [idp.vk for idp in idps]
-    aggr_vk = helper.agg_key(vk)
-    set_idp_keys(idps, aggr_vk)  # Send to each IdP server the key generated when emulating the ss
-
-    asyncio.run(measure_throughput_latency())
-    print("Test concluded")
+    main()
+    print("DONE")
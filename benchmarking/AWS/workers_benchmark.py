@@ -0,0 +1,78 @@
+import asyncio
+import csv
+import os
+import sys
+from json import dumps, loads
+
+import httpx
+
+from server_load_test import build_url, start_server, load_test, percentile, TIME_UNIT
+
+sys.path.append("../../src")
+from helper import BpGroupHelper, pack, unpack, agg_key
+from client import Client
+from idp import setup_idps
+from opener import Opener
+
+"""
+Throughput of server.py in the pre-fork mode for a growing number of workers. Before measuring, the keys are changed
+through one worker and every worker has to sign with the new ones
+"""
+
+PORT = 5002
+WORKERS = sorted({1, 2, 4, os.cpu_count() or 1})
+IN_FLIGHT = 2  # Requests in flight per worker
+ATTRIBUTES = [(b"hidden1", True), (b"hidden2", True), (b"hidden3", True), (b"public1", False)]
+
+
+def new_keys(openers):
+    """
+    Emulate the key generation of one IdP
+
+    :return: The body of /idp/set and the body of a provide_id request that only verifies with these keys
+    """
+    idps = setup_idps(1, 1)
+    aggr_vk = agg_key([idp.vk for idp in idps])
+    request = Client(ATTRIBUTES, aggr_vk).request_id(2, openers)
+    keys = dumps({"sk": pack(idps[0].sk), "vk": pack(idps[0].vk), "aggr_vk": pack(aggr_vk)})
+    return keys, dumps({"request": request.to_json()})
+
+
+async def check_keys(data, requests, in_flight):
+    """
+    Send the request to all the workers, provide_id answers 0 if a worker still has the old keys
+    """
+    limits = httpx.Limits(max_connections=in_flight, max_keepalive_connections=0)
+    async with httpx.AsyncClient(limits=limits, timeout=None) as client:
+        responses = await asyncio.gather(*[client.post(build_url(PORT, "/idp/provideid"), content=data)
+                                           for _ in range(requests)])
+    for response in responses:
+        assert unpack(loads(response.text)["load"]) != 0
+
+
+def start_test():
+    BpGroupHelper.setup(len(ATTRIBUTES))
+    openers = [Opener() for _ in range(3)]
+    with open("../data/workers_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["workers", "throughput", "p50", "p99"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for workers in WORKERS:
+            process = start_server("server.py", PORT, workers)
+            try:
+                for _ in range(2):
+                    keys, data = new_keys(openers)
+                    assert loads(httpx.post(build_url(PORT, "/idp/set"), content=keys).text)["status"] == "OK"
+                    asyncio.run(check_keys(data, 4 * workers, workers))
+                throughput, latencies = asyncio.run(load_test(PORT, "/idp/provideid", data, {}, IN_FLIGHT * workers))
+                p50, p99 = percentile(latencies, 50) * TIME_UNIT, percentile(latencies, 99) * TIME_UNIT
+                writer.writerow({"workers": workers, "throughput": throughput, "p50": p50, "p99": p99})
+                print(workers, throughput, p50, p99)
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == "__main__":
+    start_test()
+    print("DONE")
@@ -0,0 +1,79 @@
+import csv
+import sys
+import time
+from itertools import combinations
+
+sys.path.append("../../src")
+
+import helper
+from helper import BpGroupHelper
+from idp import setup_idps
+from keymanager import AggregatedKeyManager
+
+TIME_UNIT = 1000  # For ms
+# (threshold, total) of the IdPs
+IDPS = [(2, 3), (3, 4), (5, 7), (7, 10)]
+RUNS = 10
+
+
+def subsets_of(ti, ni):
+    """
+    :return: The indexes of every subset of ti out of the ni IdPs
+    """
+    return list(combinations(range(1, ni + 1), ti))
+
+
+def aggr_key_test(vks, subsets):
+    """
+    Measure the aggregation of every subset with helper.agg_key, with a manager that sees the subset for the first time
+    and with a manager that has it cached
+
+    :return: The average time per subset of each of the three
+    """
+    subset_vks = [[vk if i + 1 in subset else None for i, vk in enumerate(vks)] for subset in subsets]
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        for vk in subset_vks:
+            helper.agg_key(vk)
+    end_time = time.perf_counter()
+    agg_key_time = (end_time - start_time) * TIME_UNIT / (RUNS * len(subsets))
+
+    manager = AggregatedKeyManager(vks, cache_size=len(subsets))
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        manager.invalidate()
+        for vk in subset_vks:
+            manager.agg_key(vk)
+    end_time = time.perf_counter()
+    miss_time = (end_time - start_time) * TIME_UNIT / (RUNS * len(subsets))
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        for vk in subset_vks:
+            manager.agg_key(vk)
+    end_time = time.perf_counter()
+    hit_time = (end_time - start_time) * TIME_UNIT / (RUNS * len(subsets))
+    return agg_key_time, miss_time, hit_time
+
+
+def start_test(q):
+    with open("../data/aggr_key_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["threshold_idp", "total_idp", "agg_key", "manager_miss", "manager_hit"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for ti, ni in IDPS:
+            # Start with a fresh group so the tables of the previous IdPs do not take the memory
+            BpGroupHelper.setup(q)
+            vks = [idp.vk for idp in setup_idps(ti, ni)]
+            agg_key_time, miss_time, hit_time = aggr_key_test(vks, subsets_of(ti, ni))
+            writer.writerow({"threshold_idp": ti,
+                             "total_idp": ni,
+                             "agg_key": agg_key_time,
+                             "manager_miss": miss_time,
+                             "manager_hit": hit_time})
+            print(ti, ni, agg_key_time, miss_time, hit_time)
+
+
+if __name__ == "__main__":
+    start_test(4)
+    print("DONE")
@@ -0,0 +1,84 @@
+import csv
+import random
+import sys
+import time
+
+sys.path.append("../../src")
+
+import helper
+from helper import BpGroupHelper
+from attributecache import AttributeCache, ATTRIBUTE_CACHE_SIZE
+from client import Client
+from idp import setup_idps
+from opener import Opener
+from rp import RP
+
+TIME_UNIT = 1000  # For ms
+PUBLIC = [1, 2, 4, 8]  # The number of public attributes, there is one private as well
+VALUES = 4  # The distinct values of every public attribute, e.g. countries or tiers
+USERS = 20
+RUNS = 5
+
+
+def cache_test(public, cache_size, threshold_idp, total_idp, threshold_opener, total_opener):
+    """
+    USERS clients whose public attributes take one of VALUES values get a credential and prove it to the RP
+
+    :return: The average time of provide_id and verify_id, the hits and the misses of the cache
+    """
+    BpGroupHelper.setup(public + 1)
+    cache = AttributeCache(cache_size)
+    idps = setup_idps(threshold_idp, total_idp)
+    for idp in idps:
+        idp.attribute_cache = AttributeCache(cache_size)  # The entries of the IdP come from its sk, never shared
+    aggr_vk = helper.agg_key([idp.vk for idp in idps])
+    openers = [Opener() for _ in range(total_opener)]
+    rp = RP(b"Domain", attribute_cache=cache)
+    provide_time = verify_time = 0
+    for _ in range(USERS):
+        attributes = [(b"hidden", True)] + [(("value%s" % random.randrange(VALUES)).encode(), False)
+                                            for _ in range(public)]
+        client = Client(attributes, aggr_vk, attribute_cache=cache)
+        request = client.request_id(threshold_opener, openers)
+        start_time = time.perf_counter()
+        for _ in range(RUNS):
+            sigs = [idp.provide_id(request, aggr_vk) for idp in idps[:threshold_idp]]
+        end_time = time.perf_counter()
+        provide_time += (end_time - start_time) / (RUNS * threshold_idp)
+        client.agg_cred([client.unbind_sig(sig) for sig in sigs] + [None] * (total_idp - threshold_idp))
+        proof = client.prove_id(rp.domain)
+        start_time = time.perf_counter()
+        for _ in range(RUNS):
+            assert rp.verify_id(proof, aggr_vk)
+        end_time = time.perf_counter()
+        verify_time += (end_time - start_time) / RUNS
+    caches = [cache] + [idp.attribute_cache for idp in idps]
+    return provide_time * TIME_UNIT / USERS, verify_time * TIME_UNIT / USERS, sum(cache.hits for cache in caches), \
+        sum(cache.misses for cache in caches)
+
+
+def start_test(threshold_idp, total_idp, threshold_opener, total_opener):
+    with open("../data/attribute_cache_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["public_attributes", "cache", "provide_id", "verify_id", "hits", "misses"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for public in PUBLIC:
+            for cache_size in (0, ATTRIBUTE_CACHE_SIZE):
+                provide_time, verify_time, hits, misses = cache_test(public, cache_size, threshold_idp, total_idp,
+                                                                     threshold_opener, total_opener)
+                writer.writerow({"public_attributes": public,
+                                 "cache": cache_size,
+                                 "provide_id": provide_time,
+                                 "verify_id": verify_time,
+                                 "hits": hits,
+                                 "misses": misses})
+                print(public, cache_size, provide_time, verify_time, hits, misses)
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
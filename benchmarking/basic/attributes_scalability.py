@@ -11,7 +11,8 @@ from helper import BpGroupHelper
 from client import Client
 
 TIME_UNIT = 1000  # For ms
-ATTRIBUTES: List[Tuple[bytes, bool]] = [(b"private", True)]  # We always have to have one private
+INITIAL_ATTRIBUTES: List[Tuple[bytes, bool]] = [(b"private", True)]  # We always have to have one private
+ATTRIBUTES: List[Tuple[bytes, bool]] = list(INITIAL_ATTRIBUTES)
 
 ITERATIONS = 10
 MAX_ATTRIBUTES = 19
@@ -30,63 +31,69 @@ def run_timing_test(writer, type, idps, client, rp, openers, aggr_vk, to):
                 verify_id_time
         )
         writer.writerow({"type": type,
+                         "msm": BpGroupHelper.msm,
                          "num_attributes": len(ATTRIBUTES),
                          "time": final_result})
 
 
-def attribute_scalling_test(idps, client, rp, openers, aggr_vk, to):
-    with open("../data/attributes_scalability.csv", mode="w", newline="") as file:
-        fieldnames = ["type", "num_attributes", "time"]
-        writer = csv.DictWriter(file, fieldnames)
-        writer.writeheader()
-        # Tests for the public attributes scaling
-        global ATTRIBUTES
-        type = "public"
-        while len(ATTRIBUTES) < MAX_ATTRIBUTES:
-            ATTRIBUTES.append((b"public" + str(len(ATTRIBUTES)).encode(), False))
-            ATTRIBUTES.append((b"public" + str(len(ATTRIBUTES) + 1).encode(), False))
+def attribute_scalling_test(writer, idps, client, rp, openers, aggr_vk, to):
+    # Tests for the public attributes scaling
+    global ATTRIBUTES
+    type = "public"
+    while len(ATTRIBUTES) < MAX_ATTRIBUTES:
+        ATTRIBUTES.append((b"public" + str(len(ATTRIBUTES)).encode(), False))
+        ATTRIBUTES.append((b"public" + str(len(ATTRIBUTES) + 1).encode(), False))
 
-            ATTRIBUTES = helper.sort_attributes(ATTRIBUTES)
-            client.set_attributes(ATTRIBUTES)
+        ATTRIBUTES = helper.sort_attributes(ATTRIBUTES)
+        client.set_attributes(ATTRIBUTES)
 
-            run_timing_test(writer, type, idps, client, rp, openers, aggr_vk, to)
-            # Just adding two attributes that are different
-            print(len(ATTRIBUTES), type)
+        run_timing_test(writer, type, idps, client, rp, openers, aggr_vk, to)
+        # Just adding two attributes that are different
+        print(len(ATTRIBUTES), type, BpGroupHelper.msm)
 
-        # Test for the private attribute scalability
-        ATTRIBUTES.clear()  # Reset attributes
-        ATTRIBUTES.append((b"private", True))
-        type = "private"
-        while len(ATTRIBUTES) < MAX_ATTRIBUTES:
-            ATTRIBUTES.append((b"private" + str(len(ATTRIBUTES)).encode(), True))
-            ATTRIBUTES.append((b"private" + str(len(ATTRIBUTES) + 1).encode(), True))
+    # Test for the private attribute scalability
+    ATTRIBUTES.clear()  # Reset attributes
+    ATTRIBUTES.append((b"private", True))
+    type = "private"
+    while len(ATTRIBUTES) < MAX_ATTRIBUTES:
+        ATTRIBUTES.append((b"private" + str(len(ATTRIBUTES)).encode(), True))
+        ATTRIBUTES.append((b"private" + str(len(ATTRIBUTES) + 1).encode(), True))
 
-            ATTRIBUTES = helper.sort_attributes(ATTRIBUTES)
-            client.set_attributes(ATTRIBUTES)
+        ATTRIBUTES = helper.sort_attributes(ATTRIBUTES)
+        client.set_attributes(ATTRIBUTES)
 
-            run_timing_test(writer, type, idps, client, rp, openers, aggr_vk, to)
-            # Just adding two attributes that are different
-            print(len(ATTRIBUTES), type)
+        run_timing_test(writer, type, idps, client, rp, openers, aggr_vk, to)
+        # Just adding two attributes that are different
+        print(len(ATTRIBUTES), type, BpGroupHelper.msm)
 
-        # Test for the mix attribute scalability
-        ATTRIBUTES.clear()  # Reset attributes
-        ATTRIBUTES.append((b"private", True))
-        type = "mix"
-        while len(ATTRIBUTES) < MAX_ATTRIBUTES:
-            ATTRIBUTES.append((b"public" + str(len(ATTRIBUTES)).encode(), False))
-            ATTRIBUTES.append((b"private" + str(len(ATTRIBUTES) + 1).encode(), True))
+    # Test for the mix attribute scalability
+    ATTRIBUTES.clear()  # Reset attributes
+    ATTRIBUTES.append((b"private", True))
+    type = "mix"
+    while len(ATTRIBUTES) < MAX_ATTRIBUTES:
+        ATTRIBUTES.append((b"public" + str(len(ATTRIBUTES)).encode(), False))
+        ATTRIBUTES.append((b"private" + str(len(ATTRIBUTES) + 1).encode(), True))
 
-            ATTRIBUTES = helper.sort_attributes(ATTRIBUTES)
-            client.set_attributes(ATTRIBUTES)
+        ATTRIBUTES = helper.sort_attributes(ATTRIBUTES)
+        client.set_attributes(ATTRIBUTES)
 
-            run_timing_test(writer, type, idps, client, rp, openers, aggr_vk, to)
-            # Just adding two attributes that are different
-            print(len(ATTRIBUTES), type)
+        run_timing_test(writer, type, idps, client, rp, openers, aggr_vk, to)
+        # Just adding two attributes that are different
+        print(len(ATTRIBUTES), type, BpGroupHelper.msm)
 
 
 def start_test(q, ti, ni, to, no):
     idps, client, rp, openers, aggr_vk = setup(q, ti, ni, to, no)
-    attribute_scalling_test(idps, client, rp, openers, aggr_vk, to)
+    with open("../data/attributes_scalability.csv", mode="w", newline="") as file:
+        fieldnames = ["type", "msm", "num_attributes", "time"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        # The linear combinations one term at a time and then with the multi-exponentiation
+        global ATTRIBUTES
+        for msm in [False, True]:
+            BpGroupHelper.msm = msm
+            ATTRIBUTES = list(INITIAL_ATTRIBUTES)  # Every pass runs the same sweeps as the baseline
+            attribute_scalling_test(writer, idps, client, rp, openers, aggr_vk, to)
 
 
 if __name__ == "__main__":
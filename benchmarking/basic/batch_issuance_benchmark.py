@@ -0,0 +1,56 @@
+import csv
+import sys
+import time
+
+from timing_benchmark import setup
+
+sys.path.append("../../src")
+
+from opener import ledger
+
+TIME_UNIT = 1000  # For ms
+BATCH_SIZES = [2 ** i for i in range(7)]  # 1..64
+RUNS = 3
+
+
+def batch_test(idp, requests, aggr_vk):
+    """
+    Measure the one at a time loop against the batch issuance for the same requests
+
+    :return: The average time of the loop and of the batch
+    """
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        assert all(idp.provide_id(request, aggr_vk) for request in requests)
+    end_time = time.perf_counter()
+    loop_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        assert all(idp.provide_ids(requests, aggr_vk))
+    end_time = time.perf_counter()
+    batch_time = (end_time - start_time) * TIME_UNIT / RUNS
+    return loop_time, batch_time
+
+
+def start_test(q, ti, ni, to, no):
+    idps, client, rp, openers, aggr_vk = setup(q, ti, ni, to, no)
+    requests = [client.request_id(to, openers) for _ in range(BATCH_SIZES[-1])]
+    with open("../data/batch_issuance_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["requests", "provide_id", "provide_ids"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for n in BATCH_SIZES:
+            loop_time, batch_time = batch_test(idps[0], requests[:n], aggr_vk)
+            writer.writerow({"requests": n, "provide_id": loop_time, "provide_ids": batch_time})
+            print(n, loop_time, batch_time)
+    ledger.clear()
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(4, threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
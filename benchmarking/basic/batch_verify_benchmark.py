@@ -0,0 +1,55 @@
+import csv
+import sys
+import time
+
+from timing_benchmark import setup
+
+sys.path.append("../../src")
+
+TIME_UNIT = 1000  # For ms
+BATCH_SIZES = [2 ** i for i in range(11)]  # 1..1024
+RUNS = 3
+
+
+def batch_test(rp, proofs, aggr_vk):
+    """
+    Measure the one at a time loop against the batch verification for the same proofs
+
+    :return: The average time of the loop and of the batch
+    """
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        assert all(rp.verify_id(proof, aggr_vk) for proof in proofs)
+    end_time = time.perf_counter()
+    loop_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        assert all(rp.verify_batch(proofs, aggr_vk))
+    end_time = time.perf_counter()
+    batch_time = (end_time - start_time) * TIME_UNIT / RUNS
+    return loop_time, batch_time
+
+
+def start_test(q, ti, ni, to, no):
+    idps, client, rp, openers, aggr_vk = setup(q, ti, ni, to, no)
+    request = client.request_id(to, openers)
+    client.agg_cred([client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps])
+    proofs = [client.prove_id(rp.domain) for _ in range(BATCH_SIZES[-1])]
+    with open("../data/batch_verify_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["proofs", "verify_id", "verify_batch"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for n in BATCH_SIZES:
+            loop_time, batch_time = batch_test(rp, proofs[:n], aggr_vk)
+            writer.writerow({"proofs": n, "verify_id": loop_time, "verify_batch": batch_time})
+            print(n, loop_time, batch_time)
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(4, threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
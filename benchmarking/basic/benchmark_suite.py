@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.append("../../src")
+
+import helper
+from helper import BpGroupHelper
+from client import Client
+from idp import setup_idps
+from opener import Opener, deanonymize, ban_users, ledger
+from rp import RP
+
+"""
+Benchmark suite for all the phases of the protocol. Every parameter is swept on its own around DEFAULT, the results
+are the median and the percentiles of every phase in JSON, and a run can be compared with a stored baseline:
+
+    python benchmark_suite.py --output ../data/baseline.json
+    python benchmark_suite.py --baseline ../data/baseline.json --threshold 0.1
+
+The comparison exits with status 1 if the median of a phase got slower than the baseline by more than the threshold.
+With --count-ops every configuration runs one more, untimed, round that counts the group operations of every protocol
+call (see opcounter.OpCounter) and stores them under "operations". Everything runs locally on this process
+"""
+
+TIME_UNIT = 1000  # For ms
+RUNS = 10  # The samples of every phase per configuration
+PERCENTILES = [50, 90, 99]
+# The configuration the sweeps start from, the IdPs and the openers as (threshold, total)
+DEFAULT = {"attributes": 4, "idps": [3, 4], "openers": [2, 3], "ledger": 0, "banned": 0}
+SWEEPS = {
+    "attributes": [2, 4, 8, 16],
+    "idps": [[2, 3], [3, 4], [5, 7], [7, 10]],
+    "openers": [[2, 3], [3, 5], [5, 7]],  # Deanonymizing leaves one opener out so the total is more than threshold
+    "ledger": [0, 10, 50],  # Other users in the ledger before the user that is deanonymized
+    "banned": [0, 100, 500],  # Revoked sigs the RP checks every proof against
+}
+PHASES = ["request_id", "provide_id", "unblind", "aggr_sig", "prove_id", "verify_id", "deanonymize"]
+OUTPUT = "../data/benchmark_suite.json"
+THRESHOLD = 0.1  # A phase slower than the baseline by more than this fraction is a regression
+
+
+def configurations(sweeps):
+    """
+    :param sweeps: The values of every parameter to try
+    :return: DEFAULT and every configuration that changes one parameter of it, without duplicates
+    """
+    result = [dict(DEFAULT)]
+    for name, values in sweeps.items():
+        for value in values:
+            config = dict(DEFAULT, **{name: value})
+            if config not in result:
+                result.append(config)
+    return result
+
+
+def config_name(config):
+    return ",".join("%s=%s" % (name, config[name]) for name in sorted(config))
+
+
+def percentile(samples, p):
+    """
+    :return: The p-th percentile of the samples with the nearest rank method
+    """
+    ordered = sorted(samples)
+    return ordered[max(0, -(-len(ordered) * p // 100) - 1)]
+
+
+def summary(samples):
+    """
+    :param samples: The times of a phase in ms
+    :return: The statistics of the samples
+    """
+    result = {"median": statistics.median(samples), "mean": statistics.mean(samples), "min": min(samples),
+              "max": max(samples), "samples": len(samples)}
+    for p in PERCENTILES:
+        result["p%s" % p] = percentile(samples, p)
+    return result
+
+
+def reset():
+    """
+    Clear the global state that the previous configuration left behind
+    """
+    ledger.clear()
+    ban_users.clear()
+
+
+def fill_ledger(size, client, idps, aggr_vk, to, openers):
+    """
+    Add size entries of other users to the ledger. They all use the opening c's of one other request, deanonymize
+    checks every entry with the same pairings no matter whose it is
+    """
+    if not size:
+        return
+    other = Client(client_attributes(len(BpGroupHelper.hs) - 1), aggr_vk)
+    request = other.request_id(to, openers)
+    idps[0].provide_id(request, aggr_vk)
+    c = ledger.pop(request.user_id)
+    for i in range(size):
+        ledger[("other%s" % i).encode()] = c
+
+
+def fill_ban_list(size, aggr_vk):
+    """
+    Add size revoked sigs of random users to the ban list, each one is the previous plus beta[-1]
+    """
+    _, _, beta = aggr_vk
+    ban_sig = BpGroupHelper.o.random() * beta[-1]
+    for i in range(size):
+        ban_sig = ban_sig + beta[-1]
+        ban_users[("banned%s" % i).encode()] = ban_sig
+
+
+def client_attributes(q):
+    """
+    :return: q attributes, half of them private and at least one private
+    """
+    return helper.sort_attributes([(("attribute%s" % i).encode(), i % 2 == 0) for i in range(q)])
+
+
+def timed(samples, function, *args):
+    start_time = time.perf_counter()
+    result = function(*args)
+    end_time = time.perf_counter()
+    samples.append((end_time - start_time) * TIME_UNIT)
+    return result
+
+
+def run_round(samples, client, idps, aggr_vk, ti, to, openers, rp):
+    """
+    Run every phase of the protocol once, with the first ti IdPs, and add the times to the samples
+    """
+    request = timed(samples["request_id"], client.request_id, to, openers)
+    sigs_prime = [timed(samples["provide_id"], idp.provide_id, request, aggr_vk) for idp in idps[:ti]]
+    sigs = [timed(samples["unblind"], client.unbind_sig, sig_prime) for sig_prime in sigs_prime]
+    timed(samples["aggr_sig"], client.agg_cred, sigs + [None] * (len(idps) - ti))
+    assert client.verify_sig()
+    proof = timed(samples["prove_id"], client.prove_id, rp.domain)
+    assert timed(samples["verify_id"], rp.verify_id, proof, aggr_vk)
+    user_id = timed(samples["deanonymize"], deanonymize, openers, proof, aggr_vk)
+    assert user_id == request.user_id
+    # Keep the sizes of the ledger and the ban list the same for the next run
+    ban_users.pop(user_id)
+    ledger.pop(user_id)
+
+
+def run_config(config, runs, count_ops=False):
+    """
+    Run every phase of the protocol runs times for one configuration
+
+    :param count_ops: True to run one more round that counts the group operations
+    :return: {phase: samples in ms} and the report of the OpCounter or None
+    """
+    reset()
+    ti, ni = config["idps"]
+    to, no = config["openers"]
+    BpGroupHelper.setup(config["attributes"])
+    idps = setup_idps(ti, ni)
+    aggr_vk = helper.agg_key([idp.vk for idp in idps])
+    openers = [Opener() for _ in range(no)]
+    client = Client(client_attributes(config["attributes"]), aggr_vk)
+    rp = RP(b"Domain")
+    fill_ledger(config["ledger"], client, idps, aggr_vk, to, openers)
+    fill_ban_list(config["banned"], aggr_vk)
+
+    samples = {phase: [] for phase in PHASES}
+    for _ in range(runs):
+        run_round(samples, client, idps, aggr_vk, ti, to, openers, rp)
+    operations = None
+    if count_ops:
+        # The counting slows the group operations down so its round is not part of the samples
+        BpGroupHelper.count_ops(True)
+        try:
+            run_round({phase: [] for phase in PHASES}, client, idps, aggr_vk, ti, to, openers, rp)
+            operations = BpGroupHelper.counter.report()
+        finally:
+            BpGroupHelper.count_ops(False)
+    reset()
+    return samples, operations
+
+
+def run_suite(sweeps, runs, count_ops=False):
+    """
+    :return: The results of every configuration with the details of the machine
+    """
+    results = []
+    for config in configurations(sweeps):
+        start_time = time.perf_counter()
+        samples, operations = run_config(config, runs, count_ops)
+        results.append({"config": config, "phases": {phase: summary(samples[phase]) for phase in PHASES}})
+        if operations is not None:
+            results[-1]["operations"] = operations
+        print(config_name(config), "%.1fs" % (time.perf_counter() - start_time))
+    return {
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": runs,
+        "time_unit": "ms",
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold):
+    """
+    Compare the medians of every phase of the configurations that are in both runs
+
+    :param current: The results of this run
+    :param baseline: The results of the baseline run
+    :param threshold: The fraction a median can grow before it counts as a regression
+    :return: A list of (config name, phase, baseline median, current median) of the regressions
+    """
+    baseline_results = {config_name(result["config"]): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        name = config_name(result["config"])
+        if name not in baseline_results:
+            continue
+        for phase, stats in result["phases"].items():
+            old = baseline_results[name]["phases"].get(phase)
+            if old is None:
+                continue
+            change = stats["median"] / old["median"] - 1 if old["median"] else 0
+            print("%-70s %-12s %9.3f %9.3f %+7.1f%%" % (name, phase, old["median"], stats["median"], change * 100))
+            if change > threshold:
+                regressions.append((name, phase, old["median"], stats["median"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every phase of the protocol over a parameter sweep")
+    parser.add_argument("--output", default=OUTPUT, help="the JSON file of the results")
+    parser.add_argument("--runs", type=int, default=RUNS, help="the samples of every phase per configuration")
+    parser.add_argument("--baseline", help="a JSON file of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="the fraction a median can grow before it is a regression")
+    parser.add_argument("--only", choices=sorted(SWEEPS), action="append",
+                        help="sweep only these parameters, can be given more than once")
+    parser.add_argument("--count-ops", action="store_true",
+                        help="count the group operations of every protocol call in one more untimed round")
+    args = parser.parse_args()
+
+    sweeps = {name: values for name, values in SWEEPS.items() if not args.only or name in args.only}
+    current = run_suite(sweeps, args.runs, args.count_ops)
+    with open(args.output, "w") as file:
+        json.dump(current, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(current, baseline, args.threshold)
+        for name, phase, old, new in regressions:
+            print("REGRESSION %s %s %.3f -> %.3f" % (name, phase, old, new))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
+    print("DONE")
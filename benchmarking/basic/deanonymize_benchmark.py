@@ -0,0 +1,78 @@
+import csv
+import os
+import sys
+import time
+
+from timing_benchmark import setup
+
+sys.path.append("../../src")
+
+from helper import BpGroupHelper
+from deanonymizer import Deanonymizer
+from opener import ledger, ban_users
+
+TIME_UNIT = 1000  # For ms
+LEDGER_SIZES = [10, 100, 1000, 10000]
+WORKERS = sorted({1, 2, 4, os.cpu_count() or 1})
+RUNS = 3
+
+
+def fill_ledger(size, no):
+    """
+    Fill the ledger with the opening c's of random users. Each point is the previous plus g2 which is much faster than
+    a scalar multiplication and still gives different users that never match the proof
+
+    :param size: The number of random users to add
+    :param no: The number of openers
+    """
+    o, g2 = BpGroupHelper.o, BpGroupHelper.g2
+    point = o.random() * g2
+    while len(ledger) < size:
+        c = {}
+        for i in range(1, no + 1):
+            point = point + g2
+            c[i] = (point, point, None)
+        ledger[o.random()] = c
+
+
+def deanonymize_test(deanonymizer, proof, aggr_vk, user_id):
+    """
+    Measure the time to trace the user with the given deanonymizer
+
+    :return: The average trace time
+    """
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        assert deanonymizer.trace(proof, aggr_vk) == user_id
+        ban_users.pop(user_id)
+    end_time = time.perf_counter()
+    return (end_time - start_time) * TIME_UNIT / RUNS
+
+
+def start_test(q, ti, ni, to, no):
+    idps, client, rp, openers, aggr_vk = setup(q, ti, ni, to, no)
+    with open("../data/deanonymize_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["ledger_size", "workers", "deanonymize"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for size in LEDGER_SIZES:
+            ledger.clear()
+            fill_ledger(size - 1, no)
+            # The user we are looking for is the last one in the ledger which is the worst case for the scan
+            request = client.request_id(to, openers)
+            client.agg_cred([client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps])
+            proof = client.prove_id(rp.domain)
+            for workers in WORKERS:
+                deanonymize_time = deanonymize_test(Deanonymizer(openers, workers), proof, aggr_vk, request.user_id)
+                writer.writerow({"ledger_size": size, "workers": workers, "deanonymize": deanonymize_time})
+                print(size, workers, deanonymize_time)
+    ledger.clear()
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(4, threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
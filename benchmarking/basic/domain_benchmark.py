@@ -0,0 +1,111 @@
+import csv
+import sys
+import time
+
+from timing_benchmark import setup
+
+sys.path.append("../../src")
+
+from helper import BpGroupHelper
+from msm import multi_mul, fixed_mul
+
+TIME_UNIT = 1000  # For ms
+RUNS = 100
+
+
+def vid_test(rp, proof):
+    """
+    The Vid = user_id^c * HashG1(domain)^rs of the ZKP of the RP, hashing the domain every time like before and with
+    the hash kept by the RP
+
+    :return: The average time of the two
+    """
+    c, _, _, rs = proof.zkp
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        multi_mul([proof.user_id, BpGroupHelper.G.hashG1(rp.domain)], [c, rs])
+    end_time = time.perf_counter()
+    hash_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        multi_mul([proof.user_id, rp.domain_hash()], [c, rs])
+    end_time = time.perf_counter()
+    cached_time = (end_time - start_time) * TIME_UNIT / RUNS
+    return hash_time, cached_time
+
+
+def client_test(rp):
+    """
+    The domain dependent points of prove_id, the pseudonym HashG1(domain)^secret and Vid = HashG1(domain)^ws. Like
+    before with the hash and two multiplications every time, and with the hash and the pseudonym cached and the table
+    of the hash for Vid
+
+    :return: The average time of the two
+    """
+    o = BpGroupHelper.o
+    secret, ws = o.random(), o.random()
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        domain_hash = BpGroupHelper.G.hashG1(rp.domain)
+        domain_hash * secret, domain_hash * ws
+    end_time = time.perf_counter()
+    hash_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    domain_hash = BpGroupHelper.G.hashG1(rp.domain)
+    BpGroupHelper.precompute([domain_hash])
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        fixed_mul(domain_hash, ws)
+    end_time = time.perf_counter()
+    cached_time = (end_time - start_time) * TIME_UNIT / RUNS
+    return hash_time, cached_time
+
+
+def protocol_test(client, rp, aggr_vk):
+    """
+    The client keeps the hash of the domain with a fixed-base table and the pseudonym, the RP the hash
+
+    :return: The average time of prove_id and verify_id
+    """
+    prove_time = verify_time = 0
+    for _ in range(RUNS // 10):
+        start_time = time.perf_counter()
+        proof = client.prove_id(rp.domain)
+        end_time = time.perf_counter()
+        prove_time += end_time - start_time
+        start_time = time.perf_counter()
+        assert rp.verify_id(proof, aggr_vk)
+        end_time = time.perf_counter()
+        verify_time += end_time - start_time
+    return prove_time * TIME_UNIT / (RUNS // 10), verify_time * TIME_UNIT / (RUNS // 10)
+
+
+def start_test(q, ti, ni, to, no):
+    idps, client, rp, openers, aggr_vk = setup(q, ti, ni, to, no)
+    with open("../data/domain_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["vid_hash", "vid_cached", "client_hash", "client_cached", "prove_id", "verify_id"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        request = client.request_id(to, openers)
+        client.agg_cred([client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps])
+        proof = client.prove_id(rp.domain)
+        hash_time, cached_time = vid_test(rp, proof)
+        client_hash_time, client_cached_time = client_test(rp)
+        prove_time, verify_time = protocol_test(client, rp, aggr_vk)
+        writer.writerow({"vid_hash": hash_time,
+                         "vid_cached": cached_time,
+                         "client_hash": client_hash_time,
+                         "client_cached": client_cached_time,
+                         "prove_id": prove_time,
+                         "verify_id": verify_time})
+        print(hash_time, cached_time, client_hash_time, client_cached_time, prove_time, verify_time)
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(4, threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
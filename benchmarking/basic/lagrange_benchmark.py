@@ -0,0 +1,79 @@
+import csv
+import sys
+import time
+
+sys.path.append("../../src")
+
+from helper import BpGroupHelper, Polynomial
+
+TIME_UNIT = 1000  # For ms
+AUTHORITIES = [2, 5, 10, 25, 50, 100]
+RUNS = 100
+
+
+def uncached_lagrange(indexes):
+    """
+    The Lagrange coefficients the way they were computed before the cache, with one inversion per index
+    """
+    if len(indexes) == 1:
+        return [1]
+    o = BpGroupHelper.o
+    l = []
+    for i in indexes:
+        numerator, denominator = 1, 1
+        for j in indexes:
+            if j != i:
+                numerator = (numerator * j) % o
+                denominator = (denominator * (j - i)) % o
+        l.append((numerator * denominator.mod_inverse(o)) % o)
+    return l
+
+
+def lagrange_test(indexes):
+    """
+    Measure the coefficients of a threshold set without the cache, on a cache miss and on a cache hit
+
+    :return: The average time of each of the three
+    """
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        l = uncached_lagrange(indexes)
+    end_time = time.perf_counter()
+    uncached_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        Polynomial.lagrange_cache.clear()
+        assert Polynomial.lagrange_interpolation(indexes) == l
+    end_time = time.perf_counter()
+    miss_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        Polynomial.lagrange_interpolation(indexes)
+    end_time = time.perf_counter()
+    hit_time = (end_time - start_time) * TIME_UNIT / RUNS
+    return uncached_time, miss_time, hit_time
+
+
+def start_test():
+    BpGroupHelper.setup(1)
+    with open("../data/lagrange_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["authorities", "threshold", "uncached", "cache_miss", "cache_hit"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for n in AUTHORITIES:
+            for t in sorted({n // 2 + 1, n}):
+                # The last t authorities answered, so the indexes are not just 1..t
+                uncached_time, miss_time, hit_time = lagrange_test(list(range(n - t + 1, n + 1)))
+                writer.writerow({"authorities": n,
+                                 "threshold": t,
+                                 "uncached": uncached_time,
+                                 "cache_miss": miss_time,
+                                 "cache_hit": hit_time})
+                print(n, t, uncached_time, miss_time, hit_time)
+
+
+if __name__ == "__main__":
+    start_test()
+    print("DONE")
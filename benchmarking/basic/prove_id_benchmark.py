@@ -0,0 +1,71 @@
+import csv
+import sys
+import time
+
+from timing_benchmark import setup
+
+sys.path.append("../../src")
+
+import helper
+
+TIME_UNIT = 1000  # For ms
+MAX_ATTRIBUTES = 19
+RUNS = 20
+
+
+def prove_id_test(client, rp, aggr_vk):
+    """
+    Measure prove_id doing everything at login time, the offline part alone as the pool is filled and prove_id
+    with a presentation ready
+
+    :return: The average time of the three per proof
+    """
+    pool = client.proof_pool
+    pool.size = 0
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        client.prove_id(rp.domain)
+    end_time = time.perf_counter()
+    no_pool_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    pool.size = RUNS
+    start_time = time.perf_counter()
+    pool.fill()
+    end_time = time.perf_counter()
+    offline_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    start_time = time.perf_counter()
+    proofs = [client.prove_id(rp.domain) for _ in range(RUNS)]
+    end_time = time.perf_counter()
+    online_time = (end_time - start_time) * TIME_UNIT / RUNS
+    assert all(rp.verify_batch(proofs, aggr_vk))
+    return no_pool_time, offline_time, online_time
+
+
+def start_test(q, ti, ni, to, no):
+    idps, client, rp, openers, aggr_vk = setup(q, ti, ni, to, no)
+    with open("../data/prove_id_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["num_attributes", "prove_id", "offline", "online"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        # Half private and half public attributes
+        for n in range(1, MAX_ATTRIBUTES + 1, 2):
+            attributes = [(b"attribute" + str(i).encode(), i % 2 == 0) for i in range(n)]
+            client.set_attributes(helper.sort_attributes(attributes))
+            request = client.request_id(to, openers)
+            client.agg_cred([client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps])
+            no_pool_time, offline_time, online_time = prove_id_test(client, rp, aggr_vk)
+            writer.writerow({"num_attributes": n,
+                             "prove_id": no_pool_time,
+                             "offline": offline_time,
+                             "online": online_time})
+            print(n, no_pool_time, offline_time, online_time)
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(MAX_ATTRIBUTES, threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
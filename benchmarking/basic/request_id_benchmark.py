@@ -0,0 +1,69 @@
+import csv
+import sys
+import time
+
+from timing_benchmark import setup
+
+sys.path.append("../../src")
+
+import helper
+
+TIME_UNIT = 1000  # For ms
+MAX_ATTRIBUTES = 19
+RUNS = 20
+
+
+def request_id_test(client, openers, to):
+    """
+    Measure request_id doing everything on the request path, the precomputation alone as the pool is filled and
+    request_id with the randomness ready
+
+    :return: The average time of the three per request
+    """
+    pool = client.request_pool
+    pool.size = 0
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        client.request_id(to, openers)
+    end_time = time.perf_counter()
+    no_pool_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    pool.size = RUNS
+    start_time = time.perf_counter()
+    pool.fill()
+    end_time = time.perf_counter()
+    offline_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        client.request_id(to, openers)
+    end_time = time.perf_counter()
+    online_time = (end_time - start_time) * TIME_UNIT / RUNS
+    return no_pool_time, offline_time, online_time
+
+
+def start_test(q, ti, ni, to, no):
+    idps, client, rp, openers, aggr_vk = setup(q, ti, ni, to, no)
+    with open("../data/request_id_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["num_attributes", "request_id", "offline", "online"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        # Half private and half public attributes
+        for n in range(1, MAX_ATTRIBUTES + 1, 2):
+            attributes = [(b"attribute" + str(i).encode(), i % 2 == 0) for i in range(n)]
+            client.set_attributes(helper.sort_attributes(attributes))
+            no_pool_time, offline_time, online_time = request_id_test(client, openers, to)
+            writer.writerow({"num_attributes": n,
+                             "request_id": no_pool_time,
+                             "offline": offline_time,
+                             "online": online_time})
+            print(n, no_pool_time, offline_time, online_time)
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(MAX_ATTRIBUTES, threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
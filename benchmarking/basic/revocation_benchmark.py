@@ -0,0 +1,76 @@
+import csv
+import os
+import sys
+import time
+
+from timing_benchmark import setup
+
+sys.path.append("../../src")
+
+from helper import BpGroupHelper
+from opener import ban_users
+
+TIME_UNIT = 1000  # For ms
+BAN_LIST_SIZES = [0, 10, 100, 1000, 10000, 100000]
+WORKERS = sorted({1, os.cpu_count() or 1})
+RUNS = 3
+
+
+def fill_ban_list(size, beta):
+    """
+    Fill the ban list with revoked sigs of random users. Each one is the previous plus beta[-1] which is much faster
+    than a scalar multiplication and still gives different users that never match the proof
+
+    :param size: The size the ban list should have
+    :param beta: The beta of the aggregated vk
+    """
+    o = BpGroupHelper.o
+    ban_sig = o.random() * beta[-1]
+    while len(ban_users) < size:
+        ban_sig = ban_sig + beta[-1]
+        ban_users[len(ban_users)] = ban_sig
+
+
+def revocation_test(rp, proof, aggr_vk):
+    """
+    Measure the verification of a valid (not banned) proof which has to go through the whole ban list
+
+    :return: The average verify time and the number of revoked sigs checked
+    """
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        assert rp.verify_id(proof, aggr_vk)
+    end_time = time.perf_counter()
+    return (end_time - start_time) * TIME_UNIT / RUNS, rp.revocation.checked
+
+
+def start_test(q, ti, ni, to, no):
+    idps, client, rp, openers, aggr_vk = setup(q, ti, ni, to, no)
+    request = client.request_id(to, openers)
+    client.agg_cred([client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps])
+    proof = client.prove_id(rp.domain)
+    _, _, beta = aggr_vk
+    with open("../data/revocation_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["ban_list_size", "workers", "verify_id", "checked"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for size in BAN_LIST_SIZES:
+            fill_ban_list(size, beta)
+            for workers in WORKERS:
+                rp.revocation.workers = workers
+                verify_id_time, checked = revocation_test(rp, proof, aggr_vk)
+                writer.writerow({"ban_list_size": size,
+                                 "workers": workers,
+                                 "verify_id": verify_id_time,
+                                 "checked": checked})
+                print(size, workers, verify_id_time)
+    ban_users.clear()
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(4, threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
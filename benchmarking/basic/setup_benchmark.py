@@ -0,0 +1,53 @@
+import csv
+import os
+import sys
+import time
+
+sys.path.append("../../src")
+
+from helper import BpGroupHelper
+from idp import setup_idps
+
+TIME_UNIT = 1000  # For ms
+# (threshold, total) of the IdPs
+IDPS = [(2, 3), (3, 4), (5, 7), (7, 10), (14, 20), (34, 50)]
+ATTRIBUTES = [2, 4, 8]  # q, the number of attributes
+CLASSIC_MAX = 10  # The classic setup verifies every share of every secret one by one, so only run it for small n
+WORKERS = os.cpu_count() or 1
+RUNS = 3
+
+
+def setup_test(ti, ni, single_round):
+    """
+    :return: The average time of setup_idps
+    """
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        setup_idps(ti, ni, single_round=single_round, workers=WORKERS)
+    end_time = time.perf_counter()
+    return (end_time - start_time) * TIME_UNIT / RUNS
+
+
+def start_test():
+    with open("../data/setup_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["threshold_idp", "total_idp", "attributes", "workers", "classic", "single_round"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for q in ATTRIBUTES:
+            for ti, ni in IDPS:
+                # Start with a fresh group so the tables of the previous run do not take the memory
+                BpGroupHelper.setup(q)
+                classic_time = setup_test(ti, ni, False) if ni <= CLASSIC_MAX else ""
+                single_round_time = setup_test(ti, ni, True)
+                writer.writerow({"threshold_idp": ti,
+                                 "total_idp": ni,
+                                 "attributes": q,
+                                 "workers": WORKERS,
+                                 "classic": classic_time,
+                                 "single_round": single_round_time})
+                print(ti, ni, q, classic_time, single_round_time)
+
+
+if __name__ == "__main__":
+    start_test()
+    print("DONE")
@@ -0,0 +1,100 @@
+import csv
+import os
+import sys
+import time
+
+sys.path.append("../../src")
+
+import helper
+import snapshot
+from helper import BpGroupHelper
+from msm import precompute_vk
+from client import Client
+from idp import setup_idps
+from opener import Opener
+from rp import RP
+
+TIME_UNIT = 1000  # For ms
+ATTRIBUTES = [2, 4, 8, 16]  # q, the number of attributes
+SNAPSHOT = "../data/startup_benchmark.snapshot"
+RUNS = 10
+
+
+def make_proof(q, threshold_idp, total_idp, threshold_opener, total_opener):
+    """
+    Run the protocol once to have the aggregated vk and a proof for the verifier
+
+    :return: The aggregated vk and a CredProof for the domain of the RP
+    """
+    BpGroupHelper.setup(q)
+    idps = setup_idps(threshold_idp, total_idp)
+    aggr_vk = helper.agg_key([idp.vk for idp in idps])
+    attributes = helper.sort_attributes([(("hidden%s" % i).encode(), i % 2 == 0) for i in range(q)])
+    client = Client(attributes, aggr_vk)
+    openers = [Opener() for _ in range(total_opener)]
+    request = client.request_id(threshold_opener, openers)
+    client.agg_cred([client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps[:threshold_idp]]
+                    + [None] * (total_idp - threshold_idp))
+    return aggr_vk, client.prove_id(b"Domain")
+
+
+def startup_test(q, aggr_vk, proof):
+    """
+    Start a verifier the way the servers do, with BpGroupHelper.setup and the tables of the aggregated vk, and from a
+    snapshot. The first verification after the snapshot also pays for decoding the tables it uses
+
+    :return: The average time of the setup, the load of the snapshot and of the first verification after each one
+    """
+    rp = RP(b"Domain")
+    setup_time = first_setup_time = load_time = first_load_time = 0
+    for _ in range(RUNS):
+        start_time = time.perf_counter()
+        BpGroupHelper.setup(q)
+        precompute_vk(aggr_vk)
+        end_time = time.perf_counter()
+        setup_time += end_time - start_time
+        start_time = time.perf_counter()
+        assert rp.verify_id(proof, aggr_vk)
+        end_time = time.perf_counter()
+        first_setup_time += end_time - start_time
+
+    for _ in range(RUNS):
+        start_time = time.perf_counter()
+        loaded = snapshot.load(SNAPSHOT)
+        end_time = time.perf_counter()
+        load_time += end_time - start_time
+        start_time = time.perf_counter()
+        assert rp.verify_id(proof, loaded.aggr_vk)
+        end_time = time.perf_counter()
+        first_load_time += end_time - start_time
+    return [x * TIME_UNIT / RUNS for x in (setup_time, first_setup_time, load_time, first_load_time)]
+
+
+def start_test(threshold_idp, total_idp, threshold_opener, total_opener):
+    with open("../data/startup_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["attributes", "setup", "first_verify_setup", "snapshot", "first_verify_snapshot",
+                      "snapshot_bytes"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for q in ATTRIBUTES:
+            aggr_vk, proof = make_proof(q, threshold_idp, total_idp, threshold_opener, total_opener)
+            precompute_vk(aggr_vk)
+            snapshot.save(SNAPSHOT, aggr_vk=aggr_vk)
+            setup_time, first_setup_time, load_time, first_load_time = startup_test(q, aggr_vk, proof)
+            writer.writerow({"attributes": q,
+                             "setup": setup_time,
+                             "first_verify_setup": first_setup_time,
+                             "snapshot": load_time,
+                             "first_verify_snapshot": first_load_time,
+                             "snapshot_bytes": os.path.getsize(SNAPSHOT)})
+            print(q, setup_time, first_setup_time, load_time, first_load_time)
+    os.remove(SNAPSHOT)
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
@@ -7,7 +7,7 @@ from typing import List, Tuple
 sys.path.append("../../src")
 
 import helper
-from helper import BpGroupHelper
+from group import BpGroupHelper, TABLE_WINDOW
 from client import Client
 from idp import IdP, setup_idps
 from rp import RP
@@ -77,9 +77,9 @@ def timing_test(idps, client, rp, openers, aggr_vk, to):
     return request_id_time, provide_id_time, unblind_time, aggr_sig_time, prove_id_time, verify_id_time, deanonymize_time
 
 
-def setup(q, ti, ni, to, no):
+def setup(q, ti, ni, to, no, table_window=TABLE_WINDOW):
     # Setup
-    BpGroupHelper.setup(q)
+    BpGroupHelper.setup(q, table_window=table_window)
     idps = setup_idps(ti, ni)
     # Generate the entities in the protocol
     openers = [Opener() for _ in range(no)]
@@ -91,30 +91,35 @@ def setup(q, ti, ni, to, no):
 
 
 def start_test(q, ti, ni, to, no):
-    idps, client, rp, openers, aggr_vk = setup(q, ti, ni, to, no)
-    # # just add 10 banned random users and 10 existing users in the ledger
-    o, g2 = BpGroupHelper.o, BpGroupHelper.g2
-    for _ in range(10):
-        r = o.random()
-        # ban_users[r] = r * g2
-        ledger[r] = {1: (r * g2, r * g2, (r * g2)), 2: (r * g2, r * g2, (r * g2))}
     # Open file
     with open("../data/timing_benchmark.csv", mode="w", newline="") as file:
-        fieldnames = ['request_id', 'provide_id', 'unblind', 'aggr_sig', 'prove_id', 'verify_id', 'deanonymize']
+        fieldnames = ['table_window', 'request_id', 'provide_id', 'unblind', 'aggr_sig', 'prove_id', 'verify_id',
+                      'deanonymize']
         writer = csv.DictWriter(file, fieldnames)
         writer.writeheader()
+        # First without the fixed-base tables and then with them to see the gain of each phase
+        for table_window in [0, TABLE_WINDOW]:
+            idps, client, rp, openers, aggr_vk = setup(q, ti, ni, to, no, table_window)
+            # # just add 10 banned random users and 10 existing users in the ledger
+            o, g2 = BpGroupHelper.o, BpGroupHelper.g2
+            ledger.clear()
+            for _ in range(10):
+                r = o.random()
+                # ban_users[r] = r * g2
+                ledger[r] = {1: (r * g2, r * g2, (r * g2)), 2: (r * g2, r * g2, (r * g2))}
 
-        for i in range(ITERATIONS):
-            request_id_time, provide_id_time, unblind_time, aggr_sig_time, prove_id_time, verify_id_time, \
-                deanonymize_time = timing_test(idps, client, rp, openers, aggr_vk, threshold_opener)
-            writer.writerow({'request_id': request_id_time,
-                             'provide_id': provide_id_time,
-                             'unblind': unblind_time,
-                             'aggr_sig': aggr_sig_time,
-                             'prove_id': prove_id_time,
-                             'verify_id': verify_id_time,
-                             'deanonymize': deanonymize_time})
-            print(i)
+            for i in range(ITERATIONS):
+                request_id_time, provide_id_time, unblind_time, aggr_sig_time, prove_id_time, verify_id_time, \
+                    deanonymize_time = timing_test(idps, client, rp, openers, aggr_vk, to)
+                writer.writerow({'table_window': table_window,
+                                 'request_id': request_id_time,
+                                 'provide_id': provide_id_time,
+                                 'unblind': unblind_time,
+                                 'aggr_sig': aggr_sig_time,
+                                 'prove_id': prove_id_time,
+                                 'verify_id': verify_id_time,
+                                 'deanonymize': deanonymize_time})
+                print(table_window, i)
 
 
 if __name__ == "__main__":
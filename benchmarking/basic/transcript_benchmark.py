@@ -0,0 +1,103 @@
+import csv
+import sys
+import time
+
+sys.path.append("../../src")
+
+import helper
+from helper import BpGroupHelper
+from transcript import Transcript, PROVE_LABEL
+from client import Client
+from idp import setup_idps
+from opener import Opener
+from rp import RP
+
+TIME_UNIT = 1000  # For ms
+ATTRIBUTES = [2, 4, 8, 16]  # q, the number of attributes
+RUNS = 100
+
+
+def challenge_test(aggr_vk):
+    """
+    Hash the challenge of the proof to the RP with to_challenge and with a Transcript that has the prefix cached
+
+    :return: The average time of the two
+    """
+    g1, g2, hs = BpGroupHelper.g1, BpGroupHelper.g2, BpGroupHelper.hs
+    _, alpha, beta = aggr_vk
+    V = [BpGroupHelper.G.hashG1(("V%s" % i).encode()) for i in range(4)]  # Stand ins for Va, Vr, Vid, Vh
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        helper.to_challenge([g1, g2, alpha] + V + hs + beta)
+    end_time = time.perf_counter()
+    to_challenge_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        Transcript.prefix(PROVE_LABEL, [g1, g2] + hs + [alpha] + beta).absorb(V).challenge()
+    end_time = time.perf_counter()
+    transcript_time = (end_time - start_time) * TIME_UNIT / RUNS
+    return to_challenge_time, transcript_time
+
+
+def protocol_test(q, transcript, threshold_idp, total_idp, threshold_opener, total_opener):
+    """
+    :return: The average time of request_id, provide_id, prove_id and verify_id
+    """
+    BpGroupHelper.setup(q, transcript=transcript)
+    idps = setup_idps(threshold_idp, total_idp)
+    aggr_vk = helper.agg_key([idp.vk for idp in idps])
+    attributes = helper.sort_attributes([(("attribute%s" % i).encode(), i % 2 == 0) for i in range(q)])
+    client = Client(attributes, aggr_vk)
+    openers = [Opener() for _ in range(total_opener)]
+    rp = RP(b"Domain")
+    times = [0] * 4
+    for _ in range(RUNS // 10):
+        start_time = time.perf_counter()
+        request = client.request_id(threshold_opener, openers)
+        end_time = time.perf_counter()
+        times[0] += end_time - start_time
+        start_time = time.perf_counter()
+        sigs = [idp.provide_id(request, aggr_vk) for idp in idps[:threshold_idp]]
+        end_time = time.perf_counter()
+        times[1] += (end_time - start_time) / threshold_idp
+        client.agg_cred([client.unbind_sig(sig) for sig in sigs] + [None] * (total_idp - threshold_idp))
+        start_time = time.perf_counter()
+        proof = client.prove_id(rp.domain)
+        end_time = time.perf_counter()
+        times[2] += end_time - start_time
+        start_time = time.perf_counter()
+        assert rp.verify_id(proof, aggr_vk)
+        end_time = time.perf_counter()
+        times[3] += end_time - start_time
+    return [x * TIME_UNIT / (RUNS // 10) for x in times], aggr_vk
+
+
+def start_test(threshold_idp, total_idp, threshold_opener, total_opener):
+    with open("../data/transcript_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["attributes", "transcript", "challenge", "request_id", "provide_id", "prove_id", "verify_id"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for q in ATTRIBUTES:
+            for transcript in (False, True):
+                times, aggr_vk = protocol_test(q, transcript, threshold_idp, total_idp, threshold_opener,
+                                               total_opener)
+                challenge_time = challenge_test(aggr_vk)[transcript]
+                writer.writerow({"attributes": q,
+                                 "transcript": transcript,
+                                 "challenge": challenge_time,
+                                 "request_id": times[0],
+                                 "provide_id": times[1],
+                                 "prove_id": times[2],
+                                 "verify_id": times[3]})
+                print(q, transcript, challenge_time, *times)
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
@@ -0,0 +1,69 @@
+import csv
+import random
+import sys
+import time
+
+from timing_benchmark import setup
+
+sys.path.append("../../src")
+
+from rp import RP
+from verifycache import VerificationCache
+
+TIME_UNIT = 1000  # For ms
+REPLAYS = [0, 0.25, 0.5, 0.9]  # The fraction of the proofs that were seen before
+PROOFS = 200
+
+
+def cache_test(client, aggr_vk, replay):
+    """
+    Verify a stream of proofs where a fraction of them are replays of earlier ones, without and with the cache
+
+    :return: The average time per proof of the two, the hit rate and the saved time of the cache
+    """
+    unique = [client.prove_id(b"Domain") for _ in range(max(1, round(PROOFS * (1 - replay))))]
+    stream = unique + [random.choice(unique) for _ in range(PROOFS - len(unique))]
+    random.shuffle(stream)
+
+    rp = RP(b"Domain")
+    start_time = time.perf_counter()
+    for proof in stream:
+        assert rp.verify_id(proof, aggr_vk)
+    end_time = time.perf_counter()
+    no_cache_time = (end_time - start_time) * TIME_UNIT / len(stream)
+
+    cache = VerificationCache()
+    rp = RP(b"Domain", verification_cache=cache)
+    start_time = time.perf_counter()
+    for proof in stream:
+        assert rp.verify_id(proof, aggr_vk)
+    end_time = time.perf_counter()
+    cache_time = (end_time - start_time) * TIME_UNIT / len(stream)
+    return no_cache_time, cache_time, cache.hit_rate(), cache.saved_time * TIME_UNIT
+
+
+def start_test(q, ti, ni, to, no):
+    idps, client, _, openers, aggr_vk = setup(q, ti, ni, to, no)
+    request = client.request_id(to, openers)
+    client.agg_cred([client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps])
+    with open("../data/verify_cache_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["replay", "no_cache", "cache", "hit_rate", "saved_time"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for replay in REPLAYS:
+            no_cache_time, cache_time, hit_rate, saved_time = cache_test(client, aggr_vk, replay)
+            writer.writerow({"replay": replay,
+                             "no_cache": no_cache_time,
+                             "cache": cache_time,
+                             "hit_rate": hit_rate,
+                             "saved_time": saved_time})
+            print(replay, no_cache_time, cache_time, hit_rate, saved_time)
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(4, threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
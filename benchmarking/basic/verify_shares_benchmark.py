@@ -0,0 +1,60 @@
+import csv
+import sys
+import time
+
+sys.path.append("../../src")
+
+from helper import BpGroupHelper
+from idp import IdP
+
+TIME_UNIT = 1000  # For ms
+IDPS = [3, 5, 10, 25, 50, 100]  # The total number of IdPs, the threshold is the majority
+RUNS = 10
+
+
+def verify_shares_test(t, n):
+    """
+    The IdP in the middle verifies the shares that the other n-1 dealers sent to it, one by one with verify_share and
+    all together with verify_shares
+
+    :return: The average time of the two
+    """
+    idps = [IdP(i, t, n) for i in range(1, n + 1)]
+    verifier = idps[n // 2]
+    shares = {idp.id: ((idp.s_shares[verifier.id], idp.b_shares[verifier.id]), idp.commitment_coeffs)
+              for idp in idps if idp is not verifier}
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        for share, commitment_coeffs in shares.values():
+            assert verifier.verify_share(t, share, commitment_coeffs)
+    end_time = time.perf_counter()
+    single_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        assert not verifier.verify_shares(t, shares)
+    end_time = time.perf_counter()
+    batch_time = (end_time - start_time) * TIME_UNIT / RUNS
+    return single_time, batch_time
+
+
+def start_test(q):
+    BpGroupHelper.setup(q)
+    with open("../data/verify_shares_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["threshold_idp", "total_idp", "verify_share", "verify_shares"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        for ni in IDPS:
+            ti = ni // 2 + 1
+            single_time, batch_time = verify_shares_test(ti, ni)
+            writer.writerow({"threshold_idp": ti,
+                             "total_idp": ni,
+                             "verify_share": single_time,
+                             "verify_shares": batch_time})
+            print(ti, ni, single_time, batch_time)
+
+
+if __name__ == "__main__":
+    start_test(4)
+    print("DONE")
@@ -0,0 +1,78 @@
+import csv
+import sys
+import time
+from json import dumps, loads
+
+from timing_benchmark import setup
+
+sys.path.append("../../src")
+
+import helper
+from request import Request
+from credproof import CredProof
+
+TIME_UNIT = 1000  # For ms
+MAX_ATTRIBUTES = 19
+RUNS = 20
+
+
+def format_test(encode, decode, message):
+    """
+    Measure the encoding and the decoding of a message
+
+    :return: The size of the encoded message in bytes and the average encode and decode times
+    """
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        data = encode(message)
+    end_time = time.perf_counter()
+    encode_time = (end_time - start_time) * TIME_UNIT / RUNS
+
+    start_time = time.perf_counter()
+    for _ in range(RUNS):
+        decode(data)
+    end_time = time.perf_counter()
+    decode_time = (end_time - start_time) * TIME_UNIT / RUNS
+    return len(data), encode_time, decode_time
+
+
+def start_test(q, ti, ni, to, no):
+    idps, client, rp, openers, aggr_vk = setup(q, ti, ni, to, no)
+    # The JSON bodies are the ones the clients send to server.py
+    formats = [
+        ("request", "json", lambda r: dumps({"request": r.to_json()}).encode(),
+         lambda data: Request.from_json(loads(data)["request"])),
+        ("request", "binary", Request.to_bytes, lambda data: Request.from_bytes(memoryview(data))),
+        ("proof", "json", lambda p: dumps({"proof": p.to_json()}).encode(),
+         lambda data: CredProof.from_json(loads(data)["proof"])),
+        ("proof", "binary", CredProof.to_bytes, lambda data: CredProof.from_bytes(memoryview(data))),
+    ]
+    with open("../data/wire_benchmark.csv", mode="w", newline="") as file:
+        fieldnames = ["message", "format", "num_attributes", "bytes", "encode", "decode"]
+        writer = csv.DictWriter(file, fieldnames)
+        writer.writeheader()
+        # Half private and half public attributes
+        for n in range(1, MAX_ATTRIBUTES + 1, 2):
+            attributes = [(b"attribute" + str(i).encode(), i % 2 == 0) for i in range(n)]
+            client.set_attributes(helper.sort_attributes(attributes))
+            request = client.request_id(to, openers)
+            client.agg_cred([client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps])
+            messages = {"request": request, "proof": client.prove_id(rp.domain)}
+            for message, wire_format, encode, decode in formats:
+                size, encode_time, decode_time = format_test(encode, decode, messages[message])
+                writer.writerow({"message": message,
+                                 "format": wire_format,
+                                 "num_attributes": n,
+                                 "bytes": size,
+                                 "encode": encode_time,
+                                 "decode": decode_time})
+                print(message, wire_format, n, size, encode_time, decode_time)
+
+
+if __name__ == "__main__":
+    threshold_idp = 3
+    total_idp = 4
+    threshold_opener = 2
+    total_opener = 3
+    start_test(MAX_ATTRIBUTES, threshold_idp, total_idp, threshold_opener, total_opener)
+    print("DONE")
@@ -0,0 +1,77 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+from group import BpGroupHelper
+from helper import hash_attribute
+from msm import fixed_mul
+
+ATTRIBUTE_CACHE_SIZE = 1024  # The number of public attribute commitments we keep
+
+
+class AttributeCache:
+    """
+    LRU cache of what the public attributes cost for a vk. Public attributes like the country take only a few values,
+    so the RP and the client keep beta_i^hash(value) and the IdP keeps y_i * hash(value) instead of hashing and
+    multiplying for every proof and request. The entries are keyed by (position, value, beta_i of the vk) and are
+    dropped when the vk does not exist anymore
+    """
+
+    def __init__(self, size=ATTRIBUTE_CACHE_SIZE):
+        """
+        :param size: The maximum number of entries
+        """
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        # {(kind, position, value, id(beta_i)): (weakref to beta_i, entry)} in least recently used order
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()  # The async server looks up the commitments from many threads
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def __get(self, kind, position, value, point, compute):
+        key = (kind, position, value, id(point))
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0]() is point:
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        result = compute()  # Outside of the lock, two threads may compute the same entry but never wait on each other
+        with self.__lock:
+            self.__entries[key] = (weakref.ref(point), result)
+            if len(self.__entries) > self.size:
+                self.__entries.popitem(last=False)
+        return result
+
+    def commitment(self, position, value, vk):
+        """
+        :param position: The position of the public attribute
+        :param value: The value of the attribute as bytes
+        :param vk: The vk in the form (g2, alpha, beta)
+        :return: beta_position^hash(value)
+        """
+        beta_i = vk[2][position]
+        return self.__get(0, position, value, beta_i, lambda: fixed_mul(beta_i, hash_attribute(value)))
+
+    def exponent(self, position, value, vk, y_i):
+        """
+        :param position: The position of the public attribute
+        :param value: The value of the attribute as bytes
+        :param vk: The vk of the IdP in the form (g2, alpha, beta)
+        :param y_i: The y of the sk at this position
+        :return: y_i * hash(value) mod o
+        """
+        return self.__get(1, position, value, vk[2][position],
+                          lambda: y_i * hash_attribute(value) % BpGroupHelper.o)
+
+
+# The cache that the RP and the client use if they are not given their own, every IdP has its own by default
+attribute_cache = AttributeCache()
@@ -1,26 +1,52 @@
+from collections import OrderedDict
 from hashlib import sha256
 
-from bplib.bp import G1Elem, G2Elem
 from petlib.bn import Bn
 
+import attributecache
 import helper
+import transcript
 from helper import BpGroupHelper, ElGamal, Polynomial
+from precompute import PrecomputePool
+from opcounter import counted
+from msm import multi_mul, fixed_mul
 from request import Request
 from credproof import CredProof
 
 
+PROOF_POOL_SIZE = 0  # The number of presentations prepared before prove_id is called, 0 for none
+REQUEST_POOL_SIZE = 0  # The number of request randomness sets prepared before request_id is called, 0 for none
+DOMAIN_CACHE_SIZE = 8  # The number of RP domains we keep the hash, the table and the pseudonym for
+
+
 class Client:
-    def __init__(self, attributes, vk):
+    def __init__(self, attributes, vk, proof_pool_size=PROOF_POOL_SIZE, request_pool_size=REQUEST_POOL_SIZE,
+                 attribute_cache=None):
+        """
+        :param attributes: The attributes of the user as (attribute, private)
+        :param vk: The aggregated vk of the IdPs
+        :param proof_pool_size: The number of presentations to prepare ahead for prove_id, see start_precomputation
+        :param request_pool_size: The number of randomness sets to prepare ahead for request_id
+        :param attribute_cache: The attributecache.AttributeCache of the public attributes, the shared one by default
+        """
         assert len(attributes) <= len(BpGroupHelper.hs) - 1
         self.__elgamal = ElGamal(BpGroupHelper.g1)
         self.__attributes = attributes
         #  The hashed attributes in the style (hash, True/False) indicating private or not
         self.__hashed_attributes = helper.hash_attributes(attributes)
         self.__aggr_vk = vk
+        # {domain: (group, HashG1(domain), pseudonym)} of the RPs used most recently
+        self.__domains = OrderedDict()
+        self.__attribute_cache = attribute_cache if attribute_cache is not None else attributecache.attribute_cache
         self.__sig = None
         self.__secret = BpGroupHelper.o.random()
         self.__id = BpGroupHelper.o.random()
+        # The domain independent part of prove_id
+        self.proof_pool = PrecomputePool(self.__prepare_presentation, proof_pool_size)
+        # The randomness of request_id and the points that only depend on it
+        self.request_pool = PrecomputePool(self.__prepare_request, request_pool_size)
 
+    @counted("request_id")
     def request_id(self, to, openers):
         """
         The client constructs a request to send to the IdP for credentials
@@ -29,52 +55,73 @@ class Client:
         :param openers: All the openers entities
         :return: A request for credentials
         """
-        self.__hashed_attributes = helper.hash_attributes(self.__attributes)
-        G, o, g1 = BpGroupHelper.G, BpGroupHelper.o, BpGroupHelper.g1
-        Cm, r = self.__create_commitment()
+        G = BpGroupHelper.G
+        (r, r_g1), enc_randomness, witnesses = self.request_pool.get()
+        Cm = self.__create_commitment(r_g1)
 
         h = G.hashG1(Cm.export())
         # El-gamal encryption
-        enc = self.__encrypt_elgamal(h)
+        enc = self.__encrypt_elgamal(h, enc_randomness)
         (a, b, k) = zip(*enc)
         cypher = list(zip(a, b))
         # Secret sharing for de anonymizing the user
         opening_params = self.__opening_setup(to, openers, h)
         # ZKP
-        pi_s = self.__create_zkp_idp(self.__elgamal.pk, Cm, k, r, h)
+        pi_s = self.__create_zkp_idp(Cm, k, r, h, witnesses)
         public_attributes = ["" if attr[1] else attr[0] for attr in self.__attributes]
         return Request(self.__id, self.__elgamal.pk, Cm, cypher, pi_s, public_attributes, opening_params,
                        h * self.__secret)
 
-    def __encrypt_elgamal(self, h):
+    def __prepare_request(self):
+        """
+        The part of request_id that does not depend on the attributes: the randomness of the commitment, of the el gamal
+        encryptions and the witnesses of the ZKP with their commitments
+
+        :return: ((r, g1^r), [(k_i, g1^k_i, pk^k_i)], (wr, wk, wa, ws, Va, pk^wk_i, Vc))
+        """
+        o, g1, hs = BpGroupHelper.o, BpGroupHelper.g1, BpGroupHelper.hs
+        pk = self.__elgamal.pk
+        private = len([attribute for attribute in self.__attributes if attribute[1]])
+        r = o.random()
+        enc_randomness = [self.__elgamal.precompute() for _ in range(private)]
+        # Witnesses of the ZKP
+        wr = o.random()  # Randomness for the r in the commitment
+        wk = [o.random() for _ in range(private)]  # Randomness for the randomness k in el gamal
+        wa = [o.random() for _ in self.__attributes]  # Randomness for the attributes
+        ws = o.random()  # Randomness for the secret of the user
+        Va = [fixed_mul(g1, wki) for wki in wk]  # For the elgamal encryption the alpha
+        Vpk = [wki * pk for wki in wk]  # The part of the elgamal beta without h
+        Vc = multi_mul([g1] + hs[:len(wa)], [wr] + wa)  # For the commitment of the attributes (C)
+        return (r, fixed_mul(g1, r)), enc_randomness, (wr, wk, wa, ws, Va, Vpk, Vc)
+
+    def __encrypt_elgamal(self, h, enc_randomness):
         """
         Encrypt the attributes using el-gamal in order to take advantage of its homomorphic properties
         enc_i = g1^k_i, pk^k_i * h ^ attribute_i
 
         :param h: Hash(C) where C is the commitment of the attributes
+        :param enc_randomness: The precomputed (k_i, g1^k_i, pk^k_i) of every private attribute
         :return: enc list in the style (a_i, b_i, randomness used k_i)
         """
         enc = []
-        for i, attribute in enumerate(self.__hashed_attributes):
-            if attribute[1]:
-                enc.append(self.__elgamal.encrypt(attribute[0] * h))
+        private = [attribute for attribute in self.__hashed_attributes if attribute[1]]
+        for attribute, randomness in zip(private, enc_randomness):
+            enc.append(self.__elgamal.encrypt(attribute[0] * h, randomness))
         return enc
 
-    def __create_commitment(self):
+    def __create_commitment(self, r_g1):
         """
         Create the commitment of the attributes in order to generate a similar base for the IdP
         C = g1^r * h_i^attribute_i
 
-        :return: The commitment and the randomness use to create it
+        :param r_g1: The precomputed g1^r
+        :return: The commitment
         """
-        o, g1, hs = BpGroupHelper.o, BpGroupHelper.g1, BpGroupHelper.hs
-        r = o.random()
-        C = r * g1
-        for i, attribute in enumerate(self.__hashed_attributes):
-            C += attribute[0] * hs[i]
-        return C, r
+        hs = BpGroupHelper.hs
+        return r_g1 + multi_mul(hs[:len(self.__hashed_attributes)],
+                                       [attribute[0] for attribute in self.__hashed_attributes])
 
-    def __create_zkp_idp(self, pk, C, k, r, h):
+    def __create_zkp_idp(self, C, k, r, h, witnesses):
         """
         Create the ZKP for the randomness r used for the commitment, for the whole commitment, for elgamal enc, and for
         the user secret
@@ -89,30 +136,21 @@ class Client:
         ra = random_a_i - c * attribute_i
         rs = random_s - c * secret
 
-        :param pk: The public key used for el gamal encryption
         :param C: The commitment of the attributes
         :param k: The randomness used for the el gamal encryption
         :param r: The randomness used for the commitment
         :param h: The HashG1(C) that was used for the el gamal encryption, and for the h^secret
+        :param witnesses: The witnesses and the commitments that do not depend on h from __prepare_request
         :return: the responses rr,rk,ra, rs and the challenge c see above
         """
         o, g1, hs, g2 = BpGroupHelper.o, BpGroupHelper.g1, BpGroupHelper.hs, BpGroupHelper.g2
-        # Compute witnesses
-        wr = o.random()  # Randomness for the r in the commitment
-        wk = [o.random() for _ in k]  # Randomness for the randomness k in el gamal
-        wa = [o.random() for _ in self.__attributes]  # Randomness for the attributes
-        ws = o.random()  # Randomness for the secret of the user
-        # Compute the commitments
-        Va = [g1 * wki for wki in wk]  # For the elgamal encryption the alpha
-        Vb = []  # For the elgamal encryption the beta
-        Vc = wr * g1  # For the commitment of the attributes (C)
+        wr, wk, wa, ws, Va, Vpk, Vc = witnesses
+        # Compute the commitments that depend on h
         Vs = h * ws
-        for i, attribute in enumerate(self.__attributes):
-            if attribute[1]:
-                Vb.append(wk[i] * pk + wa[i] * h)
-            Vc += wa[i] * hs[i]
+        Vb = [Vpk[i] + fixed_mul(h, wa[i]) for i in range(len(wk))]  # For the elgamal encryption the beta
         # Compute the challenge
-        c = helper.to_challenge([g1, g2, C, h, Vc, Vs] + hs + Va + Vb)
+        c = transcript.challenge(transcript.REQUEST_LABEL, [g1, g2] + hs, [C, h, Vc, Vs] + Va + Vb,
+                             [g1, g2, C, h, Vc, Vs] + hs + Va + Vb)
         # Compute the responses
         rr = (wr - c * r) % o  # response for the r randomness
         rk = [(wk[i] - c * k[i]) % o for i in range(len(wk))]  # response for the k's randomness
@@ -142,9 +180,9 @@ class Client:
             s = Polynomial.evaluate(coeff, i)
             # print(s, i)
             r = o.random()
-            c0 = g2 * r
+            c0 = fixed_mul(g2, r)
             _, _, b = self.__aggr_vk
-            c1 = openers[i - 1].pk * r + b[-1] * s
+            c1 = multi_mul([openers[i - 1].pk, b[-1]], [r, s])
             proof = self.__create_opening_proof(r, c1, h, openers[i - 1].pk)
             c[i] = (c0, c1, proof)
         return c, h_coeff
@@ -162,10 +200,10 @@ class Client:
         """
         g2, o, e = BpGroupHelper.g2, BpGroupHelper.o, BpGroupHelper.e
         w = o.random()
-        Vc0 = g2 * w
+        Vc0 = fixed_mul(g2, w)
         Vc1 = e(h, c1 - opener_pk * r)
-        c = helper.to_challenge([g2, h, Vc0, Vc1])
-        rr = w - c * r
+        c = transcript.challenge(transcript.OPENING_LABEL, [g2], [h, Vc0, Vc1], [g2, h, Vc0, Vc1])
+        rr = (w - c * r) % o
         return c, rr, Vc1
 
     def unbind_sig(self, sig_prime):
@@ -179,13 +217,29 @@ class Client:
         sig = h, self.__elgamal.decrypt(c_prime)
         return sig
 
-    def agg_cred(self, sigs):
+    @counted("agg_cred")
+    def agg_cred(self, sigs, check=False):
         """
         Aggregate all the credentials generated from the different IdP and store it in sig
 
         :param sigs: A list of the signatures
+        :param check: True to store the aggregated sig only if it verifies, the old one is kept otherwise
+        :return: True if the sig was stored False otherwise
+        """
+        sig = self.aggregate(sigs)
+        if check and not self.verify_sig(sig):
+            return False
+        self.__sig = sig
+        self.proof_pool.clear()  # The presentations of the old signature are useless
+        return True
+
+    def aggregate(self, sigs):
+        """
+        Aggregate the credentials of the IdPs without storing the result
+
+        :param sigs: A list of the signatures, None for the IdPs that did not answer
+        :return: The aggregated sig
         """
-        G = BpGroupHelper.G
         filter = []
         indexes = []
         for i, sig in enumerate(sigs):
@@ -194,47 +248,90 @@ class Client:
                 indexes.append(i + 1)
         l = Polynomial.lagrange_interpolation(indexes)
         h, s = zip(*filter)
-        aggr_sig = G1Elem.inf(G)
-        for i in range(len(filter)):
-            aggr_sig += l[i] * s[i]
-        self.__sig = h[0], aggr_sig
+        return h[0], multi_mul(s, l)
 
-    def verify_sig(self):
+    def verify_sig(self, sig=None, vk=None):
         """
         Verify the generation of the signature from the IdP and the aggregation
         e(h, b_i ^ attribute_i) = e(s, g2)
+        Also used to check the unblinded share of a single IdP against its own vk
 
+        :param sig: The signature to check, defaults to the aggregated one
+        :param vk: The vk to check with, defaults to the aggregated one
         :return: True if it is correct false otherwise
         """
         e = BpGroupHelper.e
-        g2, alpha, beta = self.__aggr_vk
-        h, s = self.__sig
-        verification_result = alpha + beta[-1] * self.__secret
-        for i, attribute in enumerate(self.__hashed_attributes):
-            verification_result += beta[i] * attribute[0]
+        g2, alpha, beta = self.__aggr_vk if vk is None else vk
+        h, s = self.__sig if sig is None else sig
+        verification_result = multi_mul(
+            [alpha, beta[-1]] + beta[:len(self.__hashed_attributes)],
+            [1, self.__secret] + [attribute[0] for attribute in self.__hashed_attributes])
         return not h.isinf() and e(h, verification_result) == e(s, g2)
 
+    @counted("prove_id")
     def prove_id(self, rp_domain):
         """
-        A credential proof that the user will send to the RP for authentication
+        A credential proof that the user will send to the RP for authentication. The domain independent part comes
+        from the proof pool when it has a presentation ready
 
         :param rp_domain: The domain of the RP to send the proof
         :return: The credential proof
         """
-        domain_hash = BpGroupHelper.G.hashG1(rp_domain)
-        user_id = domain_hash * self.__secret
+        domain_hash, user_id = self.__domain(rp_domain)
+        sig_prime, k, r, attribute_commitment, vu, h_secret, witnesses = self.proof_pool.get()
+        # ZKP
+        pi_v = self.__create_zkp_rp(r, domain_hash, witnesses)
+        public_attributes = ["" if attr[1] else attr[0] for attr in self.__attributes]
+        return CredProof(user_id, k, vu, sig_prime, pi_v, public_attributes, h_secret, attribute_commitment)
+
+    def __domain(self, rp_domain):
+        """
+        The hash of the domain of an RP and the pseudonym of the user for it only change with the group, so we keep
+        them for the DOMAIN_CACHE_SIZE RPs used most recently. The hash gets a fixed-base table for the Vid of the ZKP
+
+        :param rp_domain: The domain of the RP
+        :return: HashG1(domain), HashG1(domain)^secret
+        """
+        G = BpGroupHelper.G
+        entry = self.__domains.get(rp_domain)
+        if entry is None or entry[0] is not G:
+            domain_hash = G.hashG1(rp_domain)
+            BpGroupHelper.precompute([domain_hash])
+            entry = self.__domains[rp_domain] = (G, domain_hash, fixed_mul(domain_hash, self.__secret))
+            if len(self.__domains) > DOMAIN_CACHE_SIZE:
+                self.__domains.popitem(last=False)
+        self.__domains.move_to_end(rp_domain)
+        return entry[1], entry[2]
+
+    def start_precomputation(self):
+        """
+        Keep proof_pool_size presentations and request_pool_size request randomness sets ready in background threads,
+        so prove_id only does the domain dependent part and request_id the attribute dependent part
+        """
+        self.proof_pool.start()
+        self.request_pool.start()
+
+    def stop_precomputation(self):
+        self.proof_pool.stop()
+        self.request_pool.stop()
+
+    def __prepare_presentation(self):
+        """
+        The part of prove_id that does not depend on the RP: the randomized signature, k, vu and the witnesses of the
+        ZKP
+
+        :return: (sig_prime, k, r, attributes_commitment, vu, h_prime^secret, witnesses)
+        """
+        if self.__sig is None:
+            raise Exception("No credential yet")
         # Randomise the sig
         h_prime, s_prime = self.__randomize_signature()
-        sig_prime = h_prime, s_prime
         # Create the K
         k, r, attribute_commitment = self.__commit_values()
         # Create the vu
         vu = r * h_prime
-        # ZKP
-        pi_v = self.__create_zkp_rp(h_prime, r, domain_hash)
-        public_attributes = ["" if attr[1] else attr[0] for attr in self.__attributes]
-        return CredProof(user_id, k, vu, sig_prime, pi_v, public_attributes, h_prime * self.__secret,
-                         attribute_commitment)
+        witnesses = self.__create_zkp_rp_witnesses(h_prime)
+        return (h_prime, s_prime), k, r, attribute_commitment, vu, h_prime * self.__secret, witnesses
 
     def __randomize_signature(self):
         """
@@ -256,55 +353,64 @@ class Client:
 
         :return: The k created and the randomness it was to create it
         """
-        G, o = BpGroupHelper.G, BpGroupHelper.o
+        o = BpGroupHelper.o
         g2, alpha, beta = self.__aggr_vk
         r = o.random()
-        k = alpha
-        attribute_commitment = G2Elem.inf(G)
-        for i, attribute in enumerate(self.__hashed_attributes):
-            if attribute[1]:
-                k += attribute[0] * beta[i]
-            else:
-                attribute_commitment += attribute[0] * beta[i]
-        k += r * g2
-        attribute_commitment += k
+        private = [i for i, attribute in enumerate(self.__hashed_attributes) if attribute[1]]
+        k = multi_mul([alpha, g2] + [beta[i] for i in private],
+                             [1, r] + [self.__hashed_attributes[i][0] for i in private])
+        attribute_commitment = k
+        for i, (attribute, hidden) in enumerate(self.__attributes):
+            if not hidden:
+                attribute_commitment = attribute_commitment + self.__attribute_cache.commitment(i, attribute,
+                                                                                               self.__aggr_vk)
         return k, r, attribute_commitment
 
-    def __create_zkp_rp(self, h, r, domain):
+    def __create_zkp_rp_witnesses(self, h):
+        """
+        The witnesses of the ZKP for prove_id and their commitments that do not depend on the domain of the RP
+        Vr = h^random_r
+        Va = alpha * beta_i^random_a_i * g2 ^ random_r
+        Vh = h ^ random_s
+
+        :param h: The h of the randomized signature that will be sent to the RP
+        :return: (wr, wa, ws, Vr, Va, Vh)
+        """
+        o = BpGroupHelper.o
+        (g2, alpha, beta) = self.__aggr_vk
+        # Create witnesses and commitments
+        wr = o.random()  # Witness for the r
+        Vr = wr * h  # The commitment for the r
+        wa = [o.random() for attribute in self.__attributes if attribute[1]]  # Witness for the attributes
+        Va = multi_mul([g2, alpha] + beta[:len(wa)], [wr, 1] + wa)  # Witness for the attributes and key
+        # For proving that the user_id and h_secret are created using the secret
+        ws = o.random()
+        Vh = h * ws
+        return wr, wa, ws, Vr, Va, Vh
+
+    def __create_zkp_rp(self, r, domain, witnesses):
         """
         Create the ZKP for the randomness r used to create k, for knowledge of the private attribtues
         and correct construction of the vk. We also need to prove that user_id and h_secret has the same exponent
         the secret
-        Vr = h^random_r
-        Va = alpha * beta_i^random_a_i * g2 ^ random_r
         Vid = domain ^ random_s
-        Vh = h ^ random_s
         c = (g1 || g2 || alpha || Va || Vr ||Vid || Vh || hs || beta)
         rr = randdom_r - c * r
         ra = random_a_i - c * attribute_i
         rs = random_s - c * user_secret
 
-        :param sig: The randomized signature that will be sent to the RP
         :param r: The randdomness used to create k
+        :param domain: The hash of the domain of the RP
+        :param witnesses: The witnesses and commitments of __create_zkp_rp_witnesses
         :return: The responses rr, ra, rs and the challenge c see above
         """
-        G, o, g1, hs = BpGroupHelper.G, BpGroupHelper.o, BpGroupHelper.g1, BpGroupHelper.hs
+        o, g1, hs = BpGroupHelper.o, BpGroupHelper.g1, BpGroupHelper.hs
         (g2, alpha, beta) = self.__aggr_vk
-        # Create witnesses and commitments
-        wr = o.random()  # Witness for the r
-        Vr = wr * h  # The commitment for the r
-        wa = []  # Witness for the attributes
-        Va = wr * g2 + alpha  # Witness for the attributes and key
-        for i, attribute in enumerate(self.__attributes):
-            if attribute[1]:
-                wa.append(o.random())
-                Va += wa[i] * beta[i]
-        # For proving that the user_id and h_secret are created using the secret
-        ws = o.random()
-        Vid = domain * ws
-        Vh = h * ws
+        wr, wa, ws, Vr, Va, Vh = witnesses
+        Vid = fixed_mul(domain, ws)
         # Compute the challenge
-        c = helper.to_challenge([g1, g2, alpha, Va, Vr, Vid, Vh] + hs + beta)
+        c = transcript.challenge(transcript.PROVE_LABEL, [g1, g2] + hs + [alpha] + beta, [Va, Vr, Vid, Vh],
+                             [g1, g2, alpha, Va, Vr, Vid, Vh] + hs + beta)
         # Compute the responses
         ra = [(wmi - c * attribute[0]) % o for wmi, attribute in zip(wa, self.__hashed_attributes) if wmi is not None]
         rr = (wr - c * r) % o
@@ -319,3 +425,5 @@ class Client:
         """
         self.__attributes = attributes
         self.__hashed_attributes = helper.hash_attributes(attributes)
+        self.proof_pool.clear()
+        self.request_pool.clear()
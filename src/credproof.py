@@ -1,4 +1,5 @@
 from helper import pack, unpack
+from wire import encode_proof, decode_proof
 
 
 class CredProof:
@@ -42,3 +43,21 @@ class CredProof:
         :return: CredProof instance.
         """
         return cls(**unpack(data))
+
+    def to_bytes(self):
+        """
+        Convert the instance variables to the binary wire format, see wire.py
+
+        :return: The encoded class
+        """
+        return encode_proof(self)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Create an instance of CredProof from the binary wire format.
+
+        :param data: The encoded class as bytes or memoryview.
+        :return: CredProof instance.
+        """
+        return cls(*decode_proof(data))
@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from credproof import CredProof
+from opener import ledger, is_user, ban_user
+
+# Ledgers smaller than this are scanned on the calling process, forking a pool is not worth it below that
+PARALLEL_THRESHOLD = 500
+# The number of ledger entries each task scans, the progress is reported once per chunk
+CHUNK_SIZE = 64
+
+# The scan of the worker and the stop event. Every scan forks its own pool and hands them over in initargs, the
+# workers are forked so they inherit them instead of pickling them
+_job = None
+_stop = None
+
+
+def _init_worker(stop, job):
+    """
+    Runs once in every forked worker and keeps the scan and the event that tells the workers that someone found the
+    user
+
+    :param stop: The shared event
+    :param job: (openers, ledger entries, proof, vk) of the scan
+    """
+    global _stop, _job
+    _stop, _job = stop, job
+
+
+def _scan_chunk(start, end):
+    """
+    Scan a part of the ledger inside a worker process
+
+    :param start: The first index of the chunk
+    :param end: The index after the last one of the chunk
+    :return: (The index of the user or None if not in the chunk, number of entries checked)
+    """
+    openers, entries, proof, vk = _job
+    for i in range(start, end):
+        if _stop.is_set():
+            return None, i - start  # Another worker found the user already
+        _, c = entries[i]
+        if is_user(openers, c, proof, vk):
+            _stop.set()
+            return i, i - start + 1  # The ids are Bn's that cannot be pickled so return the index
+    return None, end - start
+
+
+class Deanonymizer:
+    """
+    Traces the user behind a proof by scanning the ledger like opener.deanonymize, but splits the ledger in chunks
+    that run on a pool of workers. The first worker that finds the user stops the others, and the progress is
+    reported after every chunk
+    """
+
+    def __init__(self, openers, workers=None, chunk_size=CHUNK_SIZE, parallel_threshold=PARALLEL_THRESHOLD):
+        """
+        :param openers: All the openers necessary
+        :param workers: The number of worker processes, defaults to the number of cores
+        :param chunk_size: The number of ledger entries each task scans
+        :param parallel_threshold: The size of the ledger from which we start using the workers
+        """
+        self.openers = openers
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.parallel_threshold = parallel_threshold
+        self.scanned = 0  # The number of ledger entries checked in the last trace
+
+    def trace(self, proof: CredProof, vk, progress=None):
+        """
+        Find the user that created the proof and add him to the ban list
+
+        :param proof: The proof the user tried to send to the RP
+        :param vk: The aggregated vk of the IdPs that created the sig
+        :param progress: Optional callback progress(scanned, total) called after every chunk
+        :return: 0 if the user was not found the id otherwise
+        """
+        user_id = 0
+        for scanned, total, found in self.scan(proof, vk):
+            if progress is not None:
+                progress(scanned, total)
+            if found is not None:
+                user_id = found
+        return user_id
+
+    def scan(self, proof: CredProof, vk):
+        """
+        Scan the ledger for the user that created the proof. If he is found he is added in the ban list
+
+        :param proof: The proof the user tried to send to the RP
+        :param vk: The aggregated vk of the IdPs that created the sig
+        :return: A generator of (entries scanned, ledger size, the user id or None) once per chunk
+        """
+        entries = list(ledger.items())  # Snapshot so the ledger can grow while we scan
+        self.scanned = 0
+        if len(entries) < self.parallel_threshold or self.workers < 2 \
+                or "fork" not in multiprocessing.get_all_start_methods():
+            results = self.__scan(entries, proof, vk)
+        else:
+            results = self.__scan_parallel(entries, proof, vk)
+        for found, checked in results:
+            self.scanned += checked
+            if found is not None:
+                ban_user(self.openers, found, ledger[found])
+            yield self.scanned, len(entries), found
+
+    def __chunks(self, entries):
+        return [(i, min(i + self.chunk_size, len(entries))) for i in range(0, len(entries), self.chunk_size)]
+
+    def __scan(self, entries, proof, vk):
+        """
+        Scan the ledger chunk by chunk in this process and stop at the first match
+
+        :return: A generator of (the user id or None, entries checked) once per chunk
+        """
+        for start, end in self.__chunks(entries):
+            for i in range(start, end):
+                user_id, c = entries[i]
+                if is_user(self.openers, c, proof, vk):
+                    yield user_id, i - start + 1
+                    return
+            yield None, end - start
+
+    def __scan_parallel(self, entries, proof, vk):
+        """
+        Scan the ledger chunks on forked workers. When a worker finds the user the rest are stopped
+
+        :return: A generator of (the user id or None, entries checked) once per chunk
+        """
+        context = multiprocessing.get_context("fork")
+        stop = context.Event()
+        job = (self.openers, entries, proof, vk)
+        with ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(stop, job)) as pool:
+            pending = {pool.submit(_scan_chunk, start, end) for start, end in self.__chunks(entries)}
+            try:
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future.cancelled():
+                            continue
+                        index, checked = future.result()
+                        yield None if index is None else entries[index][0], checked
+                        if index is not None:
+                            for future_left in pending:
+                                future_left.cancel()
+            finally:
+                stop.set()  # In case the caller stopped reading the progress before the end
@@ -0,0 +1,219 @@
+import threading
+import weakref
+from collections import OrderedDict
+
+from bplib.bp import BpGroup, G1Elem
+
+TABLE_WINDOW = 4  # The default window of the fixed-base tables in bits
+TABLE_MEMORY = 64 * 2 ** 20  # The default memory limit of all the fixed-base tables together in bytes
+# Approximate memory of one point in a table, measured on bplib
+G1_POINT_BYTES = 490
+G2_POINT_BYTES = 780
+
+
+class BpGroupHelper:
+    """
+    Just a helper function to instantiate the BpGroup() once and then be able to call it from all functions
+    """
+
+    G = g1 = g2 = e = o = hs = g_secret = h_secret = None
+    msm = True  # Use the multi-exponentiation for the linear combinations of points
+    transcript = True  # Hash the challenges with Transcript, False for to_challenge like the older versions
+    counter = None  # The OpCounter when the operations are counted, None otherwise
+    stage_timer = None  # The StageTimer of a server that times the stages of its requests, None otherwise
+    # The fixed-base tables in the form {id(point): (weakref to the point, table)} in least recently used order
+    tables = OrderedDict()
+    pinned = set()  # The ids of the points whose tables are never dropped to free memory, the generators
+    # Guards the tables, the async server multiplies on many threads. Reentrant because a point that dies while the
+    # lock is held drops its table from the weakref callback on the same thread
+    table_lock = threading.RLock()
+    table_window = TABLE_WINDOW  # The window of the new tables in bits, 0 to not use tables at all
+    table_memory = TABLE_MEMORY  # The maximum memory all the tables together can use in bytes
+    table_bytes = 0  # The memory the tables use at the moment in bytes
+
+    @staticmethod
+    def setup(q, msm=True, table_window=TABLE_WINDOW, table_memory=TABLE_MEMORY, group=None, generators=None,
+              precompute=True, transcript=True, count_ops=False):
+        """
+        Sets up the parameters of the class
+        :param q: The maximum number of the attributes
+        :param msm: False to compute the linear combinations of points one term at a time, used for benchmarking
+        :param table_window: The window of the fixed-base tables in bits, 0 to not use tables
+        :param table_memory: The maximum memory of all the fixed-base tables in bytes
+        :param group: The BpGroup to use instead of creating one, e.g. to decode the generators of a snapshot
+        :param generators: (hs, g_secret, h_secret) to use instead of hashing them, e.g. from a snapshot
+        :param precompute: False to not build the tables of the generators, when they are loaded from a snapshot
+        :param transcript: False to hash the challenges with to_challenge, to talk to the older versions
+        :param count_ops: True to count the group operations of every protocol call, see OpCounter
+        """
+        assert q > 0
+        BpGroupHelper.msm = msm
+        BpGroupHelper.transcript = transcript
+        BpGroupHelper.G = group if group is not None else BpGroup()
+        BpGroupHelper.g1, BpGroupHelper.g2 = BpGroupHelper.G.gen1(), BpGroupHelper.G.gen2()
+        BpGroupHelper.e, BpGroupHelper.o = BpGroupHelper.G.pair, BpGroupHelper.G.order()
+        if generators is None:
+            # q+1 to add for the additional y we need for the openers. One h for each attribute + 1 h for the secret
+            BpGroupHelper.hs = [BpGroupHelper.G.hashG1(("h%s" % i).encode()) for i in range(q + 1)]
+            # Generators for the commitments in the key generation of the IdPs
+            BpGroupHelper.g_secret = BpGroupHelper.G.hashG1("s_secret".encode())
+            BpGroupHelper.h_secret = BpGroupHelper.G.hashG1("h_secret".encode())
+        else:
+            hs, BpGroupHelper.g_secret, BpGroupHelper.h_secret = generators
+            assert len(hs) == q + 1
+            BpGroupHelper.hs = list(hs)
+        # The caches of the other modules hold points of the previous group. Imported here because they import this one
+        from helper import Polynomial
+        from attributecache import attribute_cache
+        from transcript import Transcript
+        with Polynomial.lagrange_lock:
+            Polynomial.lagrange_cache.clear()
+        with Transcript.lock:
+            Transcript.prefixes.clear()
+            Transcript.exports.clear()
+        attribute_cache.clear()
+        # The tables of the previous group are useless so start from scratch
+        BpGroupHelper.tables = OrderedDict()
+        BpGroupHelper.pinned = set()
+        BpGroupHelper.table_window, BpGroupHelper.table_memory = table_window, table_memory
+        BpGroupHelper.table_bytes = 0
+        if precompute:
+            BpGroupHelper.precompute([BpGroupHelper.g1, BpGroupHelper.g2, BpGroupHelper.g_secret,
+                                      BpGroupHelper.h_secret] + BpGroupHelper.hs, pin=True)
+        BpGroupHelper.count_ops(count_ops)
+
+    @staticmethod
+    def count_ops(enabled):
+        """
+        Start or stop counting the group operations. The counting wraps the pairing, the hashing to G1 and the
+        multiplications of the points, when it is off they are the plain bplib functions again
+
+        :param enabled: True to start counting with a new OpCounter, False to stop
+        """
+        from opcounter import OpCounter
+        G = BpGroupHelper.G
+        for cls, name, operation in OpCounter.WRAPPED:
+            setattr(cls, name, OpCounter.wrap(OpCounter.ORIGINAL[cls, name], operation) if enabled
+                    else OpCounter.ORIGINAL[cls, name])
+        G.__dict__.pop("hashG1", None)
+        if enabled:
+            BpGroupHelper.counter = OpCounter()
+            BpGroupHelper.e = OpCounter.wrap(G.pair, "pairing")
+            G.hashG1 = OpCounter.wrap(G.hashG1, "hash_g1")
+        else:
+            BpGroupHelper.counter = None
+            BpGroupHelper.e = G.pair
+
+    @staticmethod
+    def precompute(points, pin=False):
+        """
+        Build fixed-base tables for points that are multiplied many times. When the tables would use more than
+        table_memory the least recently used ones are dropped
+
+        :param points: The points to build the tables for
+        :param pin: True to never drop the tables to free memory, for the generators every protocol call uses
+        """
+        if not BpGroupHelper.table_window:
+            return
+        for point in points:
+            if BpGroupHelper.table(point) is not None:
+                continue
+            if not BpGroupHelper.add_table(point, FixedBaseTable(point, BpGroupHelper.table_window), pin):
+                return
+
+    @staticmethod
+    def add_table(point, table, pin=False):
+        """
+        Keep a table for a point, dropping the least recently used ones that are not pinned when the memory would be
+        over table_memory
+
+        :param point: The point of the table
+        :param table: A FixedBaseTable of the point, e.g. built or loaded from a snapshot
+        :param pin: True to never drop the table to free memory
+        :return: False if the table does not fit next to the pinned ones and was not kept
+        """
+        key = id(point)
+        with BpGroupHelper.table_lock:
+            BpGroupHelper.drop_table(key)
+            tables = BpGroupHelper.tables
+            pinned_bytes = sum(tables[pinned][1].bytes for pinned in BpGroupHelper.pinned if pinned in tables)
+            if pinned_bytes + table.bytes > BpGroupHelper.table_memory:
+                return False
+            while BpGroupHelper.table_bytes + table.bytes > BpGroupHelper.table_memory:
+                BpGroupHelper.drop_table(next(key for key in tables if key not in BpGroupHelper.pinned))
+            ref = weakref.ref(point, lambda dead, key=key: BpGroupHelper.drop_table(key, dead))
+            tables[key] = (ref, table)
+            BpGroupHelper.table_bytes += table.bytes
+            if pin:
+                BpGroupHelper.pinned.add(key)
+            return True
+
+    @staticmethod
+    def table(point):
+        """
+        :param point: A point of G1 or G2
+        :return: The fixed-base table of the point or None if it does not have one
+        """
+        with BpGroupHelper.table_lock:
+            entry = BpGroupHelper.tables.get(id(point))
+            if entry is None or entry[0]() is not point:
+                return None
+            BpGroupHelper.tables.move_to_end(id(point))
+            return entry[1]
+
+    @staticmethod
+    def drop_table(key, ref=None):
+        """
+        Remove a table, either to free memory or because its point does not exist anymore
+
+        :param key: The id of the point of the table
+        :param ref: The weakref of the point that died, so we do not drop a newer table of a point with the same id
+        """
+        with BpGroupHelper.table_lock:
+            entry = BpGroupHelper.tables.get(key)
+            if entry is None or (ref is not None and entry[0] is not ref):
+                return
+            del BpGroupHelper.tables[key]
+            BpGroupHelper.pinned.discard(key)
+            BpGroupHelper.table_bytes -= entry[1].bytes
+
+
+class FixedBaseTable:
+    """
+    Windowed precomputation for a fixed base P. For a window w the table keeps d * 2^(w*i) * P for every digit
+    d = 1,...,2^w - 1 and row i, so d * P is the sum of one table point per w bits of the scalar and needs no doubling
+    """
+
+    def __init__(self, point, window):
+        """
+        :param point: The fixed base
+        :param window: The window in bits
+        """
+        self.window = window
+        self.rows = []
+        base = point.__copy__()  # The table must not keep the point alive
+        for _ in range(-(-BpGroupHelper.o.num_bits() // window)):
+            row = [None, base]
+            for _ in range(2, 2 ** window):
+                row.append(row[-1] + base)
+            self.rows.append(row)
+            base = row[-1] + base  # 2^w * base
+        point_bytes = G1_POINT_BYTES if isinstance(point, G1Elem) else G2_POINT_BYTES
+        self.bytes = len(self.rows) * (2 ** window - 1) * point_bytes
+
+    def terms(self, scalar):
+        """
+        :param scalar: The scalar as Bn or int
+        :return: The table points that sum to scalar * P
+        """
+        x = int(scalar) % int(BpGroupHelper.o)
+        mask = 2 ** self.window - 1
+        terms = []
+        for row in self.rows:
+            if not x:
+                break
+            if x & mask:
+                terms.append(row[x & mask])
+            x >>= self.window
+        return terms
+
@@ -1,33 +1,15 @@
 from hashlib import sha256
 
-from bplib.bp import BpGroup, G2Elem
 from petlib.bn import Bn
 from petlib.pack import encode, decode
 from binascii import hexlify, unhexlify
+from collections import OrderedDict
+import threading
 
+from group import BpGroupHelper
+from msm import multi_mul, fixed_mul, precompute_vk
 
-class BpGroupHelper:
-    """
-    Just a helper function to instantiate the BpGroup() once and then be able to call it from all functions
-    """
-
-    G = g1 = g2 = e = o = hs = g_secret = h_secret = None
-
-    @staticmethod
-    def setup(q):
-        """
-        Sets up the parameters of the class
-        :param q: The maximum number of the attributes
-        """
-        assert q > 0
-        BpGroupHelper.G = BpGroup()
-        BpGroupHelper.g1, BpGroupHelper.g2 = BpGroupHelper.G.gen1(), BpGroupHelper.G.gen2()
-        BpGroupHelper.e, BpGroupHelper.o = BpGroupHelper.G.pair, BpGroupHelper.G.order()
-        # q+1 to add for the additional y we need for the openers. One h for each attribute + 1 h for the secret
-        BpGroupHelper.hs = [BpGroupHelper.G.hashG1(("h%s" % i).encode()) for i in range(q + 1)]
-        # Generators for the commitments in the key generation of the IdPs
-        BpGroupHelper.g_secret = BpGroupHelper.G.hashG1("s_secret".encode())
-        BpGroupHelper.h_secret = BpGroupHelper.G.hashG1("h_secret".encode())
+LAGRANGE_CACHE_SIZE = 128  # The number of index sets we keep the Lagrange coefficients for
 
 
 class ElGamal:
@@ -43,17 +25,26 @@ class ElGamal:
         Generates the secret and public keys
         """
         self.sk = BpGroupHelper.o.random()
-        self.pk = self.sk * g
+        self.pk = fixed_mul(g, self.sk)
 
-    def encrypt(self, m):
+    def encrypt(self, m, randomness=None):
         """
         El gamal basic encryption
         :param m: The message to encrypt
+        :param randomness: Optional (r, g1^r, pk^r) from precompute()
         :return: The ciphertext
         """
+        r, a, s = self.precompute() if randomness is None else randomness
+        return a, s + m, r
+
+    def precompute(self):
+        """
+        The part of the encryption that does not depend on the message
+        :return: (r, g1^r, pk^r)
+        """
         g1, o = BpGroupHelper.g1, BpGroupHelper.o
         r = o.random()
-        return r * g1, r * self.pk + m, r
+        return r, fixed_mul(g1, r), r * self.pk
 
     def decrypt(self, c):
         """
@@ -70,6 +61,9 @@ class Polynomial:
     Helper function that handles the polynomials for secret sharing
     """
 
+    lagrange_cache = OrderedDict()  # {tuple of indexes: Lagrange coefficients} in least recently used order
+    lagrange_lock = threading.Lock()  # Guards the cache, the async server interpolates on many threads
+
     @staticmethod
     def evaluate(coeff, x):
         """
@@ -92,21 +86,61 @@ class Polynomial:
         Helper that generates all the Langrange interpolations
         l(x) = (xj-x)/(xj-xi) where i and j are the indexes and i different from j
         In our case the x is zero because we want to evaluate the polynomial at 0 in order to return the secret
+        The same few sets of indexes come back all the time so the coefficients are cached per set
 
         :param indexes: The list of indices to interpolate
         :return: The list of Langrange coefficients
         """
         if len(indexes) == 1:
             return [1]
-        o = BpGroupHelper.o
-        l = []
+        key = tuple(indexes)
+        with Polynomial.lagrange_lock:
+            l = Polynomial.lagrange_cache.get(key)
+            if l is not None:
+                Polynomial.lagrange_cache.move_to_end(key)
+                return list(l)
+        l = Polynomial.__lagrange_coefficients(key)
+        with Polynomial.lagrange_lock:
+            Polynomial.lagrange_cache[key] = l
+            if len(Polynomial.lagrange_cache) > LAGRANGE_CACHE_SIZE:
+                Polynomial.lagrange_cache.popitem(last=False)
+        return list(l)
+
+    @staticmethod
+    def __lagrange_coefficients(indexes):
+        """
+        Computes the Lagrange coefficients at 0 with a single modular inversion. The denominators are inverted all
+        together with Montgomery's trick: invert the product of all of them and recover each inverse from the
+        prefix products
+
+        :param indexes: The list of indices to interpolate
+        :return: The list of Langrange coefficients
+        """
+        # The indexes are small so the products are done on python ints, much faster than Bn's, and only the
+        # products of all the denominators go through the modulo
+        o = int(BpGroupHelper.o)
+        indexes = [int(i) for i in indexes]
+        product = 1
         for i in indexes:
-            numerator, denominator = 1, 1
+            product *= i
+        numerators, denominators = [], []
+        for i in indexes:
+            denominator = 1
             for j in indexes:
                 if j != i:
-                    numerator = (numerator * j) % o
-                    denominator = (denominator * (j - i)) % o
-            l.append((numerator * denominator.mod_inverse(o)) % o)
+                    denominator *= j - i
+            numerators.append(product // i)  # The product of all the other indexes
+            denominators.append(denominator % o)
+        # prefix[k] = denominators[0] * ... * denominators[k - 1]
+        prefix = [1]
+        for denominator in denominators:
+            prefix.append((prefix[-1] * denominator) % o)
+        inverse = pow(prefix[-1], -1, o)  # The inverse of the product of all the denominators
+        l = [None] * len(indexes)
+        for k in reversed(range(len(indexes))):
+            # prefix[k] * inverse = 1 / denominators[k]. Bn() cannot take big ints so go through the decimal string
+            l[k] = Bn.from_decimal(str(numerators[k] * prefix[k] * inverse % o))
+            inverse = (inverse * denominators[k]) % o
         return l
 
 
@@ -128,14 +162,15 @@ def to_challenge(elements):
     return Bn.from_binary(H.digest())
 
 
-def agg_key(vks):
+def agg_key(vks, precompute=True):
     """
     Helper function to aggregate the verification keys from all the IdPs
 
     :param vks: A list of the verification keys from eacch IdP
+    :param precompute: False to not build the fixed-base tables of the aggregated vk
     :return: The final vk that can be used to check the signature
     """
-    G, g2 = BpGroupHelper.G, BpGroupHelper.g2
+    g2 = BpGroupHelper.g2
     # Since we using threshold we dont need all the keys so we check for None's and we keep only the ones with values
     # We also need their indexes for the langrange interpolation
     filtered_vks = [(i + 1, vk) for i, vk in enumerate(vks) if vk is not None]
@@ -143,15 +178,21 @@ def agg_key(vks):
     l = Polynomial.lagrange_interpolation(indexes)
 
     _, alpha, beta = zip(*filter_vk)
-    aggr_alpha = G2Elem.inf(G)
-    aggr_beta = [G2Elem.inf(G) for _ in range(len(beta[0]))]
-    for j in range(len(filter_vk)):
-        aggr_alpha += l[j] * alpha[j]
-        for i in range(len(beta[0])):
-            aggr_beta[i] += l[j] * beta[j][i]
+    aggr_alpha = multi_mul(alpha, l)
+    aggr_beta = [multi_mul([beta_j[i] for beta_j in beta], l) for i in range(len(beta[0]))]
+    if precompute:
+        precompute_vk((g2, aggr_alpha, aggr_beta))
     return g2, aggr_alpha, aggr_beta
 
 
+def hash_attribute(value):
+    """
+    :param value: The value of an attribute as bytes
+    :return: The SHA256 of the value as Bn
+    """
+    return Bn.from_binary(sha256(value).digest())
+
+
 def hash_attributes(attributes):
     """
     Takes a tuple of the style (attribute, Private(true or false)) and hashes them
@@ -161,7 +202,7 @@ def hash_attributes(attributes):
     """
     hashed_attributes = []
     for attribute in attributes:
-        hashed_attributes.append((Bn.from_binary(sha256(attribute[0]).digest()), attribute[1]))
+        hashed_attributes.append((hash_attribute(attribute[0]), attribute[1]))
     return hashed_attributes
 
 
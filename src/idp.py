@@ -1,18 +1,38 @@
-from hashlib import sha256
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from collections import defaultdict
 
-from bplib.bp import G1Elem
+from bplib.bp import G1Elem, G2Elem, GTElem
 from petlib.bn import Bn
 
-import helper
+import attributecache
+import transcript
 from helper import BpGroupHelper, Polynomial
+from stagetimer import timed_stage
+from opcounter import counted
+from msm import multi_mul, fixed_mul, batch_weights
 from request import Request
 from opener import ledger
 
 
+# The data all the jobs of a worker of the single round key generation need. It is handed over in initargs and the
+# workers are forked so they inherit it instead of pickling it
+_job = None
+
+
 class IdP:
-    def __init__(self, id, t, n):
-        commitment_coeffs, s_shares, b_shares = self.generate_pedersen_vars(t, n)
+    def __init__(self, id, t, n, pedersen_vars=True, attribute_cache=None):
+        """
+        :param id: The index of the IdP starting from 1
+        :param t: The minimum number of authorities we need (threshold)
+        :param n: The total number of authorities we have
+        :param pedersen_vars: False to not generate the variables of the first secret sharing, for setup_idps with
+        single_round where the dealing is done for all the secrets together
+        :param attribute_cache: The attributecache.AttributeCache of the public attributes, a new one by default. The entries
+        are derived from the sk so the IdP never uses the cache it shares with the RP and the client
+        """
+        commitment_coeffs, s_shares, b_shares = self.generate_pedersen_vars(t, n) if pedersen_vars else ([], {}, {})
         self.id = id
         self.commitment_coeffs = commitment_coeffs
         self.s_shares = s_shares
@@ -22,6 +42,7 @@ class IdP:
         self.secret_share = None
         self.sk = [None, []]
         self.vk = ()
+        self.attribute_cache = attribute_cache if attribute_cache is not None else attributecache.AttributeCache()
 
     """--------------------------CODE FOR THE GENERATION OF THE KEYS------------------------"""
 
@@ -40,7 +61,7 @@ class IdP:
         s_shares, s_coeff = self.generate_polynomial(t, n)  # Used for the secret
         b_shares, b_coeff = self.generate_polynomial(t, n)  # Blinding factor
         # create a dict with g^s_i * h^t_i. The broadcasted commitment
-        commitment_coeffs = [g * s_coeff[i] + h * b_coeff[i] for i in range(t)]
+        commitment_coeffs = [multi_mul([g, h], [s_coeff[i], b_coeff[i]]) for i in range(t)]
         # Return the secret, the commitment coeffs, the shares of s and t
         return commitment_coeffs, s_shares, b_shares
 
@@ -82,12 +103,40 @@ class IdP:
         :return: True if the verification works, false otherwise
         """
         assert len(commitment_coeffs) >= t
+        o, g, h = BpGroupHelper.o, BpGroupHelper.g_secret, BpGroupHelper.h_secret
+        result = multi_mul([commitment_coeffs[k] for k in range(t)], [Bn(self.id) ** k % o for k in range(t)])
+        return result == multi_mul([g, h], [share[0], share[1]])
+
+    def verify_shares(self, t, shares):
+        """
+        Verify the shares of many dealers together. Every check of verify_share is raised to a random weight w_j and
+        they are all multiplied into one
+        g^sum(w_j * s_j) * h^sum(w_j * b_j) = prod_j prod_k committed_coeffs_j,k^(w_j * id^k)
+        The right side is computed as prod_k (prod_j committed_coeffs_j,k^w_j)^(id^k), the inner products are
+        multi-exponentiations with the short weights and the outer one has only t terms. Only if that fails we check
+        every dealer on its own to find who cheated
+
+        :param t: The threshold
+        :param shares: The received shares {sender_id: ((s, b), commitment_coeffs)}
+        :return: The ids of the dealers whose share is wrong, empty if all are correct
+        """
+        if len(shares) < 2:
+            return [j for j, (share, commitment_coeffs) in shares.items()
+                    if not self.verify_share(t, share, commitment_coeffs)]
+        o = BpGroupHelper.o
         g, h = BpGroupHelper.g_secret, BpGroupHelper.h_secret
-        result_list = [commitment_coeffs[k] * (self.id ** k) for k in range(t)]
-        result = G1Elem.inf(BpGroupHelper.G)
-        for result_i in result_list:
-            result += result_i
-        return result == g * share[0] + h * share[1]
+        powers = [Bn(self.id) ** k % o for k in range(t)]
+        weights = batch_weights(len(shares))
+        s_sum, b_sum = Bn(0), Bn(0)
+        for w, ((s, b), commitment_coeffs) in zip(weights, shares.values()):
+            assert len(commitment_coeffs) >= t
+            s_sum, b_sum = (s_sum + w * s) % o, (b_sum + w * b) % o
+        weighted_coeffs = [multi_mul([commitment_coeffs[k] for _, commitment_coeffs in shares.values()], weights)
+                           for k in range(t)]
+        if multi_mul(weighted_coeffs, powers) == multi_mul([g, h], [s_sum, b_sum]):
+            return []
+        return [j for j, (share, commitment_coeffs) in shares.items()
+                if not self.verify_share(t, share, commitment_coeffs)]
 
     def compute_final_secret(self, t, n):
         """
@@ -143,10 +192,11 @@ class IdP:
         After collecting the hole sk we can now create the vk
         """
         g2 = BpGroupHelper.g2
-        self.vk = (g2, self.sk[0] * g2, [g2 * y_i for y_i in self.sk[1]])
+        self.vk = (g2, fixed_mul(g2, self.sk[0]), [fixed_mul(g2, y_i) for y_i in self.sk[1]])
 
     """--------------------------CODE FOR THE PROTOCOL------------------------"""
 
+    @counted("provide_id")
     def provide_id(self, request, vk):
         """
         Provide a credential to the client
@@ -163,6 +213,7 @@ class IdP:
             return 0
         return self.__sign_cred(request, h)
 
+    @timed_stage("zkp")
     def __verify_zkp(self, request: Request, h):
         """
         Verify the zkp created by the user
@@ -178,15 +229,16 @@ class IdP:
         (a, b) = zip(*request.cypher)
         c, rk, ra, rr, rs = request.zkp
         # Compute the commitments
-        Va = [c * a[i] + rk[i] * g1 for i in range(len(rk))]  # For the elgamal encryption the alpha
+        Va = [multi_mul([a[i], g1], [c, rk[i]]) for i in range(len(rk))]  # For the elgamal encryption the alpha
         # For the elgamal encryption the beta
-        Vb = [c * b[i] + rk[i] * request.users_pk + ra[i] * h for i in range(len(request.cypher))]
-        Vc = c * request.Cm + rr * g1  # For the commitment of the attributes (C)
-        for i in range(len(ra)):
-            Vc += ra[i] * hs[i]
-        Vs = c * request.h_secret + h * rs
-        return c == helper.to_challenge([g1, g2, request.Cm, h, Vc, Vs] + hs + Va + Vb)
-
+        Vb = [multi_mul([b[i], request.users_pk, h], [c, rk[i], ra[i]]) for i in range(len(request.cypher))]
+        # For the commitment of the attributes (C)
+        Vc = multi_mul([request.Cm, g1] + hs[:len(ra)], [c, rr] + list(ra))
+        Vs = multi_mul([request.h_secret, h], [c, rs])
+        return c == transcript.challenge(transcript.REQUEST_LABEL, [g1, g2] + hs, [request.Cm, h, Vc, Vs] + Va + Vb,
+                                     [g1, g2, request.Cm, h, Vc, Vs] + hs + Va + Vb)
+
+    @timed_stage("pairing")
     def __verify_opening_proof(self, opening_params, request, vk, h):
         """
         Verifies that the shares the user created for the secret is correct
@@ -198,25 +250,85 @@ class IdP:
         :param vk: The verification key
         :return: True if it is correct false otherwise
         """
-        G, g2, e = BpGroupHelper.G, BpGroupHelper.g2, BpGroupHelper.e
+        e = BpGroupHelper.e
+        _, _, beta = vk
+        pairs = self.__verify_opening_zkp(opening_params, request, h)
+        if pairs is None or any(Vc1 != e(point, beta[-1]) for Vc1, point in pairs):
+            return False
+        # Publish to the ledger the opening c's
+        ledger[request.user_id] = opening_params[0]
+        return True
+
+    @timed_stage("zkp")
+    def __verify_opening_zkp(self, opening_params, request, h):
+        """
+        Verifies the challenge of the opening proof of each opener and returns what is left to check with a pairing
+        Vc0 = c0^c * g2^rr
+        challenge = Hash(g2 || h || Vc0 || Vc1)
+
+        :param opening_params: The parameters used for the opening method
+        :param request: The request of the user containing the necessary elements
+        :param h: The HashG1(C) of the request
+        :return: A list of (Vc1, h_secret * h_coeff^(i^j)) one for each opener, or None if a challenge is wrong
+        """
+        g2, o = BpGroupHelper.g2, BpGroupHelper.o
         c, h_coeff = opening_params
+        pairs = []
         for i, c_i in enumerate(c.values()):
             c0, c1, proof = c_i
             challenge, rr, Vc1 = proof
             # ZKP for the c0
-            Vc0 = challenge * c0 + g2 * rr
-            coeffs_culculation = G1Elem.inf(G)
-            _, _, beta = vk
+            Vc0 = multi_mul([c0, g2], [challenge, rr])
             # Proof for the c1
-            for j, coeffs in enumerate(h_coeff):
-                coeffs_culculation += coeffs * ((i+1) * (j + 1))
-            if helper.to_challenge([g2, h, Vc0, Vc1]) != challenge \
-                    or Vc1 != e(request.h_secret + coeffs_culculation, beta[-1]):
-                return False
-        # Publish to the ledger the opening c's
-        ledger[request.user_id] = c
-        return True
+            coeffs_culculation = multi_mul([request.h_secret] + list(h_coeff),
+                                                  [1] + [Bn(i + 1) ** (j + 1) % o for j in range(len(h_coeff))])
+            if transcript.challenge(transcript.OPENING_LABEL, [g2], [h, Vc0, Vc1], [g2, h, Vc0, Vc1]) != challenge:
+                return None
+            pairs.append((Vc1, coeffs_culculation))
+        return pairs
+
+    @counted("provide_ids")
+    def provide_ids(self, requests, vk):
+        """
+        Provide credentials to many queued clients at once. The ZKPs are checked one by one but the pairing
+        equations of the opening proofs of all the requests are combined with random small exponents
+        prod(Vc1_i^w_i) = e(sum(w_i * (h_secret * h_coeff^(i^j))), beta[-1])
+        so we only need one pairing for all of them. If the combined check fails we check each request on its own
 
+        :param requests: The requests of the users
+        :param vk: The verification key
+        :return: A list with the credential for each request or 0 if it failed, in the same order
+        """
+        G, e = BpGroupHelper.G, BpGroupHelper.e
+        _, _, beta = vk
+        checked = []  # (index, request, h, pairs) of the requests that passed the zkps
+        for i, request in enumerate(requests):
+            h = G.hashG1(request.Cm.export())
+            if not self.__verify_zkp(request, h):
+                continue
+            pairs = self.__verify_opening_zkp(request.opening_params, request, h)
+            if pairs is not None:
+                checked.append((i, request, h, pairs))
+
+        all_pairs = [pair for _, _, _, pairs in checked for pair in pairs]
+        if all_pairs:
+            weights = batch_weights(len(all_pairs))
+            Vc1s = GTElem.one(G)
+            for w, (Vc1, _) in zip(weights, all_pairs):
+                Vc1s *= Vc1 ** w
+            if Vc1s != e(multi_mul([point for _, point in all_pairs], weights), beta[-1]):
+                # Someone is cheating so fall back to checking the requests one by one
+                checked = [(i, request, h, pairs) for i, request, h, pairs in checked
+                           if all(Vc1 == e(point, beta[-1]) for Vc1, point in pairs)]
+
+        sigs = [0] * len(requests)
+        for i, request, h, _ in checked:
+            # Publish to the ledger the opening c's
+            ledger[request.user_id] = request.opening_params[0]
+            sigs[i] = self.__sign_cred(request, h)
+        return sigs
+
+    @timed_stage("sign")
     def __sign_cred(self, request: Request, h):
         """
         Basic PS signatures
@@ -227,21 +339,18 @@ class IdP:
         :param sk: The secret key of which to use to sign
         :return: the signature
         """
-        G = BpGroupHelper.G
+        o = BpGroupHelper.o
         # (x, y) = sk
         x, y = self.sk[0], self.sk[1]
         (a, b) = zip(*request.cypher)
-        C_pub = []  # Commit the public values
+        # The public values are committed as C_pub = h^attributeP_i so their part of c_2 is h^(y_i * attributeP_i).
+        # We add all the private and then the public attributes, so we fold the public ones in the exponent of h
+        h_exp = x
         for i, attribute in enumerate(request.attributes):
             if attribute != "":
-                C_pub.append(Bn.from_binary(sha256(attribute).digest()) * h)
-        c_1 = G1Elem.inf(G)
-        for yi, ai in zip(y, a):
-            c_1 += yi * ai
-        c_2 = x * h
-        for yi, bi in zip(y, list(b) + C_pub):  # We add all the private and then the public attributes
-            c_2 += yi * bi
-        c_2 += request.h_secret * y[-1]
+                h_exp = (h_exp + self.attribute_cache.exponent(i, attribute, self.vk, y[i])) % o
+        c_1 = multi_mul(a, y[:len(a)])
+        c_2 = multi_mul([h] + list(b) + [request.h_secret], [h_exp] + y[:len(b)] + [y[-1]])
         return h, (c_1, c_2)
 
 
@@ -256,21 +365,163 @@ def simulate_secret_sharing(idps, t, n):
     """
     # Sharing its IdPs share with each other
     for i in range(n):
+        shares = {}
         for j in range(n):
             if i == j:  # Means we are in the same id participant so we just move on
                 continue
-            id, commitment_coeffs, s, b = idps[j].id, idps[j].commitment_coeffs, \
-                idps[j].s_shares[i + 1], idps[j].b_shares[i + 1]
-            # Verify the value meaning that no IdP is missbehaving
-            assert idps[i].verify_share(t, (s, b), commitment_coeffs)
-            idps[i].receive_share(id, commitment_coeffs, (s, b))
+            shares[idps[j].id] = ((idps[j].s_shares[i + 1], idps[j].b_shares[i + 1]), idps[j].commitment_coeffs)
+        # Verify all the values together meaning that no IdP is missbehaving
+        cheaters = idps[i].verify_shares(t, shares)
+        assert not cheaters, "IdPs %s sent a wrong share to IdP %s" % (cheaters, idps[i].id)
+        for id, (share, commitment_coeffs) in shares.items():
+            idps[i].receive_share(id, commitment_coeffs, share)
     # Every participant computes its share to the distributed secret.
     for i in range(n):
         idps[i].compute_final_secret(t, n)
     return idps
 
 
-def setup_idps(t, n):
+def dkg_generators(secrets):
+    """
+    The generators of the vector commitments of the single round key generation, one for each secret. Like g_secret
+    and h_secret they come from hashing so nobody knows the discrete logs between them
+
+    :param secrets: The number of secrets
+    :return: The generators with their fixed-base tables built
+    """
+    G = BpGroupHelper.G
+    generators = [G.hashG1(("g_secret%s" % m).encode()) for m in range(secrets)]
+    BpGroupHelper.precompute(generators)
+    return generators
+
+
+def _init_worker(job):
+    """
+    Runs once in every forked worker and keeps the data of the key generation
+
+    :param job: The shared data of _run
+    """
+    global _job
+    _job = job
+
+
+def _deal(dealer, job=None):
+    """
+    The work of one dealer in the single round key generation, runs in a worker process. The dealer commits to the
+    coefficients k of all its polynomials together with a vector commitment
+    C_k = h^b_k * g_m^s_m,k for all secrets m
+    and evaluates all the polynomials for every IdP. Bn's and points cannot be pickled so the results go back as bytes
+
+    :param dealer: The index of the dealer in the coefficients of the job
+    :param job: (coefficients, generators, t, n), the one of the worker if None
+    :return: (The exported commitments, {id: ([s_m(id) for all m], b(id)) as bytes})
+    """
+    o, h = BpGroupHelper.o, BpGroupHelper.h_secret
+    coefficients, generators, t, n = job if job is not None else _job
+    s_coeff, b_coeff = coefficients[dealer]
+    commitments = [multi_mul(generators + [h], [s_coeff_m[k] for s_coeff_m in s_coeff] + [b_coeff[k]]).export()
+                   for k in range(t)]
+    shares = {}
+    for i in range(1, n + 1):
+        s_i = [(Polynomial.evaluate(s_coeff_m, i) % o).binary() for s_coeff_m in s_coeff]
+        shares[i] = (s_i, (Polynomial.evaluate(b_coeff, i) % o).binary())
+    return commitments, shares
+
+
+def _generate_vk(sk):
+    """
+    The vk of an IdP in a worker process
+
+    :param sk: The sk as [x, [y's]] in bytes
+    :return: The exported g2^x and g2^y's
+    """
+    g2 = BpGroupHelper.g2
+    x, y = sk
+    return fixed_mul(g2, Bn.from_binary(x)).export(), [fixed_mul(g2, Bn.from_binary(y_i)).export()
+                                                               for y_i in y]
+
+
+def _run(function, jobs, workers, shared=None):
+    """
+    Run the function for all the jobs on forked workers, or on this process if there is only one worker
+
+    :param shared: Data that all the jobs need, passed as the second argument here and kept in _job by the workers
+    :return: The results in the order of the jobs
+    """
+    if workers < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        return [function(job) if shared is None else function(job, shared) for job in jobs]
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"), initializer=_init_worker,
+                             initargs=(shared,)) as pool:
+        return list(pool.map(function, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+
+def verify_dealings(t, n, generators, commitments, shares):
+    """
+    Consolidated verification of all the shares of the single round key generation. For every IdP i we add up the
+    shares of all the dealers and the commitments of all the dealers and check once
+    h^sum(b) * g_m^sum(s_m) = (sum_dealers C_k)^(i^k) for k=0,...,t-1
+    Only if that fails the dealings are checked one by one to find who cheated
+
+    :param t: The threshold
+    :param n: The number of IdPs
+    :param generators: The generators of the vector commitments
+    :param commitments: The commitments of every dealer
+    :param shares: The shares of every dealer {id: (s's, b)}
+    :return: The summed shares of every IdP {id: (s's, b)}
+    """
+    o, h = BpGroupHelper.o, BpGroupHelper.h_secret
+    aggr_commitments = [multi_mul([commitments_d[k] for commitments_d in commitments], [1] * n)
+                        for k in range(t)]
+    final_shares = {}
+    for i in range(1, n + 1):
+        s = [sum((shares_d[i][0][m] for shares_d in shares), Bn(0)) % o for m in range(len(generators))]
+        b = sum((shares_d[i][1] for shares_d in shares), Bn(0)) % o
+        powers = [Bn(i) ** k % o for k in range(t)]
+        if multi_mul(generators + [h], s + [b]) != multi_mul(aggr_commitments, powers):
+            for dealer, (commitments_d, shares_d) in enumerate(zip(commitments, shares)):
+                s_i, b_i = shares_d[i]
+                assert multi_mul(generators + [h], s_i + [b_i]) == \
+                       multi_mul(commitments_d, powers), \
+                    "IdP %s sent a wrong share to IdP %s" % (dealer + 1, i)
+        final_shares[i] = (s, b)
+    return final_shares
+
+
+def single_round_setup(idps, t, n, workers=None):
+    """
+    Key generation where every IdP deals all the q+2 secrets of the sk in one round instead of one secret sharing per
+    secret. The dealers commit to their polynomials with one vector commitment per coefficient, the dealings run in
+    parallel on a pool of workers and all the shares are verified in one consolidated step
+
+    :param idps: The IdPs
+    :param t: The minimum number of authorities we need (threshold)
+    :param n: The total number of authorities we have
+    :param workers: The number of worker processes, defaults to the number of cores
+    :return: The idps with their sk and vk
+    """
+    o, G = BpGroupHelper.o, BpGroupHelper.G
+    workers = workers if workers is not None else os.cpu_count() or 1
+    secrets = len(BpGroupHelper.hs) + 1  # x and the y's
+    generators = dkg_generators(secrets)
+    # The randomness is drawn here, the forked workers would share the state of the random generator
+    coefficients = [([[o.random() for _ in range(t)] for _ in range(secrets)], [o.random() for _ in range(t)])
+                    for _ in range(n)]
+    dealings = _run(_deal, range(n), workers, (coefficients, generators, t, n))
+    commitments = [[G1Elem.from_bytes(commitment, G) for commitment in commitments_d] for commitments_d, _ in dealings]
+    shares = [{i: ([Bn.from_binary(s) for s in s_i], Bn.from_binary(b_i)) for i, (s_i, b_i) in shares_d.items()}
+              for _, shares_d in dealings]
+    final_shares = verify_dealings(t, n, generators, commitments, shares)
+
+    for idp in idps:
+        s, _ = final_shares[idp.id]
+        idp.sk = [s[0], s[1:]]
+    vks = _run(_generate_vk, [(idp.sk[0].binary(), [y.binary() for y in idp.sk[1]]) for idp in idps], workers)
+    for idp, (alpha, beta) in zip(idps, vks):
+        idp.vk = (BpGroupHelper.g2, G2Elem.from_bytes(alpha, G), [G2Elem.from_bytes(beta_i, G) for beta_i in beta])
+    return idps
+
+
+def setup_idps(t, n, single_round=False, workers=None):
     """
     This function setups the IdPs and generates their sk and vk
     sk = (x, y_1,...,y_q, y_q)
@@ -280,8 +531,12 @@ def setup_idps(t, n):
 
     :param t: The minimum number of authorities we need (threshold)
     :param n: The total number of authorities we have
+    :param single_round: True to deal all the secrets in one round on a pool of workers, see single_round_setup
+    :param workers: The number of worker processes for single_round, defaults to the number of cores
     :return: The IdPs ready to run the SSO protocol
     """
+    if single_round:
+        return single_round_setup([IdP(i, t, n, pedersen_vars=False) for i in range(1, n + 1)], t, n, workers)
     # Generating the IdPs
     idps = []
     for i in range(1, n + 1):
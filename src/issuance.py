@@ -0,0 +1,120 @@
+import asyncio
+
+import httpx
+
+from wire import CONTENT_TYPE, decode_sig
+
+ROUTE_IDP_PROVIDEID = "/idp/provideid"
+TIMEOUT = 30  # Seconds to wait for an IdP
+MAX_CONNECTIONS = 100  # Connections kept open to all the IdPs together
+
+
+class IssuanceError(Exception):
+    """
+    An IdP refused a request or there were not enough valid shares for a credential
+    """
+
+
+class ThresholdIssuer:
+    """
+    Requests credentials from the IdP servers and aggregates them as soon as threshold valid shares have arrived, so the
+    issuance takes as long as the threshold-th fastest IdP and not the slowest one. The connections to the IdPs are
+    pooled between the requests. Use it as an async context manager or call close() at the end
+
+        async with ThresholdIssuer(client, urls, threshold, vks) as issuer:
+            await issuer.issue(request)
+    """
+
+    def __init__(self, client, urls, threshold, vks=None, http=None):
+        """
+        :param client: The Client that made the requests, it unblinds and aggregates the shares
+        :param urls: The base URL of every IdP in the order of their index, e.g. http://host:port
+        :param threshold: The number of shares needed for the credential
+        :param vks: The vk of every IdP in the same order to check every share, None to only check the aggregated sig
+        :param http: An httpx.AsyncClient to use instead of creating one
+        """
+        assert 0 < threshold <= len(urls)
+        self.client = client
+        self.urls = urls
+        self.threshold = threshold
+        self.vks = vks
+        self.__own_http = http is None
+        self.http = http if http is not None else httpx.AsyncClient(
+            timeout=TIMEOUT, limits=httpx.Limits(max_connections=MAX_CONNECTIONS))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if self.__own_http:
+            await self.http.aclose()
+
+    async def __provide_id(self, i, data):
+        """
+        Ask one IdP for its share in the binary format
+
+        :param i: The position of the IdP in urls
+        :param data: The encoded request
+        :return: (i, the blinded share)
+        """
+        headers = {"content-type": CONTENT_TYPE, "accept": CONTENT_TYPE}
+        response = await self.http.post(self.urls[i] + ROUTE_IDP_PROVIDEID, content=data, headers=headers)
+        response.raise_for_status()
+        if response.headers.get("content-type") != CONTENT_TYPE:
+            raise IssuanceError("The IdP refused the request: %s" % response.text)
+        return i, decode_sig(response.content)
+
+    async def issue(self, request):
+        """
+        Send the request to all the IdPs and aggregate the credential in the client from the first threshold valid
+        shares. The requests still running are cancelled
+
+        :param request: The Request of the client
+        :return: The indexes of the IdPs whose shares were used
+        """
+        data = request.to_bytes()
+        pending = {asyncio.ensure_future(self.__provide_id(i, data)) for i in range(len(self.urls))}
+        sigs = [None] * len(self.urls)
+        valid = 0
+        try:
+            while pending and valid < self.threshold:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue  # The IdP is down or refused, the others are enough hopefully
+                    i, sig_prime = task.result()
+                    if sig_prime[0].isinf():
+                        continue
+                    sig = self.client.unbind_sig(sig_prime)
+                    if self.vks is not None and not self.client.verify_sig(sig, self.vks[i]):
+                        continue
+                    if valid < self.threshold:
+                        sigs[i] = sig
+                        valid += 1
+        finally:
+            for task in pending:
+                task.cancel()
+            # Wait for the cancellations so no task is destroyed pending and their exceptions are consumed
+            await asyncio.gather(*pending, return_exceptions=True)
+        if valid < self.threshold:
+            raise IssuanceError("Only %s valid shares out of the %s needed" % (valid, self.threshold))
+        # Without the vks only the aggregated sig can be checked, the client keeps its old credential if it fails
+        if not self.client.agg_cred(sigs, check=self.vks is None):
+            raise IssuanceError("The aggregated credential is not valid")
+        return [i + 1 for i, sig in enumerate(sigs) if sig is not None]
+
+
+def issue(client, request, urls, threshold, vks=None):
+    """
+    Blocking helper for a single issuance with its own connections
+
+    :return: The indexes of the IdPs whose shares were used
+    """
+    async def run():
+        async with ThresholdIssuer(client, urls, threshold, vks) as issuer:
+            return await issuer.issue(request)
+
+    return asyncio.run(run())
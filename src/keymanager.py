@@ -0,0 +1,160 @@
+import threading
+from collections import OrderedDict
+from functools import reduce
+from hashlib import sha256
+from itertools import combinations
+from weakref import WeakValueDictionary
+
+from helper import BpGroupHelper, Polynomial, pack
+from msm import fixed_mul, precompute_vk
+
+# The number of IdP subsets we keep the aggregated vk for
+AGGR_CACHE_SIZE = 16
+# The number of weighted vks of single IdPs we keep, every IdP is in many subsets
+TERM_CACHE_SIZE = 256
+
+
+class AggregatedKey:
+    """
+    An aggregated vk together with everything we precompute for it
+    """
+
+    def __init__(self, vk, encoding=None):
+        """
+        :param vk: The aggregated vk in the form (g2, alpha, beta)
+        :param encoding: pack(vk) if it is already known
+        """
+        self.vk = vk
+        self.encoding = encoding if encoding is not None else pack(vk)  # The vk as it is sent to the servers
+        precompute_vk(vk)
+
+    def tables(self):
+        """
+        :return: The fixed-base tables of alpha and the beta's, None for the ones that were dropped
+        """
+        _, alpha, beta = self.vk
+        return [BpGroupHelper.table(point) for point in [alpha] + beta]
+
+
+class AggregatedKeyManager:
+    """
+    Keeps the aggregated vks of the IdP subsets we have seen so a subset that comes back, e.g. when an IdP goes down
+    and up again, does not aggregate the keys again. The vk of a subset is the sum of the terms l_i * vk_i of its IdPs.
+    The terms are cached per IdP and Lagrange coefficient, so a subset whose vk was evicted or invalidated is rebuilt
+    with additions only. Only the aggregated vks that are returned get fixed-base tables, tables for the vk of every
+    IdP would fill the shared table memory and push out the ones the protocol uses. The subsets that aggregate to the
+    same vk share one AggregatedKey. One manager can be shared by many threads
+    """
+
+    def __init__(self, vks, cache_size=AGGR_CACHE_SIZE, term_cache_size=TERM_CACHE_SIZE):
+        """
+        :param vks: The vks of all the IdPs, the index of the IdP is its position in the list + 1
+        :param cache_size: The number of subsets to keep the aggregated vk for
+        :param term_cache_size: The number of weighted vks of single IdPs to keep
+        """
+        self.vks = list(vks)
+        self.cache_size = cache_size
+        self.term_cache_size = term_cache_size
+        self.hits = 0
+        self.misses = 0
+        self.__keys = OrderedDict()  # {tuple of indexes: AggregatedKey} in least recently used order
+        self.__terms = OrderedDict()  # {(index, Lagrange coefficient): (l * alpha, [l * beta's])} in LRU order
+        # {sha256 of the encoding: AggregatedKey}, the keys that no subset uses anymore drop out by themselves
+        self.__encodings = WeakValueDictionary()
+        self.__lock = threading.Lock()  # Guards the three caches, the aggregation runs outside of it
+
+    def get(self, indexes):
+        """
+        Get the aggregated vk of a subset of the IdPs
+
+        :param indexes: The indexes of the IdPs, at least threshold of them
+        :return: The AggregatedKey of the subset
+        """
+        key = tuple(sorted(indexes))
+        with self.__lock:
+            aggr_key = self.__keys.get(key)
+            if aggr_key is not None:
+                self.hits += 1
+                self.__keys.move_to_end(key)
+                return aggr_key
+            self.misses += 1
+        terms = [self.__term(i, l) for i, l in zip(key, Polynomial.lagrange_interpolation(key))]
+        vk = (BpGroupHelper.g2, reduce(lambda a, b: a + b, [alpha for alpha, _ in terms]),
+              [reduce(lambda a, b: a + b, beta_j) for beta_j in zip(*[beta for _, beta in terms])])
+        encoding = pack(vk)
+        digest = sha256(encoding.encode()).digest()
+        # Honest IdPs give the same vk for every subset, so share the encoding and the tables we already have for it
+        with self.__lock:
+            aggr_key = self.__encodings.get(digest)
+        if aggr_key is None:
+            aggr_key = AggregatedKey(vk, encoding)
+        with self.__lock:
+            aggr_key = self.__encodings.setdefault(digest, aggr_key)
+            self.__keys[key] = aggr_key
+            if len(self.__keys) > self.cache_size:
+                self.__keys.popitem(last=False)
+        return aggr_key
+
+    def __term(self, index, l):
+        """
+        :param index: The index of the IdP
+        :param l: Its Lagrange coefficient in the subset
+        :return: (l * alpha, [l * beta's]) of the vk of the IdP
+        """
+        key = (index, int(l))
+        with self.__lock:
+            term = self.__terms.get(key)
+            if term is not None:
+                self.__terms.move_to_end(key)
+                return term
+            vk = self.vks[index - 1]
+        _, alpha, beta = vk
+        term = fixed_mul(alpha, l), [fixed_mul(beta_j, l) for beta_j in beta]
+        with self.__lock:
+            if self.vks[index - 1] is vk:  # Not if the key of the IdP changed in the meantime
+                self.__terms[key] = term
+                if len(self.__terms) > self.term_cache_size:
+                    self.__terms.popitem(last=False)
+        return term
+
+    def agg_key(self, vks):
+        """
+        Drop in replacement of helper.agg_key, the IdPs that did not answer are None in the list
+
+        :param vks: A list of the verification keys from each IdP
+        :return: The final vk that can be used to check the signature
+        """
+        return self.get([i + 1 for i, vk in enumerate(vks) if vk is not None]).vk
+
+    def warm(self, threshold, subsets=None):
+        """
+        Aggregate the vks of the subsets before we need them, so failing over to them costs nothing on the request path
+
+        :param threshold: The threshold of the IdPs
+        :param subsets: The subsets to prepare, defaults to every subset of threshold IdPs that fits in the cache
+        """
+        if subsets is None:
+            indexes = [i + 1 for i, vk in enumerate(self.vks) if vk is not None]
+            subsets = combinations(indexes, threshold)
+        for n, subset in enumerate(subsets):
+            if n == self.cache_size:
+                break
+            self.get(subset)
+
+    def invalidate(self, index=None, vk=None):
+        """
+        Forget the aggregated vks, e.g. after the keys of an IdP change
+
+        :param index: The index of the IdP with the new vk, None to forget the aggregated vks of all the subsets but
+        keep the weighted vks of the IdPs
+        :param vk: The new vk of the IdP
+        """
+        with self.__lock:
+            if index is None:
+                self.__keys.clear()
+                return
+            self.vks[index - 1] = vk
+            for key in [key for key in self.__keys if index in key]:
+                del self.__keys[key]
+            for key in [key for key in self.__terms if key[0] == index]:
+                del self.__terms[key]
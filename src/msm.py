@@ -0,0 +1,106 @@
+from os import urandom
+
+from bplib.bp import G1Elem, G2Elem, GTElem
+from bplib.bindings import _FFI
+from petlib.bn import Bn
+
+from group import BpGroupHelper
+
+ONE = Bn(1)
+
+
+def multi_mul(points, scalars):
+    """
+    Computes sum(scalars_i * points_i) with one multi-exponentiation (interleaved wNAF, Straus style) instead of a
+    full scalar multiplication for each term. The doublings are shared between all the terms, so the cost grows much
+    slower than the number of terms. Points with a fixed-base table are replaced by the table points of their scalar,
+    which only cost an addition each. All the points must be in the same group G1 or G2
+
+    :param points: The points, at least one
+    :param scalars: The scalars as Bn or int in the same order
+    :return: The linear combination of the points
+    """
+    G = BpGroupHelper.G
+    if not BpGroupHelper.msm:
+        result = scalars[0] * points[0]
+        for scalar, point in zip(scalars[1:], points[1:]):
+            result += scalar * point
+        return result
+    if BpGroupHelper.counter is not None:
+        BpGroupHelper.counter.add("g1_mul" if isinstance(points[0], G1Elem) else "g2_mul", len(points))
+    var_points, var_scalars, fixed_points = [], [], []
+    for point, scalar in zip(points, scalars):
+        table = BpGroupHelper.table(point)
+        if table is None:
+            var_points.append(point)
+            var_scalars.append(scalar if isinstance(scalar, Bn) else Bn(scalar))
+        else:
+            fixed_points += table.terms(scalar)
+    all_points = var_points + fixed_points
+    all_scalars = [scalar.bn for scalar in var_scalars] + [ONE.bn] * len(fixed_points)
+    if isinstance(points[0], G1Elem):
+        result, mul = G1Elem(G), G.math.G1_ELEMs_mul
+    else:
+        result, mul = G2Elem(G), G.math.G2_ELEMs_mul
+    if not mul(G.bpg, result.elem, _FFI.NULL, len(all_points), [point.elem for point in all_points], all_scalars,
+               _FFI.NULL):
+        raise Exception("Multi-exponentiation failed")
+    return result
+
+
+def fixed_mul(point, scalar):
+    """
+    Multiply a point with a scalar using the fixed-base table of the point if it has one
+
+    :param point: The point
+    :param scalar: The scalar as Bn or int
+    :return: scalar * point
+    """
+    if BpGroupHelper.msm and BpGroupHelper.table(point) is not None:
+        return multi_mul([point], [scalar])
+    return scalar * point
+
+
+def precompute_vk(vk):
+    """
+    Build the fixed-base tables for the alpha and the beta's of a verification key
+
+    :param vk: The verification key in the form (g2, alpha, beta)
+    """
+    _, alpha, beta = vk
+    BpGroupHelper.precompute([alpha] + list(beta))
+
+
+def multi_pair(g1s, g2s):
+    """
+    Computes the product of the pairings e(g1s_i, g2s_i) with a single final exponentiation, which is much cheaper
+    than multiplying the pairings one by one. bplib fails on some degenerate inputs (e.g. e(a, b) * e(-a, b)) so in
+    that case we fall back to the separate pairings
+
+    :param g1s: The G1 elements
+    :param g2s: The G2 elements in the same order
+    :return: The product of the pairings in GT
+    """
+    G, e = BpGroupHelper.G, BpGroupHelper.e
+    result = GTElem(G)
+    if G.math.GT_ELEMs_pairing(G.bpg, result.elem, len(g1s), [p.elem for p in g1s], [q.elem for q in g2s],
+                               _FFI.NULL):
+        if BpGroupHelper.counter is not None:
+            BpGroupHelper.counter.add("pairing", len(g1s))
+        return result
+    result = e(g1s[0], g2s[0])
+    for p, q in zip(g1s[1:], g2s[1:]):
+        result *= e(p, q)
+    return result
+
+
+def batch_weights(n, size=8):
+    """
+    Random small exponents used to combine many equations into one check. A wrong equation slips through a batch
+    check with probability 2^-(8 * size)
+
+    :param n: The number of weights
+    :param size: The size of each weight in bytes
+    :return: A list of the weights as Bn
+    """
+    return [Bn.from_binary(urandom(size)) for _ in range(n)]
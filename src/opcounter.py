@@ -0,0 +1,79 @@
+import functools
+import threading
+from collections import Counter
+
+from bplib.bp import G1Elem, G2Elem, GTElem
+
+from group import BpGroupHelper
+
+
+class OpCounter:
+    """
+    Counts the pairings, the scalar multiplications of G1 and G2 (every term of a multi-exponentiation counts as
+    one), the exponentiations of GT, the hashes to G1 and the challenge hashes. The operations are counted under the
+    protocol call that runs them, the calls are marked with @counted. Enabled with BpGroupHelper.setup(count_ops=True)
+    """
+
+    OPERATIONS = ["pairing", "g1_mul", "g2_mul", "gt_exp", "hash_g1", "challenge"]
+    WRAPPED = [(G1Elem, "mul", "g1_mul"), (G2Elem, "mul", "g2_mul"), (GTElem, "exp", "gt_exp")]
+    ORIGINAL = {(cls, name): cls.__dict__[name] for cls, name, _ in WRAPPED}
+    OTHER = "other"  # The operations outside of the protocol calls
+
+    def __init__(self):
+        self.counts = {}  # {call: Counter of the operations}
+        self.calls = Counter()  # {call: number of calls}
+        self.local = threading.local()  # The call running on each thread
+
+    @staticmethod
+    def wrap(function, operation):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            counter = BpGroupHelper.counter
+            if counter is not None:
+                counter.add(operation)
+            return function(*args, **kwargs)
+        return wrapper
+
+    def add(self, operation, n=1):
+        call = getattr(self.local, "call", None) or OpCounter.OTHER
+        self.counts.setdefault(call, Counter())[operation] += n
+
+    def reset(self):
+        self.counts.clear()
+        self.calls.clear()
+
+    def report(self):
+        """
+        :return: {call: {"calls": number of calls, operation: average count per call}}, the operations outside the
+        calls are under OTHER with their totals
+        """
+        report = {}
+        for call, counts in self.counts.items():
+            calls = self.calls.get(call, 0)
+            report[call] = {"calls": calls}
+            for operation in OpCounter.OPERATIONS:
+                report[call][operation] = counts[operation] / calls if calls else counts[operation]
+        return report
+
+
+def counted(call):
+    """
+    Decorator for the protocol calls whose operations OpCounter counts separately. A call inside another counted
+    call counts under the outer one. When the counting is off it only costs a check of BpGroupHelper.counter
+
+    :param call: The name of the call in the report
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            counter = BpGroupHelper.counter
+            if counter is None or getattr(counter.local, "call", None) is not None:
+                return function(*args, **kwargs)
+            counter.calls[call] += 1
+            counter.local.call = call
+            try:
+                return function(*args, **kwargs)
+            finally:
+                counter.local.call = None
+        return wrapper
+    return decorator
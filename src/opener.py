@@ -1,10 +1,43 @@
 from bplib.bp import G2Elem, GTElem
 
 from helper import ElGamal, BpGroupHelper, Polynomial
+from opcounter import counted
+from msm import multi_mul
 from credproof import CredProof
 
+
+class BanList(dict):
+    """
+    The ban list {user_id: revoked_sig}. It is a dict with a version that changes with every change of the list, so
+    whatever depends on the list (e.g. the cached results of the RP) knows when to drop it
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def __changed(method):
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                # After the change, so a reader never sees the new version with the old contents and caches them
+                self.version += 1
+        return wrapper
+
+    __setitem__ = __changed(dict.__setitem__)
+    __delitem__ = __changed(dict.__delitem__)
+    clear = __changed(dict.clear)
+    pop = __changed(dict.pop)
+    popitem = __changed(dict.popitem)
+    setdefault = __changed(dict.setdefault)
+    update = __changed(dict.update)
+    __ior__ = __changed(dict.__ior__)
+    del __changed
+
+
 ledger = {}
-ban_users = {}
+ban_users = BanList()
 
 
 class Opener:
@@ -66,6 +99,7 @@ def check_sig(T, proof: CredProof, vk):
     return e(h, proof.attributes_commitment) * secret == e(s + proof.vu, g2)
 
 
+@counted("deanonymize")
 def deanonymize(openers, proof: CredProof, vk):
     """
     Called normally from the RP to deannonymize a malicious user
@@ -76,18 +110,38 @@ def deanonymize(openers, proof: CredProof, vk):
     :return: 0 if the user was not found the id otherwise
     """
     for i in ledger:
-        c = ledger[i]
-        T = [openers[i].calculate_t(c[ci], proof.sig[0]) for i, ci in enumerate(c)]
-        sec = check_sig(T, proof, vk)
-        if sec:
-            secret_shares = [openers[i].reconstruct_key_share(c[ci]) for i, ci in enumerate(c)]
-            rev_sig = create_revoked_sig(secret_shares)
-            # Add the user into the ban list
-            ban_users[i] = rev_sig
+        if is_user(openers, ledger[i], proof, vk):
+            ban_user(openers, i, ledger[i])
             return i
     return 0
 
 
+def is_user(openers, c, proof: CredProof, vk):
+    """
+    Check if an entry of the ledger belongs to the user that created the proof
+
+    :param openers: All the openers necessary
+    :param c: The opening c's of the entry as published in the ledger
+    :param proof: The proof the user tried to send to the RP
+    :param vk: The aggregated vk of the IdPs that created the sig
+    :return: True if the entry belongs to the user false otherwise
+    """
+    T = [openers[i].calculate_t(c[ci], proof.sig[0]) for i, ci in enumerate(c)]
+    return check_sig(T, proof, vk)
+
+
+def ban_user(openers, user_id, c):
+    """
+    Create the revoked sig of a user and add it to the ban list
+
+    :param openers: All the openers necessary
+    :param user_id: The id of the user as stored in the ledger
+    :param c: The opening c's of the user as published in the ledger
+    """
+    secret_shares = [openers[i].reconstruct_key_share(c[ci]) for i, ci in enumerate(c)]
+    ban_users[user_id] = create_revoked_sig(secret_shares)
+
+
 def create_revoked_sig(secret_shares):
     """
     Take all the shares of the secret and reconstruct the secret in order to generate the revoked_sig
@@ -103,7 +157,4 @@ def create_revoked_sig(secret_shares):
             filter.append(s)
             indexes.append(i + 1)
     l = Polynomial.lagrange_interpolation(indexes)
-    revoked_sig = filter[0] * l[0]
-    for i in range(1, len(filter)):
-        revoked_sig += filter[i] * l[i]
-    return revoked_sig
+    return multi_mul(filter, l)
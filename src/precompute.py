@@ -0,0 +1,106 @@
+import threading
+from collections import deque
+
+
+class PrecomputePool:
+    """
+    Keeps up to size items that do not depend on the input of an operation (randomness and the points built from it)
+    ready, so the operation only does the input dependent part. A background thread refills the pool as items are
+    taken. The items depend on some state of the owner, e.g. the signature, so clear() drops them when it changes
+    """
+
+    def __init__(self, produce, size):
+        """
+        :param produce: Function without arguments that creates one item
+        :param size: The number of items to keep ready, 0 to not precompute at all
+        """
+        self.produce = produce
+        self.size = size
+        self.hits = 0  # Items that were ready
+        self.misses = 0  # Items produced on demand because the pool was empty
+        self.__items = deque()
+        self.__generation = 0  # Changes on clear() so items produced for the old state are thrown away
+        self.__condition = threading.Condition()
+        self.__thread = None
+        self.__running = False
+
+    def get(self):
+        """
+        :return: A ready item or a new one if the pool is empty
+        """
+        with self.__condition:
+            if self.__items:
+                self.hits += 1
+                item = self.__items.popleft()
+                self.__condition.notify()
+                return item
+            self.misses += 1
+        return self.produce()
+
+    def fill(self):
+        """
+        Fill the pool on the calling thread
+        """
+        while True:
+            with self.__condition:
+                if len(self.__items) >= self.size:
+                    return
+                generation = self.__generation
+            self.__add(generation, self.produce())
+
+    def clear(self):
+        """
+        Drop all the items, the state they were produced for is not valid anymore
+        """
+        with self.__condition:
+            self.__items.clear()
+            self.__generation += 1
+            self.__condition.notify()
+
+    def start(self):
+        """
+        Start the background thread that keeps the pool full
+        """
+        if self.__thread is not None or not self.size:
+            return
+        self.__running = True
+        self.__thread = threading.Thread(target=self.__refill, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        """
+        Stop the background thread, the items already in the pool stay
+        """
+        if self.__thread is None:
+            return
+        with self.__condition:
+            self.__running = False
+            self.__condition.notify()
+        self.__thread.join()
+        self.__thread = None
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __add(self, generation, item):
+        with self.__condition:
+            if generation == self.__generation and len(self.__items) < self.size:
+                self.__items.append(item)
+
+    def __refill(self):
+        while True:
+            with self.__condition:
+                while self.__running and len(self.__items) >= self.size:
+                    self.__condition.wait()
+                if not self.__running:
+                    return
+                generation = self.__generation
+            try:
+                item = self.produce()
+            except Exception:
+                # The owner is not ready yet (e.g. no signature), wait for the next change
+                with self.__condition:
+                    if self.__running and generation == self.__generation:
+                        self.__condition.wait()
+                continue
+            self.__add(generation, item)
@@ -1,4 +1,5 @@
 from helper import pack, unpack
+from wire import encode_request, decode_request
 
 
 class Request:
@@ -41,3 +42,21 @@ class Request:
         :return: CredProof instance.
         """
         return cls(**unpack(data))
+
+    def to_bytes(self):
+        """
+        Convert the instance variables to the binary wire format, see wire.py
+
+        :return: The encoded class
+        """
+        return encode_request(self)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Create an instance of Request from the binary wire format.
+
+        :param data: The encoded class as bytes or memoryview.
+        :return: Request instance.
+        """
+        return cls(*decode_request(data))
@@ -0,0 +1,216 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bplib.bindings import _FFI
+from bplib.bp import G1Elem, GTElem
+
+from helper import BpGroupHelper
+
+# Ban lists smaller than this are scanned on the calling process, forking a pool is not worth it below that
+PARALLEL_THRESHOLD = 2000
+# Every worker gets this many chunks so that one early match does not leave the rest of the pool idle
+CHUNKS_PER_WORKER = 4
+
+# The prepared revoked sigs and the stop event of the worker. The pool is forked once per version of the ban list so
+# the workers inherit them instead of pickling them, only h and the target of each scan are sent
+_sigs = None
+_stop = None
+
+
+def prepare_ban_sig(ban_sig):
+    """
+    Prepare a revoked sig for the pairings of the revocation check. bplib does not expose the precomputed lines of the
+    Miller loop so the best we can do is to bring the point to affine coordinates once, instead of once per pairing
+
+    :param ban_sig: The revoked sig as created by opener.create_revoked_sig
+    :return: A copy of the revoked sig in affine coordinates
+    """
+    G = BpGroupHelper.G
+    prepared = ban_sig.__copy__()
+    G.math.G2_ELEM_make_affine(G.bpg, prepared.elem, _FFI.NULL)
+    return prepared
+
+
+def _init_worker(stop, sigs):
+    """
+    Runs once in every forked worker and keeps the revoked sigs and the event that tells the workers that someone
+    found a match
+
+    :param stop: The shared event
+    :param sigs: The prepared revoked sigs of the version of the ban list the pool was forked for
+    """
+    global _stop, _sigs
+    _stop, _sigs = stop, sigs
+
+
+def _scan_chunk(h, target, start, end):
+    """
+    Scan a part of the ban list inside a worker process
+
+    :param h: The export of the first part of the sig of the proof
+    :param target: The export of e(h_secret, beta[-1])
+    :param start: The first index of the chunk
+    :param end: The index after the last one of the chunk
+    :return: (True if a banned sig matched, number of entries checked)
+    """
+    G, e = BpGroupHelper.G, BpGroupHelper.e
+    h, target = G1Elem.from_bytes(h, G), GTElem.from_bytes(target, G)
+    for i in range(start, end):
+        if _stop.is_set():
+            return False, i - start  # Another worker found the user already
+        if e(h, _sigs[i]) == target:
+            _stop.set()
+            return True, i - start + 1
+    return False, end - start
+
+
+class RevocationChecker:
+    """
+    Checks if a proof was created by a banned user. The user is banned if e(h, ban_sig) == e(h_secret, beta[-1]) for
+    one of the revoked sigs. The right hand side does not depend on the ban list so it is computed once per proof, and
+    the revoked sigs are kept prepared for the pairing. Large ban lists are split between a pool of workers that lives
+    as long as the ban list does not change. One checker can be shared by many threads
+    """
+
+    def __init__(self, ban_users, workers=None, parallel_threshold=PARALLEL_THRESHOLD):
+        """
+        :param ban_users: The ban list, an opener.BanList and normally opener.ban_users
+        :param workers: The number of worker processes for large ban lists, defaults to the number of cores
+        :param parallel_threshold: The size of the ban list from which we start using the workers
+        """
+        if not hasattr(ban_users, "version"):
+            raise TypeError("The ban list has to be an opener.BanList, a plain dict has no version")
+        self.ban_users = ban_users
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.parallel_threshold = parallel_threshold
+        self.checked = 0  # The number of revoked sigs checked in the last call
+        self.total_checked = 0  # The number of revoked sigs checked since the creation of the checker
+        self.__prepared = {}  # user_id -> (revoked_sig, prepared revoked_sig)
+        self.__sigs = []  # The prepared revoked sigs in the order of the ban list
+        self.__version = None  # The version of the ban list __sigs was prepared for
+        self.__lock = threading.Lock()  # Guards the prepared sigs and the counters
+        # Guards the pool, a scan uses all of its workers and the stop event so the parallel scans run one at a time
+        self.__pool_lock = threading.Lock()
+        self.__pool = None
+        self.__pool_version = None
+        self.__pool_workers = None
+        self.__stop = None
+
+    def version(self):
+        """
+        :return: The version of the ban list, it changes with every change of the list
+        """
+        return self.ban_users.version
+
+    def is_banned(self, h, h_secret, beta):
+        """
+        Check if the signature belongs to any of the banned users
+
+        :param h: The first part of the sig of the proof
+        :param h_secret: h^user_secret from the proof
+        :param beta: The beta of the aggregated vk
+        :return: True if the user is banned False otherwise
+        """
+        version, sigs = self.__sync()
+        if not sigs:
+            banned, checked = False, 0
+        else:
+            target = BpGroupHelper.e(h_secret, beta[-1])  # The same for every revoked sig
+            if len(sigs) < self.parallel_threshold or self.workers < 2 \
+                    or "fork" not in multiprocessing.get_all_start_methods():
+                banned, checked = self.__scan(h, target, sigs)
+            else:
+                banned, checked = self.__scan_parallel(h, target, sigs, version)
+        with self.__lock:
+            self.checked = checked
+            self.total_checked += checked
+        return banned
+
+    def close(self):
+        """
+        Stop the workers, a new pool is forked on the next large scan
+        """
+        with self.__pool_lock:
+            if self.__pool is not None:
+                self.__pool.shutdown()
+            self.__pool = None
+
+    def __sync(self):
+        """
+        Bring the prepared revoked sigs up to date with the ban list. Only the new or changed entries are prepared
+
+        :return: The version of the ban list and the prepared revoked sigs
+        """
+        with self.__lock:
+            version = self.version()
+            if version == self.__version:
+                return version, self.__sigs
+            prepared = {}
+            for user_id, ban_sig in list(self.ban_users.items()):
+                cached = self.__prepared.get(user_id)
+                if cached is None or cached[0] is not ban_sig:
+                    cached = ban_sig, prepare_ban_sig(ban_sig)
+                prepared[user_id] = cached
+            self.__prepared = prepared
+            self.__sigs = [prepared for _, prepared in prepared.values()]
+            self.__version = version
+            return version, self.__sigs
+
+    @staticmethod
+    def __scan(h, target, sigs):
+        """
+        Scan the ban list in this process and stop at the first match
+
+        :return: (True if the user is banned False otherwise, number of entries checked)
+        """
+        e = BpGroupHelper.e
+        for checked, ban_sig in enumerate(sigs, 1):
+            if e(h, ban_sig) == target:
+                return True, checked
+        return False, len(sigs)
+
+    def __scan_parallel(self, h, target, sigs, version):
+        """
+        Split the ban list in chunks and scan them on the workers. The first worker that finds a match stops the
+        others
+
+        :return: (True if the user is banned False otherwise, number of entries checked)
+        """
+        chunk = -(-len(sigs) // (self.workers * CHUNKS_PER_WORKER))
+        h, target = h.export(), target.export()
+        banned, checked = False, 0
+        with self.__pool_lock:
+            pool = self.__get_pool(sigs, version)
+            self.__stop.clear()
+            futures = [pool.submit(_scan_chunk, h, target, i, min(i + chunk, len(sigs)))
+                       for i in range(0, len(sigs), chunk)]
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                found, checked_chunk = future.result()
+                checked += checked_chunk
+                if found:
+                    banned = True
+                    for pending in futures:
+                        pending.cancel()
+        return banned, checked
+
+    def __get_pool(self, sigs, version):
+        """
+        Called with the pool lock held. The workers only see the ban list they were forked with, so the pool is forked
+        again only when the list or the number of workers changes
+
+        :return: The pool of the current version of the ban list
+        """
+        if self.__pool is not None and self.__pool_version == version and self.__pool_workers == self.workers:
+            return self.__pool
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=False)
+        context = multiprocessing.get_context("fork")
+        self.__stop = context.Event()
+        self.__pool = ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker,
+                                          initargs=(self.__stop, sigs))
+        self.__pool_version, self.__pool_workers = version, self.workers
+        return self.__pool
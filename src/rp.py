@@ -1,19 +1,32 @@
-from hashlib import sha256
-
-from bplib.bp import G2Elem
-from petlib.bn import Bn
+import time
 
 from credproof import CredProof
-import helper
+import attributecache
+import transcript
 from helper import BpGroupHelper
+from stagetimer import timed_stage
+from opcounter import counted
+from msm import multi_mul, multi_pair, batch_weights
 from opener import ban_users
+from revocation import RevocationChecker
 
 
 class RP:
 
-    def __init__(self, domain):
+    def __init__(self, domain, attribute_cache=None, verification_cache=None):
+        """
+        :param domain: The domain of the RP
+        :param attribute_cache: The attributecache.AttributeCache of the public attributes, the shared one by default
+        :param verification_cache: A verifycache.VerificationCache for the results of verify_id, None for no cache
+        """
         self.domain = domain  # The RPs domain
+        self.__domain_hash = None  # The hash of the domain in G1, computed once per group
+        self.__domain_group = None
+        self.attribute_cache = attribute_cache if attribute_cache is not None else attributecache.attribute_cache
+        self.revocation = RevocationChecker(ban_users)  # Checks the proofs against the ban list
+        self.verification_cache = verification_cache
 
+    @counted("verify_id")
     def verify_id(self, proof: CredProof, aggr_vk):
         """
         Chck e(h, k_priv * k_pub) = e(s * vu, g2)
@@ -22,11 +35,38 @@ class RP:
         :param aggr_vk: The aggregated vk from the IdP's
         :return:True if all checks pass, false otherwise
         """
+        cache = self.verification_cache
+        if cache is None:
+            return self.__verify(proof, aggr_vk)
+        key = cache.key(proof, aggr_vk, self.domain)
+        ban_version = self.revocation.version()
+        result = cache.get(key, ban_version)
+        if result is None:
+            start_time = time.perf_counter()
+            result = self.__verify(proof, aggr_vk)
+            cache.put(key, result, time.perf_counter() - start_time, ban_version)
+        return result
+
+    def __verify(self, proof, aggr_vk):
         # Check the ZKP
         if not self.__verify_zkp(proof, aggr_vk):
             return False
         return self.__verify_sig(proof, aggr_vk)
 
+    def domain_hash(self):
+        """
+        The domain never changes so it is hashed once. The RP can be created before BpGroupHelper.setup so this
+        happens on the first use, and again if the group is set up again. The point gets no fixed-base table, Vid
+        also has the user_id so the doublings are needed anyway and the table points would only add to them
+
+        :return: HashG1(domain)
+        """
+        G = BpGroupHelper.G
+        if self.__domain_group is not G:
+            self.__domain_hash, self.__domain_group = G.hashG1(self.domain), G
+        return self.__domain_hash
+
+    @timed_stage("zkp")
     def __verify_zkp(self, proof: CredProof, aggr_vk):
         """
         Verify the zkp create by the user
@@ -41,16 +81,17 @@ class RP:
         g2, alpha, beta = aggr_vk
         h, _ = proof.sig
         c, ra, rr, rs = proof.zkp
-        Va = c * proof.k + rr * g2 + (1 - c) * alpha  # For the attributes
-        for i, attribute in enumerate(proof.attributes):
-            if attribute == "":
-                Va += ra[i] * beta[i]
-        Vr = c * proof.vu + rr * h  # For the commitment r
-        domain_hash = BpGroupHelper.G.hashG1(self.domain)
-        Vid = proof.user_id * c + domain_hash * rs
-        Vh = proof.h_secret * c + h * rs
-        return c == helper.to_challenge([g1, g2, alpha, Va, Vr, Vid, Vh] + hs + beta)
+        # For the attributes
+        private = [i for i, attribute in enumerate(proof.attributes) if attribute == ""]
+        Va = multi_mul([proof.k, g2, alpha] + [beta[i] for i in private],
+                              [c, rr, 1 - c] + [ra[i] for i in private])
+        Vr = multi_mul([proof.vu, h], [c, rr])  # For the commitment r
+        Vid = multi_mul([proof.user_id, self.domain_hash()], [c, rs])
+        Vh = multi_mul([proof.h_secret, h], [c, rs])
+        return c == transcript.challenge(transcript.PROVE_LABEL, [g1, g2] + hs + [alpha] + beta, [Va, Vr, Vid, Vh],
+                                     [g1, g2, alpha, Va, Vr, Vid, Vh] + hs + beta)
 
+    @timed_stage("pairing")
     def __verify_sig(self, proof, aggr_vk):
         """
         Verify that everything in the sig is okay
@@ -63,22 +104,103 @@ class RP:
         :param aggr_vk: The verification key
         :return: True if everything is okay False otherwise
         """
-        G, g2, e = BpGroupHelper.G, BpGroupHelper.g2, BpGroupHelper.e
+        e = BpGroupHelper.e
         (g2, _, beta) = aggr_vk
-        # Add the public attributes in the k
-        aggr = G2Elem.inf(G)
-        for i, attribute in enumerate(proof.attributes):
-            if attribute != "":
-                aggr += Bn.from_binary(sha256(attribute).digest()) * beta[i]
-
+        k = self.__verify_commitment(proof, aggr_vk)
+        if k is None:
+            return False
         h, s = proof.sig
-        if proof.attributes_commitment != proof.k + aggr:
-            return False  # Means the user did not create the correct commitment for all the values
-        if h.isinf():
-            return False  # Check if h is 1
-        if e(h, proof.k + aggr) * e(proof.h_secret, beta[-1]) != e(s + proof.vu, g2):
+        if e(h, k) * e(proof.h_secret, beta[-1]) != e(s + proof.vu, g2):
             return False  # Check if the sig is correct
         # Lastly check if the signature is banned
-        if any(e(h, ban_sig) == e(proof.h_secret, beta[-1]) for ban_sig in ban_users.values()):
+        if self.revocation.is_banned(h, proof.h_secret, beta):
             return False
         return True
+
+    def __verify_commitment(self, proof, aggr_vk):
+        """
+        Add the public attributes in the k and check that the user returned the correct commitment to all the
+        attributes and that h is not 1
+
+        :param proof: The proof send by the client
+        :param aggr_vk: The verification key
+        :return: k * b_i^pub_attribute_i if everything is okay None otherwise
+        """
+        k = proof.k
+        for i, attribute in enumerate(proof.attributes):
+            if attribute != "":
+                k = k + self.attribute_cache.commitment(i, attribute, aggr_vk)
+        if proof.attributes_commitment != k:
+            return None  # Means the user did not create the correct commitment for all the values
+        if proof.sig[0].isinf():
+            return None  # Check if h is 1
+        return k
+
+    @counted("verify_batch")
+    def verify_batch(self, proofs, aggr_vk):
+        """
+        Verify many proofs at once. The ZKPs and the commitments are checked one by one, but the sig equations
+        e(h, k + aggr) * e(h_secret, beta[-1]) = e(s + vu, g2) of all the proofs are raised to random small exponents
+        and merged in one multi-pairing check. If the batch fails we bisect it to find the bad proofs. Like verify_id
+        the results are looked up in and added to the verification cache one proof at a time, only the proofs that
+        are not in it are verified. The operations are counted under verify_batch, they are fewer per proof
+
+        :param proofs: The proofs send by the clients
+        :param aggr_vk: The aggregated vk from the IdP's
+        :return: A list with True or False for each proof in the same order
+        """
+        cache = self.verification_cache
+        if cache is None:
+            return self.__verify_batch(proofs, aggr_vk)
+        ban_version = self.revocation.version()
+        keys = [cache.key(proof, aggr_vk, self.domain) for proof in proofs]
+        results = [cache.get(key, ban_version) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            start_time = time.perf_counter()
+            verified = self.__verify_batch([proofs[i] for i in missing], aggr_vk)
+            elapsed = (time.perf_counter() - start_time) / len(missing)  # Every proof gets its share of the batch
+            for i, result in zip(missing, verified):
+                results[i] = result
+                cache.put(keys[i], result, elapsed, ban_version)
+        return results
+
+    def __verify_batch(self, proofs, aggr_vk):
+        results = [False] * len(proofs)
+        candidates = []  # (index, proof, k + aggr) of the proofs that pass the checks that cannot be batched
+        for i, proof in enumerate(proofs):
+            if not self.__verify_zkp(proof, aggr_vk):
+                continue
+            k = self.__verify_commitment(proof, aggr_vk)
+            if k is not None:
+                candidates.append((i, proof, k))
+        _, _, beta = aggr_vk
+        for i, proof, _ in self.__verify_sigs_batch(candidates, aggr_vk):
+            results[i] = not self.revocation.is_banned(proof.sig[0], proof.h_secret, beta)
+        return results
+
+    def __verify_sigs_batch(self, candidates, aggr_vk):
+        """
+        Check the sig equations of the candidates with one multi-pairing
+        prod(e(w_i * h_i, k_i)) * e(sum(w_i * h_secret_i), beta[-1]) * e(-sum(w_i * (s_i + vu_i)), g2) = 1
+        On failure split the candidates in half and check each half again
+
+        :param candidates: A list of (index, proof, k + aggr)
+        :param aggr_vk: The aggregated vk from the IdP's
+        :return: The candidates with a correct sig
+        """
+        if not candidates:
+            return []
+        g2, _, beta = aggr_vk
+        weights = [1] if len(candidates) == 1 else batch_weights(len(candidates))
+        g1s = [w * proof.sig[0] for w, (_, proof, _) in zip(weights, candidates)]
+        g2s = [k for _, _, k in candidates]
+        h_secrets = multi_mul([proof.h_secret for _, proof, _ in candidates], weights)
+        sigs = multi_mul([proof.sig[1] + proof.vu for _, proof, _ in candidates], weights)
+        if multi_pair(g1s + [h_secrets, -sigs], g2s + [beta[-1], g2]).isone():
+            return candidates
+        if len(candidates) == 1:
+            return []
+        middle = len(candidates) // 2
+        return self.__verify_sigs_batch(candidates[:middle], aggr_vk) + \
+            self.__verify_sigs_batch(candidates[middle:], aggr_vk)
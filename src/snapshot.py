@@ -0,0 +1,214 @@
+import mmap
+import os
+from hashlib import sha256
+
+from bplib.bp import BpGroup, G1Elem, G2Elem
+
+from group import BpGroupHelper, FixedBaseTable, TABLE_MEMORY, G1_POINT_BYTES, G2_POINT_BYTES
+from wire import Writer, Reader, SNAPSHOT, G2_BYTES
+
+"""
+Snapshots of the key material of a process, so a new IdP, RP or verifier can start without BpGroupHelper.setup and
+without rebuilding the fixed-base tables. The file uses the fields of wire.py:
+
+    header  the version of wire.py and the kind SNAPSHOT
+    q, window  u8 each, the window of the tables
+    g1, g2, hs, g_secret, h_secret  to check the group and to skip the hashing of the generators
+    sk, vk, aggr_vk  each one starts with u8 1 if it is in the snapshot and 0 if not
+    tables  u16 count, then for each table the u16 index of its point in points() and the u8 number of rows,
+            followed by the rows without their first (empty) entry
+    digest  the sha256 of the tables from their count on, 32 bytes
+
+The points of the tables are uncompressed, G1 ones take 65 bytes but import without a square root. The file is
+memory mapped and a point of a table is only decoded the first time it is used, so loading costs as much as reading
+the header and hashing the tables. The digest finds a truncated or changed file, and the first point of every table
+has to be the point of its index, so the rows are never used for the wrong key
+"""
+
+G1_TABLE_BYTES = 65  # An uncompressed G1 point
+POINT_CONVERSION_UNCOMPRESSED = 4
+
+
+class MappedRow:
+    """
+    A row of a MappedTable. A multiplication only uses one point of every row so the points are decoded one by one
+    when they are first used
+    """
+
+    def __init__(self, data, size, elem, oct2point):
+        """
+        :param data: The memoryview of the row in the snapshot
+        :param size: The size of a point in bytes
+        :param elem: G1Elem or G2Elem
+        :param oct2point: The C function of bplib that imports the point
+        """
+        self.data, self.size, self.elem, self.oct2point = data, size, elem, oct2point
+        self.points = [None] * (len(data) // size + 1)
+
+    def __len__(self):
+        return len(self.points)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        point = self.points[index]
+        if point is None and index > 0:
+            r = Reader(self.data[(index - 1) * self.size:index * self.size])
+            point = self.points[index] = r.point(self.elem(BpGroupHelper.G), self.oct2point, self.size)
+        return point
+
+
+class MappedTable(FixedBaseTable):
+    """
+    A FixedBaseTable whose points are still in the memory map of a snapshot
+    """
+
+    def __init__(self, data, window, rows, g1):
+        """
+        :param data: The memoryview of the rows in the snapshot
+        :param window: The window of the table in bits
+        :param rows: The number of rows
+        :param g1: True for the table of a G1 point, False for G2
+        """
+        G = BpGroupHelper.G
+        self.window = window
+        self.bytes = rows * (2 ** window - 1) * (G1_POINT_BYTES if g1 else G2_POINT_BYTES)
+        if g1:
+            elem, oct2point, size = G1Elem, G.math.G1_ELEM_oct2point, G1_TABLE_BYTES
+        else:
+            elem, oct2point, size = G2Elem, G.math.G2_ELEM_oct2point, G2_BYTES
+        row_bytes = (2 ** window - 1) * size
+        self.rows = [MappedRow(data[i * row_bytes:(i + 1) * row_bytes], size, elem, oct2point) for i in range(rows)]
+
+
+class Snapshot:
+    """
+    The keys of a loaded snapshot. The group of BpGroupHelper is already set up when it is created by load()
+    """
+
+    def __init__(self, q, sk, vk, aggr_vk, tables):
+        self.q = q
+        self.sk = sk
+        self.vk = vk
+        self.aggr_vk = aggr_vk
+        self.tables = tables  # The number of tables in the file
+
+
+def points(vk=None, aggr_vk=None):
+    """
+    :return: All the points of the group and the keys that can have a table, in the order of their index
+    """
+    result = [BpGroupHelper.g1, BpGroupHelper.g2, BpGroupHelper.g_secret, BpGroupHelper.h_secret] + BpGroupHelper.hs
+    for key in (vk, aggr_vk):
+        if key is not None:
+            result += [key[1]] + list(key[2])
+    return result
+
+
+def write_vk(w, vk):
+    w.u8(len(vk[2]))
+    w.g2(vk[1])
+    for beta in vk[2]:
+        w.g2(beta)
+
+
+def read_vk(r):
+    """
+    :return: The alpha and the beta's of the vk, the g2 is added after the setup
+    """
+    count = r.u8()
+    return r.g2(), [r.g2() for _ in range(count)]
+
+
+def save(path, sk=None, vk=None, aggr_vk=None):
+    """
+    Write the group of BpGroupHelper, the keys and the tables of all their points to a file
+
+    :param path: The file to write
+    :param sk: The sk of an IdP [x, [y's]] or None, it is written in the clear so the file is only for the owner
+    :param vk: The vk of an IdP or None
+    :param aggr_vk: The aggregated vk or None
+    """
+    w = Writer(SNAPSHOT)
+    w.u8(len(BpGroupHelper.hs) - 1)
+    w.u8(BpGroupHelper.table_window)
+    w.g1(BpGroupHelper.g1)
+    w.g2(BpGroupHelper.g2)
+    w.g1s(BpGroupHelper.hs)
+    w.g1(BpGroupHelper.g_secret)
+    w.g1(BpGroupHelper.h_secret)
+    w.u8(sk is not None)
+    if sk is not None:
+        w.bn(sk[0])
+        w.bns(sk[1])
+    for key in (vk, aggr_vk):
+        w.u8(key is not None)
+        if key is not None:
+            write_vk(w, key)
+    tables = [(i, point, BpGroupHelper.table(point)) for i, point in enumerate(points(vk, aggr_vk))]
+    tables = [(i, point, table) for i, point, table in tables
+              if table is not None and table.window == BpGroupHelper.table_window]
+    tables_start = len(w.parts)
+    w.u16(len(tables))
+    for i, point, table in tables:
+        w.u16(i)
+        w.u8(len(table.rows))
+        for row in table.rows:
+            for p in row[1:]:
+                if isinstance(point, G1Elem):
+                    w.point(p, G1_TABLE_BYTES, POINT_CONVERSION_UNCOMPRESSED)
+                else:
+                    w.g2(p)
+    w.parts.append(sha256(b"".join(w.parts[tables_start:])).digest())
+    # Write to a temporary file first so a process never maps a half written snapshot. Only the owner can read it,
+    # the sk is not encrypted
+    temp = path + ".tmp"
+    with os.fdopen(os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as file:
+        file.write(w.getvalue())
+    os.replace(temp, path)
+
+
+def load(path, msm=True, table_memory=TABLE_MEMORY):
+    """
+    Set up BpGroupHelper from a snapshot and register its tables, they are decoded from the memory map when they are
+    first used
+
+    :param path: The snapshot file
+    :param msm: Like in BpGroupHelper.setup
+    :param table_memory: Like in BpGroupHelper.setup
+    :return: The Snapshot with the keys
+    """
+    with open(path, "rb") as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    G = BpGroupHelper.G = BpGroup()  # The Reader decodes the points in BpGroupHelper.G
+    r = Reader(data, SNAPSHOT)
+    q, window = r.u8(), r.u8()
+    if r.g1() != G.gen1() or r.g2() != G.gen2():
+        raise ValueError("The snapshot is for a different group")
+    generators = (r.g1s(), r.g1(), r.g1())
+    sk = [r.bn(), r.bns()] if r.u8() else None
+    vk = read_vk(r) if r.u8() else None
+    aggr_vk = read_vk(r) if r.u8() else None
+    BpGroupHelper.setup(q, msm, window, table_memory, group=G, generators=generators, precompute=False)
+    vk, aggr_vk = [(BpGroupHelper.g2,) + key if key is not None else None for key in (vk, aggr_vk)]
+    all_points = points(vk, aggr_vk)
+    generators = len(points())  # The tables of the generators are pinned like in BpGroupHelper.setup
+    tables_start = r.offset
+    count = r.u16()
+    tables = []
+    for _ in range(count):
+        index, rows = r.u16(), r.u8()
+        if index >= len(all_points):
+            raise ValueError("The snapshot has a table of an unknown point")
+        point = all_points[index]
+        g1 = isinstance(point, G1Elem)
+        table_data = r.take(rows * (2 ** window - 1) * (G1_TABLE_BYTES if g1 else G2_BYTES))
+        tables.append((index, point, MappedTable(table_data, window, rows, g1)))
+    if sha256(r.data[tables_start:r.offset]).digest() != r.take(sha256().digest_size):
+        raise ValueError("The tables of the snapshot are corrupted")
+    r.end()
+    for index, point, table in tables:
+        if not table.rows or table.rows[0][1] != point:
+            raise ValueError("The snapshot has a table of a different point")
+        BpGroupHelper.add_table(point, table, index < generators)
+    return Snapshot(q, sk, vk, aggr_vk, count)
@@ -0,0 +1,64 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from group import BpGroupHelper
+
+
+class StageTimer:
+    """
+    Times the stages of a request (decoding, ZKP verification, pairing checks, signing...) on the thread that serves
+    it. The protocol methods are marked with @timed_stage and the server calls begin() and end() around every request.
+    Stages can be nested, the time of an inner stage is not counted in the outer one
+    """
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def begin(self):
+        self.local.stages, self.local.stack = {}, []
+
+    def end(self):
+        """
+        :return: {stage: seconds} of the request, a stage that ran more than once has the sum of its times
+        """
+        stages = getattr(self.local, "stages", None)
+        self.local.stages = None
+        return stages or {}
+
+    @contextmanager
+    def stage(self, name):
+        stages = getattr(self.local, "stages", None)
+        if stages is None:  # Not inside a request
+            yield
+            return
+        stack = self.local.stack
+        stack.append(0)  # The time of the stages inside this one
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start_time
+            stages[name] = stages.get(name, 0) + elapsed - stack.pop()
+            if stack:
+                stack[-1] += elapsed
+
+
+def timed_stage(name):
+    """
+    Decorator for the methods that StageTimer times as a stage. When there is no timer it only costs a check of
+    BpGroupHelper.stage_timer
+
+    :param name: The name of the stage
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            timer = BpGroupHelper.stage_timer
+            if timer is None:
+                return function(*args, **kwargs)
+            with timer.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
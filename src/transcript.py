@@ -0,0 +1,116 @@
+import threading
+import weakref
+from collections import OrderedDict
+from hashlib import sha256
+from struct import Struct
+
+from petlib.bn import Bn
+
+from group import BpGroupHelper
+from helper import to_challenge
+
+PREFIX_CACHE_SIZE = 32  # The number of constant prefixes of the transcripts we keep the hash state for
+EXPORT_CACHE_SIZE = 256  # The number of points we keep the export for
+# The labels of the transcripts of the ZKPs of the request, of the opening and of the proof to the RP
+REQUEST_LABEL, OPENING_LABEL, PROVE_LABEL = b"request", b"opening", b"prove"
+
+
+class Transcript:
+    """
+    Fiat-Shamir transcript that hashes the raw exports of the elements as they come, each one after its length in 4
+    bytes. Most challenges start with the same elements (the generators and the vk), so the hash state after such a
+    constant prefix is kept and every new transcript starts from a copy of it
+
+        c = Transcript.prefix(b"label", [g1, g2] + hs).absorb([C, h]).challenge()
+    """
+
+    # The hash states of the prefixes {(label, ids of the points): (weakrefs to the points, hash)} in LRU order
+    prefixes = OrderedDict()
+    # The exports of the prefix points {id(point): (weakref to the point, export)} in LRU order
+    exports = OrderedDict()
+    # Guards both caches, the async server runs the protocol on many threads. The hashing happens outside of it
+    lock = threading.Lock()
+    __length = Struct(">I")
+
+    def __init__(self, H=None):
+        """
+        :param H: The hash state to continue from, it is copied
+        """
+        self.H = sha256() if H is None else H.copy()
+
+    @staticmethod
+    def export(point):
+        """
+        :param point: A point that is hashed many times like the generators and the vk
+        :return: The export of the point, cached while the point exists
+        """
+        with Transcript.lock:
+            entry = Transcript.exports.get(id(point))
+            if entry is not None and entry[0]() is point:
+                Transcript.exports.move_to_end(id(point))
+                return entry[1]
+        data = point.export()
+        with Transcript.lock:
+            Transcript.exports[id(point)] = (weakref.ref(point), data)
+            if len(Transcript.exports) > EXPORT_CACHE_SIZE:
+                Transcript.exports.popitem(last=False)
+        return data
+
+    @staticmethod
+    def prefix(label, points):
+        """
+        :param label: Bytes that separate the different proofs
+        :param points: The constant points that start the challenge
+        :return: A new Transcript that has absorbed the label and the points
+        """
+        key = (label, tuple(map(id, points)))
+        with Transcript.lock:
+            entry = Transcript.prefixes.get(key)
+            if entry is not None and all(ref() is point for ref, point in zip(entry[0], points)):
+                Transcript.prefixes.move_to_end(key)
+                return Transcript(entry[1])
+        transcript = Transcript()
+        transcript.absorb_bytes(label)
+        transcript.H.update(b"".join(Transcript.__length.pack(len(data)) + data
+                                     for data in map(Transcript.export, points)))
+        with Transcript.lock:
+            Transcript.prefixes[key] = ([weakref.ref(point) for point in points], transcript.H.copy())
+            if len(Transcript.prefixes) > PREFIX_CACHE_SIZE:
+                Transcript.prefixes.popitem(last=False)
+        return transcript
+
+    def absorb_bytes(self, data):
+        self.H.update(Transcript.__length.pack(len(data)) + data)
+        return self
+
+    def absorb(self, elements):
+        """
+        :param elements: Points of G1, G2 or GT
+        :return: The transcript to chain the calls
+        """
+        self.H.update(b"".join(Transcript.__length.pack(len(data)) + data
+                               for data in (element.export() for element in elements)))
+        return self
+
+    def challenge(self):
+        """
+        :return: The challenge as a 256 bit Bn
+        """
+        return Bn.from_binary(self.H.digest())
+
+
+def challenge(label, prefix, elements, legacy):
+    """
+    The challenge of a proof with a Transcript, or with to_challenge when BpGroupHelper.transcript is False
+
+    :param label: Bytes that separate the different proofs
+    :param prefix: The constant points at the start, like the generators and the vk
+    :param elements: The elements of this proof
+    :param legacy: All the elements in the order to_challenge hashed them in the older versions
+    :return: The challenge as Bn
+    """
+    if BpGroupHelper.counter is not None:
+        BpGroupHelper.counter.add("challenge")
+    if not BpGroupHelper.transcript:
+        return to_challenge(legacy)
+    return Transcript.prefix(label, prefix).absorb(elements).challenge()
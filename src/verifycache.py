@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+
+from transcript import Transcript
+
+VERIFY_CACHE_SIZE = 4096  # The number of results we keep
+VERIFY_CACHE_TTL = 60  # Seconds a result is kept
+
+
+class VerificationCache:
+    """
+    Results of RP.verify_id for proofs that were already verified, e.g. retries, replays of the load balancer or a
+    front end that checks a session again. The key is the digest of the binary encoding of the proof, the aggregated
+    vk and the domain of the RP. The results expire after ttl seconds, and they are all dropped when the ban list
+    changes because a proof that was valid can be banned now
+    """
+
+    def __init__(self, size=VERIFY_CACHE_SIZE, ttl=VERIFY_CACHE_TTL, clock=time.monotonic):
+        """
+        :param size: The maximum number of results
+        :param ttl: Seconds a result is kept
+        :param clock: The clock of the expiry times in seconds
+        """
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.saved_time = 0  # The time the verifications of the hits took when they were done, in seconds
+        self.__entries = OrderedDict()  # {digest: (result, expiry, time to verify)} in least recently used order
+        self.__ban_version = None  # The version of the ban list of the results
+        self.__lock = threading.Lock()  # A gateway in front of verify_id looks up the results from many threads
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def hit_rate(self):
+        """
+        :return: The fraction of the lookups that were hits
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    @staticmethod
+    def key(proof, aggr_vk, domain):
+        """
+        :param proof: The CredProof
+        :param aggr_vk: The aggregated vk it is verified with
+        :param domain: The domain of the RP
+        :return: The digest of all three
+        """
+        _, alpha, beta = aggr_vk
+        H = sha256(proof.to_bytes())
+        for point in [alpha] + beta:
+            H.update(Transcript.export(point))
+        H.update(domain)
+        return H.digest()
+
+    def get(self, key, ban_version):
+        """
+        :param key: The key of the proof
+        :param ban_version: The version of the ban list now
+        :return: The cached result or None
+        """
+        with self.__lock:
+            if ban_version != self.__ban_version:
+                self.__entries.clear()
+                self.__ban_version = ban_version
+            entry = self.__entries.get(key)
+            if entry is not None and entry[1] > self.clock():
+                self.__entries.move_to_end(key)
+                self.hits += 1
+                self.saved_time += entry[2]
+                return entry[0]
+            if entry is not None:
+                del self.__entries[key]  # Expired
+            self.misses += 1
+            return None
+
+    def put(self, key, result, elapsed, ban_version):
+        """
+        :param key: The key of the proof
+        :param result: The result of the verification
+        :param elapsed: The seconds the verification took
+        :param ban_version: The version of the ban list the proof was checked against
+        """
+        with self.__lock:
+            if ban_version != self.__ban_version:
+                return  # The ban list changed during the verification
+            self.__entries[key] = (result, self.clock() + self.ttl, elapsed)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.size:
+                self.__entries.popitem(last=False)
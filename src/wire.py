@@ -0,0 +1,302 @@
+from struct import Struct
+
+from bplib.bp import G1Elem, G2Elem, GTElem
+from bplib.bindings import _FFI
+from petlib.bn import Bn
+from petlib.bindings import _FFI as _BN_FFI, _C as _BN_C
+
+from helper import BpGroupHelper
+
+"""
+Binary encoding of the Request and the CredProof. Every message starts with the version and the kind, then the fields
+follow in a fixed order with fixed sizes. The lists start with their length in one byte:
+
+    Bn  32 bytes big endian unsigned, the challenges are 256 bit hashes and the rest are mod o
+    G1  33 bytes compressed
+    G2  128 bytes uncompressed, bplib does not support compressed G2 points
+    GT  384 bytes
+    attribute  1 byte public flag, then for the public ones 2 bytes length and the value
+
+The points at infinity are all zero bytes. Decoding takes a memoryview and hands the slices to the C functions
+without copying them
+"""
+
+CONTENT_TYPE = "application/x-sso-binary"  # The content type of the binary messages over HTTP
+VERSION = 1
+REQUEST, CRED_PROOF, SIG, SNAPSHOT = 1, 2, 3, 4  # The kinds of the messages, SNAPSHOT is a file of snapshot.py
+
+BN_BYTES = 32
+G1_BYTES = 33
+G2_BYTES = 128
+GT_BYTES = 384
+
+_HEADER = Struct(">BB")
+_U8 = Struct(">B")
+_U16 = Struct(">H")
+_ZEROS = bytes(GT_BYTES)  # The encoding of the point at infinity
+
+
+class Writer:
+    """
+    Collects the encoded fields of a message
+    """
+
+    def __init__(self, kind):
+        self.parts = [_HEADER.pack(VERSION, kind)]
+
+    def u8(self, x):
+        if not 0 <= x <= 0xFF:  # The counts of the lists, struct.error would become a 500 in the servers
+            raise ValueError("%s does not fit in one byte, a list can have up to 255 entries" % x)
+        self.parts.append(_U8.pack(x))
+
+    def u16(self, x):
+        if not 0 <= x <= 0xFFFF:
+            raise ValueError("%s does not fit in two bytes, an attribute can have up to 65535 bytes" % x)
+        self.parts.append(_U16.pack(x))
+
+    def bn(self, x):
+        if x < 0 or x.num_bits() > BN_BYTES * 8:
+            raise ValueError("Bn out of range")
+        self.parts.append(x.binary().rjust(BN_BYTES, b"\0"))
+
+    def point(self, x, size, *form):
+        """
+        :param form: The form of the export of bplib, the default is compressed for G1
+        """
+        data = x.export(*form)
+        if len(data) == 1:  # The point at infinity
+            data = bytes(size)
+        elif len(data) != size:
+            raise ValueError("Unexpected point encoding")
+        self.parts.append(data)
+
+    def g1(self, x):
+        self.point(x, G1_BYTES)
+
+    def g2(self, x):
+        self.point(x, G2_BYTES)
+
+    def gt(self, x):
+        self.point(x, GT_BYTES)
+
+    def bns(self, xs):
+        self.u8(len(xs))
+        for x in xs:
+            self.bn(x)
+
+    def g1s(self, xs):
+        self.u8(len(xs))
+        for x in xs:
+            self.g1(x)
+
+    def attributes(self, attributes):
+        self.u8(len(attributes))
+        for attribute in attributes:
+            if attribute == "":  # Private
+                self.u8(0)
+            else:
+                self.u8(1)
+                self.u16(len(attribute))
+                self.parts.append(attribute)
+
+    def getvalue(self):
+        return b"".join(self.parts)
+
+
+class Reader:
+    """
+    Reads the fields of a message from a memoryview in the order they were written
+    """
+
+    def __init__(self, data, kind=None):
+        """
+        :param data: The message as bytes, bytearray or memoryview
+        :param kind: The kind of message we expect, None for data without the header
+        """
+        self.data = memoryview(data)
+        self.offset = 0
+        if kind is None:
+            return
+        version, message_kind = _HEADER.unpack(self.take(_HEADER.size))
+        if version != VERSION:
+            raise ValueError("Unsupported version %s" % version)
+        if message_kind != kind:
+            raise ValueError("Unexpected kind of message %s" % message_kind)
+
+    def take(self, size):
+        if self.offset + size > len(self.data):
+            raise ValueError("Truncated message")
+        part = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return part
+
+    def u8(self):
+        return self.take(1)[0]
+
+    def u16(self):
+        return _U16.unpack(self.take(_U16.size))[0]
+
+    def bn(self):
+        x = Bn()
+        _BN_C.BN_bin2bn(_BN_FFI.from_buffer(self.take(BN_BYTES)), BN_BYTES, x.bn)
+        return x
+
+    def point(self, elem, oct2point, size):
+        """
+        :param elem: The empty element, the point at infinity
+        :param oct2point: The C function of bplib that imports the point
+        """
+        G = BpGroupHelper.G
+        data = self.take(size)
+        if data == _ZEROS[:size]:
+            return elem
+        if not oct2point(G.bpg, elem.elem, _FFI.from_buffer(data), size, _FFI.NULL):
+            raise ValueError("Invalid point")
+        return elem
+
+    def g1(self):
+        G = BpGroupHelper.G
+        return self.point(G1Elem(G), G.math.G1_ELEM_oct2point, G1_BYTES)
+
+    def g2(self):
+        G = BpGroupHelper.G
+        return self.point(G2Elem(G), G.math.G2_ELEM_oct2point, G2_BYTES)
+
+    def gt(self):
+        G = BpGroupHelper.G
+        return self.point(GTElem(G), G.math.GT_ELEM_oct2elem, GT_BYTES)
+
+    def bns(self):
+        return [self.bn() for _ in range(self.u8())]
+
+    def g1s(self):
+        return [self.g1() for _ in range(self.u8())]
+
+    def attributes(self):
+        attributes = []
+        for _ in range(self.u8()):
+            if self.u8():
+                attributes.append(bytes(self.take(self.u16())))
+            else:
+                attributes.append("")
+        return attributes
+
+    def end(self):
+        if self.offset != len(self.data):
+            raise ValueError("Trailing bytes after the message")
+
+
+def encode_request(request):
+    """
+    :param request: The Request
+    :return: The binary encoding of the request
+    """
+    w = Writer(REQUEST)
+    w.bn(request.user_id)
+    w.g1(request.users_pk)
+    w.g1(request.Cm)
+    w.u8(len(request.cypher))
+    for a, b in request.cypher:
+        w.g1(a)
+        w.g1(b)
+    c, rk, ra, rr, rs = request.zkp
+    w.bn(c)
+    w.bns(rk)
+    w.bns(ra)
+    w.bn(rr)
+    w.bn(rs)
+    w.attributes(request.attributes)
+    c, h_coeff = request.opening_params
+    w.u8(len(c))
+    for i, (c0, c1, (challenge, rr, Vc1)) in c.items():
+        w.u8(i)
+        w.g2(c0)
+        w.g2(c1)
+        w.bn(challenge)
+        w.bn(rr)
+        w.gt(Vc1)
+    w.g1s(h_coeff)
+    w.g1(request.h_secret)
+    return w.getvalue()
+
+
+def decode_request(data):
+    """
+    :param data: The binary encoding of a request
+    :return: The arguments of the Request constructor in order
+    """
+    r = Reader(data, REQUEST)
+    user_id, users_pk, Cm = r.bn(), r.g1(), r.g1()
+    cypher = [(r.g1(), r.g1()) for _ in range(r.u8())]
+    zkp = (r.bn(), r.bns(), r.bns(), r.bn(), r.bn())
+    attributes = r.attributes()
+    c = {}
+    for _ in range(r.u8()):
+        i = r.u8()
+        c[i] = (r.g2(), r.g2(), (r.bn(), r.bn(), r.gt()))
+    opening_params = (c, r.g1s())
+    h_secret = r.g1()
+    r.end()
+    return user_id, users_pk, Cm, cypher, zkp, attributes, opening_params, h_secret
+
+
+def encode_proof(proof):
+    """
+    :param proof: The CredProof
+    :return: The binary encoding of the proof
+    """
+    w = Writer(CRED_PROOF)
+    w.g1(proof.user_id)
+    w.g2(proof.k)
+    w.g1(proof.vu)
+    h, sig = proof.sig
+    w.g1(h)
+    w.g1(sig)
+    c, ra, rr, rs = proof.zkp
+    w.bn(c)
+    w.bns(ra)
+    w.bn(rr)
+    w.bn(rs)
+    w.attributes(proof.attributes)
+    w.g1(proof.h_secret)
+    w.g2(proof.attributes_commitment)
+    return w.getvalue()
+
+
+def decode_proof(data):
+    """
+    :param data: The binary encoding of a proof
+    :return: The arguments of the CredProof constructor in order
+    """
+    r = Reader(data, CRED_PROOF)
+    user_id, k, vu = r.g1(), r.g2(), r.g1()
+    sig = (r.g1(), r.g1())
+    zkp = (r.bn(), r.bns(), r.bn(), r.bn())
+    attributes = r.attributes()
+    h_secret, attributes_commitment = r.g1(), r.g2()
+    r.end()
+    return user_id, k, vu, sig, zkp, attributes, h_secret, attributes_commitment
+
+
+def encode_sig(sig_prime):
+    """
+    :param sig_prime: The blinded signature (h, (c_1, c_2)) of IdP.provide_id
+    :return: The binary encoding of the signature
+    """
+    w = Writer(SIG)
+    h, (c_1, c_2) = sig_prime
+    w.g1(h)
+    w.g1(c_1)
+    w.g1(c_2)
+    return w.getvalue()
+
+
+def decode_sig(data):
+    """
+    :param data: The binary encoding of a blinded signature
+    :return: The blinded signature (h, (c_1, c_2))
+    """
+    r = Reader(data, SIG)
+    sig_prime = r.g1(), (r.g1(), r.g1())
+    r.end()
+    return sig_prime
@@ -1,16 +1,81 @@
+import asyncio
+import json
+import os
 import sys
+import time
 from typing import List, Tuple
 import pytest
 from pytest import raises
+from petlib.bn import Bn
 
 sys.path.append("../src")
+sys.path.append("../benchmarking/AWS")
 
+import attributecache
 import helper
-from helper import BpGroupHelper
+from helper import BpGroupHelper, Polynomial
+from stagetimer import StageTimer
+from msm import multi_mul, fixed_mul
+from group import FixedBaseTable
+from transcript import Transcript
+from attributecache import AttributeCache
 from client import Client
-from idp import IdP, setup_idps
+from idp import IdP, setup_idps, dkg_generators, verify_dealings
 from rp import RP
-from opener import Opener, check_sig, deanonymize
+from opener import Opener, BanList, check_sig, deanonymize, ban_users, ledger
+from deanonymizer import Deanonymizer
+from revocation import RevocationChecker
+from keymanager import AggregatedKeyManager
+from request import Request
+from credproof import CredProof
+import wire
+import snapshot
+from issuance import ThresholdIssuer, IssuanceError
+from verifycache import VerificationCache
+
+ATTRIBUTES: List[Tuple[bytes, bool]] = [(b"hidden1", True), (b"public1", False)]
+
+
+@pytest.fixture(autouse=True)
+def clean_ledger():
+    """
+    The ledger and the ban list are global, every test starts with them empty and they are restored after it
+    """
+    saved_ledger, saved_ban_users = dict(ledger), dict(ban_users)
+    ledger.clear()
+    ban_users.clear()
+    yield
+    ledger.clear()
+    ledger.update(saved_ledger)
+    ban_users.clear()
+    ban_users.update(saved_ban_users)
+
+
+def setup_entities(q=3, t=2, n=3, total_opener=3, **setup_args):
+    """
+    Sets up the group, the IdPs and the openers
+
+    :param setup_args: Passed to BpGroupHelper.setup, e.g. count_ops
+    :return: The IdPs, the openers and the aggregated vk of all the IdPs
+    """
+    BpGroupHelper.setup(q, **setup_args)
+    idps = setup_idps(t, n)
+    openers = [Opener() for _ in range(total_opener)]
+    aggr_vk = helper.agg_key([idp.vk for idp in idps])
+    return idps, openers, aggr_vk
+
+
+def issue_credential(idps, openers, aggr_vk, attributes=ATTRIBUTES, threshold_opener=2, **client_args):
+    """
+    A client that got its credential from all the IdPs
+
+    :param client_args: Passed to Client, e.g. the pool sizes
+    :return: The client and its request
+    """
+    client = Client(helper.sort_attributes(attributes), aggr_vk, **client_args)
+    request = client.request_id(threshold_opener, openers)
+    client.agg_cred([client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps])
+    return client, request
 
 
 def test_idp_client_normal():
@@ -56,3 +121,458 @@ def test_idp_client_normal():
 
     # Check again
     assert not rp.verify_id(proof, aggr_vk)
+
+
+def test_revocation_checker():
+    idps, openers, aggr_vk = setup_entities()
+    client, request = issue_credential(idps, openers, aggr_vk)
+    proof = client.prove_id(b"Domain")
+    g2, _, beta = aggr_vk
+    h = proof.sig[0]
+
+    # Other banned users should not match
+    banned = BanList({i: BpGroupHelper.o.random() * beta[-1] for i in range(6)})
+    checker = RevocationChecker(banned, workers=2, parallel_threshold=4)
+    with raises(TypeError):
+        RevocationChecker(dict(banned))
+    assert not checker.is_banned(h, proof.h_secret, beta)
+    assert checker.checked == 6
+    banned.pop(0)
+    assert not checker.is_banned(h, proof.h_secret, beta)
+    assert checker.checked == 5
+
+    # Once the user is banned both the sequential and the parallel scan find it
+    assert deanonymize(openers, proof, aggr_vk) == request.user_id
+    banned[request.user_id] = ban_users[request.user_id]
+    assert checker.is_banned(h, proof.h_secret, beta)
+    assert 1 <= checker.checked <= 6
+    checker.parallel_threshold = 100
+    assert checker.is_banned(h, proof.h_secret, beta)
+    assert checker.checked == 6
+    checker.close()
+    assert not RP(b"Domain").verify_id(proof, aggr_vk)
+
+
+def test_deanonymizer():
+    idps, openers, aggr_vk = setup_entities()
+    clients = [issue_credential(idps, openers, aggr_vk) for _ in range(5)]
+    client, request = clients[3]
+    proof = client.prove_id(b"Domain")
+    user_id = request.user_id
+
+    progress = []
+    deanonymizer = Deanonymizer(openers, workers=2, chunk_size=2, parallel_threshold=1)
+    assert deanonymizer.trace(proof, aggr_vk, lambda scanned, total: progress.append(scanned)) == user_id
+    assert progress == sorted(progress) and progress[-1] == deanonymizer.scanned
+    assert user_id in ban_users
+    assert not RP(b"Domain").verify_id(proof, aggr_vk)
+
+    deanonymizer.workers = 1
+    assert deanonymizer.trace(proof, aggr_vk) == user_id
+    assert deanonymizer.scanned == 4  # The ledger has only the users of this test
+
+
+def test_verify_batch():
+    idps, openers, aggr_vk = setup_entities()
+    client, _ = issue_credential(idps, openers, aggr_vk)
+    rp = RP(b"Domain")
+    proofs = [client.prove_id(rp.domain) for _ in range(5)]
+    assert rp.verify_batch(proofs, aggr_vk) == [True] * 5
+    assert rp.verify_batch([], aggr_vk) == []
+
+    # A bad sig passes the ZKP and has to be found by the bisection
+    h, s = proofs[1].sig
+    proofs[1].sig = (h, s + BpGroupHelper.g1)
+    proofs[3].attributes = proofs[3].attributes[:-1] + [b"public2"]
+    assert rp.verify_batch(proofs, aggr_vk) == [True, False, True, False, True]
+    assert rp.verify_batch(proofs, aggr_vk) == [rp.verify_id(proof, aggr_vk) for proof in proofs]
+
+    # The batch shares the verification cache with verify_id
+    cache = VerificationCache()
+    rp = RP(b"Domain", verification_cache=cache)
+    assert rp.verify_id(proofs[0], aggr_vk) and (cache.hits, cache.misses) == (0, 1)
+    assert rp.verify_batch(proofs, aggr_vk) == [True, False, True, False, True]
+    assert (cache.hits, cache.misses) == (1, 5)
+    assert not rp.verify_id(proofs[1], aggr_vk) and rp.verify_batch(proofs, aggr_vk)[4] and cache.hits == 7
+
+
+def test_provide_ids():
+    idps, openers, aggr_vk = setup_entities()
+    clients = [Client(helper.sort_attributes(ATTRIBUTES), aggr_vk) for _ in range(4)]
+    requests = [client.request_id(2, openers) for client in clients]
+    assert idps[0].provide_ids(requests, aggr_vk) == [idps[0].provide_id(request, aggr_vk) for request in requests]
+
+    # A wrong h_coeff passes the challenge so only the pairing check catches it
+    c, h_coeff = requests[2].opening_params
+    requests[2].opening_params = (c, [h_coeff[0] + BpGroupHelper.g1])
+    ledger.pop(requests[2].user_id)
+    sigs_prime = [idp.provide_ids(requests, aggr_vk) for idp in idps]
+    assert [sig_prime[2] for sig_prime in sigs_prime] == [0, 0, 0]
+    assert requests[2].user_id not in ledger
+    clients[3].agg_cred([clients[3].unbind_sig(sig_prime[3]) for sig_prime in sigs_prime])
+    assert clients[3].verify_sig()
+
+
+def test_fixed_base_tables():
+    BpGroupHelper.setup(2, table_window=4, table_memory=2 ** 30)
+    o, g1, g2 = BpGroupHelper.o, BpGroupHelper.g1, BpGroupHelper.g2
+    assert BpGroupHelper.table(g1) is not None and BpGroupHelper.table(g2) is not None
+    scalars = [o.random(), 0, 1, -5, o - 1]
+    for scalar in scalars:
+        assert fixed_mul(g1, scalar) == scalar * g1
+        assert fixed_mul(g2, scalar) == scalar * g2
+    points = [g1, BpGroupHelper.hs[0], o.random() * g1]
+    assert multi_mul(points, scalars[:3]) == sum((s * p for s, p in zip(scalars[1:3], points[1:3])),
+                                                        scalars[0] * g1)
+
+    # The memory limit drops the least recently used tables, but never the ones of the generators
+    generator_bytes, point_bytes = BpGroupHelper.table_bytes, BpGroupHelper.table(g1).bytes
+    BpGroupHelper.setup(2, table_window=4, table_memory=generator_bytes + point_bytes)
+    generators = [BpGroupHelper.g1, BpGroupHelper.g2, BpGroupHelper.g_secret, BpGroupHelper.h_secret] + BpGroupHelper.hs
+    old_point, point = o.random() * g1, o.random() * g1
+    BpGroupHelper.precompute([old_point])
+    BpGroupHelper.precompute([point])
+    assert BpGroupHelper.table(old_point) is None and BpGroupHelper.table(point) is not None
+    assert None not in [BpGroupHelper.table(generator) for generator in generators]
+    assert not BpGroupHelper.add_table(o.random() * g2, FixedBaseTable(g2, 4))  # Does not fit
+    # The table goes away with its point
+    del point
+    assert BpGroupHelper.table_bytes == generator_bytes
+
+
+def test_lagrange_cache():
+    BpGroupHelper.setup(1)
+    o = BpGroupHelper.o
+    coeff = [o.random() for _ in range(5)]
+    indexes = [9, 2, 100, 4, 7]
+    for _ in range(2):
+        l = helper.Polynomial.lagrange_interpolation(indexes)
+        assert sum((l[k] * helper.Polynomial.evaluate(coeff, i) for k, i in enumerate(indexes)), Bn(0)) % o == coeff[0]
+    assert list(helper.Polynomial.lagrange_cache) == [tuple(indexes)]
+    # The oldest index sets are dropped once the cache is full
+    for i in range(helper.LAGRANGE_CACHE_SIZE):
+        helper.Polynomial.lagrange_interpolation([i + 1, i + 2])
+    assert tuple(indexes) not in helper.Polynomial.lagrange_cache
+    assert len(helper.Polynomial.lagrange_cache) == helper.LAGRANGE_CACHE_SIZE
+
+
+def test_aggregated_key_manager():
+    BpGroupHelper.setup(2)
+    idps = setup_idps(2, 4)
+    vks = [idp.vk for idp in idps]
+    generator_bytes = BpGroupHelper.table_bytes
+    manager = AggregatedKeyManager(vks)
+    assert BpGroupHelper.table_bytes == generator_bytes  # No tables for the vk of every IdP
+    manager.warm(2)
+    assert manager.misses == 6 and manager.hits == 0
+    subset_vks = [None, vks[1], None, vks[3]]
+    assert manager.agg_key(subset_vks) == helper.agg_key(subset_vks)
+    assert manager.get([4, 2]).vk == helper.agg_key(vks)
+    assert manager.misses == 6 and manager.hits == 2
+    assert tuple(helper.unpack(manager.get([1, 3]).encoding)) == manager.get([1, 3]).vk
+    assert manager.get([1, 3]) is manager.get([2, 4])
+    assert None not in manager.get([1, 3]).tables()
+    # The weighted vks of the IdPs are kept, the subsets are rebuilt from them
+    manager.invalidate()
+    assert manager.get([4, 2]).vk == helper.agg_key(vks) and manager.misses == 7
+    # A new key of an IdP drops only the subsets with that IdP
+    manager.invalidate(1, idps[0].vk)
+    manager.get([2, 3])
+    manager.get([1, 3])
+    assert manager.misses == 9
+
+
+def test_wire_format():
+    idps, openers, aggr_vk = setup_entities()
+    attributes = [(b"hidden1", True), (b"public1", False), (b"hidden2", True)]
+    client = Client(helper.sort_attributes(attributes), aggr_vk)
+    request = client.request_id(2, openers)
+    data = request.to_bytes()
+    assert len(data) < len(request.to_json()) / 2
+    decoded = Request.from_bytes(memoryview(bytearray(data)))
+    assert decoded.to_bytes() == data and decoded.attributes == request.attributes
+    sigs = [wire.decode_sig(wire.encode_sig(idp.provide_id(decoded, aggr_vk))) for idp in idps]
+    client.agg_cred([client.unbind_sig(sig) for sig in sigs])
+    rp = RP(b"Domain")
+    proof = CredProof.from_bytes(client.prove_id(rp.domain).to_bytes())
+    assert rp.verify_id(proof, aggr_vk)
+    with raises(ValueError):
+        CredProof.from_bytes(data)
+    with raises(ValueError):
+        Request.from_bytes(data[:-1])
+    with raises(ValueError):
+        wire.Writer(wire.CRED_PROOF).g1s([BpGroupHelper.g1] * 256)
+    for truncated in (b"", b"\x01"):
+        with raises(ValueError):
+            Request.from_bytes(truncated)
+
+
+def test_threshold_issuer():
+    httpx = pytest.importorskip("httpx")
+    idps, openers, aggr_vk = setup_entities(n=5)
+    client = Client(helper.sort_attributes(ATTRIBUTES), aggr_vk)
+    request = client.request_id(2, openers)
+    wrong_share = [True]
+    down = {1}
+
+    async def handler(http_request):
+        i = int(http_request.url.host[3:])
+        if i in down:
+            return httpx.Response(500)
+        if i == 5:
+            await asyncio.sleep(30)  # Never needed, it is cancelled
+        sig_prime = idps[i - 1].provide_id(Request.from_bytes(http_request.content), aggr_vk)
+        if i == 2 and wrong_share[0]:
+            h, (c_1, c_2) = sig_prime
+            sig_prime = h, (c_1, c_2 + BpGroupHelper.g1)
+        return httpx.Response(200, content=wire.encode_sig(sig_prime), headers={"content-type": wire.CONTENT_TYPE})
+
+    async def issue(vks):
+        http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        async with ThresholdIssuer(client, ["http://idp%s" % i for i in range(1, 6)], 2, vks, http) as issuer:
+            return await issuer.issue(request)
+
+    start_time = time.perf_counter()
+    assert asyncio.run(issue([idp.vk for idp in idps])) == [3, 4]
+    assert client.verify_sig()
+    # Without the vks the wrong share is only found in the aggregated sig, and the client keeps its credential
+    down.update({4, 5})
+    with raises(IssuanceError):
+        asyncio.run(issue(None))
+    assert client.verify_sig()
+    down.difference_update({4, 5})
+    wrong_share[0] = False
+    assert len(asyncio.run(issue(None))) == 2
+    assert client.verify_sig()
+    assert time.perf_counter() - start_time < 30
+
+
+def test_precompute_pools():
+    idps, openers, aggr_vk = setup_entities()
+    client = Client(helper.sort_attributes(ATTRIBUTES), aggr_vk, proof_pool_size=3, request_pool_size=2)
+    rp = RP(b"Domain")
+    client.start_precomputation()
+    for _ in range(2):
+        request = client.request_id(2, openers)
+        client.agg_cred([client.unbind_sig(idp.provide_id(request, aggr_vk)) for idp in idps])
+        client.proof_pool.fill()
+        assert len(client.proof_pool) == 3
+        proofs = [client.prove_id(rp.domain) for _ in range(4)]
+        assert all(rp.verify_batch(proofs, aggr_vk))
+        assert proofs[0].sig != proofs[1].sig
+    client.request_pool.fill()
+    assert len(client.request_pool) == 2
+    request = client.request_id(2, openers)
+    assert all(idp.provide_id(request, aggr_vk) for idp in idps)
+    client.stop_precomputation()
+    assert client.proof_pool.hits >= 6 and client.proof_pool.misses <= 2
+    assert client.request_pool.hits >= 1
+
+
+def test_single_round_setup():
+    BpGroupHelper.setup(3)
+    idps = setup_idps(2, 3, single_round=True, workers=2)
+    vks = [idp.vk for idp in idps]
+    aggr_vk = helper.agg_key(vks[:2] + [None])
+    assert helper.agg_key([None] + vks[1:]) == aggr_vk
+    client, _ = issue_credential(idps, [Opener() for _ in range(3)], aggr_vk)
+    assert client.verify_sig()
+    # A wrong share is caught by the fallback to the checks of every dealer
+    generators = dkg_generators(3)
+    o = BpGroupHelper.o
+    s, b = [[o.random() for _ in range(2)] for _ in range(3)], [o.random() for _ in range(2)]
+    commitments = [multi_mul(generators + [BpGroupHelper.h_secret], [s_m[k] for s_m in s] + [b[k]])
+                   for k in range(2)]
+    shares = {i: ([Polynomial.evaluate(s_m, i) % o for s_m in s], Polynomial.evaluate(b, i) % o) for i in range(1, 4)}
+    assert verify_dealings(2, 3, generators, [commitments], [shares])
+    shares[2][0][1] += 1
+    with raises(AssertionError):
+        verify_dealings(2, 3, generators, [commitments], [shares])
+
+
+def test_verify_shares():
+    BpGroupHelper.setup(2)
+    t, n = 3, 5
+    idps = [IdP(i, t, n) for i in range(1, n + 1)]
+    shares = {idp.id: ((idp.s_shares[1], idp.b_shares[1]), idp.commitment_coeffs) for idp in idps[1:]}
+    assert idps[0].verify_shares(t, shares) == []
+    (s, b), commitment_coeffs = shares[4]
+    shares[4] = ((s + 1, b), commitment_coeffs)
+    assert idps[0].verify_shares(t, shares) == [4]
+
+
+def test_snapshot(tmp_path):
+    idps, openers, aggr_vk = setup_entities()
+    path = str(tmp_path / "idp1.snapshot")
+    snapshot.save(path, idps[0].sk, idps[0].vk, aggr_vk)
+    assert os.stat(path).st_mode & 0o777 == 0o600  # The sk is in the clear
+    loaded = snapshot.load(path)
+    assert loaded.q == 3 and loaded.sk == idps[0].sk and loaded.vk == idps[0].vk and loaded.aggr_vk == aggr_vk
+    assert isinstance(BpGroupHelper.table(loaded.aggr_vk[1]), snapshot.MappedTable)
+    assert BpGroupHelper.table(BpGroupHelper.hs[0]) is not None
+    client, _ = issue_credential(idps, openers, loaded.aggr_vk)
+    assert client.verify_sig()
+    rp = RP(b"Domain")
+    assert rp.verify_id(client.prove_id(rp.domain), loaded.aggr_vk)
+    # A changed row or a truncated file is found on load instead of giving wrong multiples of the vk
+    with open(path, "rb") as file:
+        data = bytearray(file.read())
+    data[-40] ^= 1
+    for corrupted in (data, data[:-1]):
+        with open(path, "wb") as file:
+            file.write(corrupted)
+        with raises(ValueError):
+            snapshot.load(path)
+
+
+@pytest.mark.parametrize("transcript", [True, False])
+def test_transcript(transcript):
+    idps, openers, aggr_vk = setup_entities(transcript=transcript)
+    client, _ = issue_credential(idps, openers, aggr_vk)
+    assert client.verify_sig()
+    rp = RP(b"Domain")
+    assert rp.verify_id(client.prove_id(rp.domain), aggr_vk)
+    assert (len(Transcript.prefixes) == 3) == transcript
+    # The prefix is only a cache, a fresh transcript gives the same challenge
+    g1, g2, hs = BpGroupHelper.g1, BpGroupHelper.g2, BpGroupHelper.hs
+    cached = Transcript.prefix(b"label", [g1, g2] + hs).absorb([g1]).challenge()
+    Transcript.prefixes.clear()
+    assert Transcript.prefix(b"label", [g1, g2] + hs).absorb([g1]).challenge() == cached
+
+
+def test_attribute_cache():
+    idps, openers, aggr_vk = setup_entities()
+    cache = AttributeCache(size=16)
+    rp = RP(b"Domain", attribute_cache=cache)
+    for country in [b"GR", b"UK", b"GR"]:
+        attributes = [(b"hidden1", True), (country, False), (b"gold", False)]
+        client, _ = issue_credential(idps, openers, aggr_vk, attributes, attribute_cache=cache)
+        assert client.verify_sig()
+        assert rp.verify_id(client.prove_id(rp.domain), aggr_vk)
+    assert cache.hits > cache.misses and len(cache) == 3
+    # The IdPs keep the exponents that come from their sk in their own caches
+    assert all(len(idp.attribute_cache) == 3 and idp.attribute_cache is not attributecache.attribute_cache for idp in idps)
+    assert cache.commitment(2, b"gold", aggr_vk) == aggr_vk[2][2] * helper.hash_attribute(b"gold")
+
+
+def test_domain_precomputation():
+    rp = RP(b"Domain")  # Created before the setup like in the servers
+    idps, openers, aggr_vk = setup_entities()
+    client, _ = issue_credential(idps, openers, aggr_vk)
+    proofs = [client.prove_id(rp.domain) for _ in range(2)]
+    assert proofs[0].user_id == proofs[1].user_id
+    assert client.prove_id(b"Other").user_id != proofs[0].user_id
+    assert all(rp.verify_id(proof, aggr_vk) for proof in proofs)
+    assert rp.domain_hash() is rp.domain_hash()
+    # A new group hashes the domain again
+    old_hash = rp.domain_hash()
+    BpGroupHelper.setup(3)
+    assert rp.domain_hash() is not old_hash and rp.domain_hash() == BpGroupHelper.G.hashG1(b"Domain")
+
+
+def test_ban_list_version():
+    ban_list = BanList()
+    changes = [lambda: ban_list.__setitem__(b"a", 1), lambda: ban_list.update({b"b": 2}), lambda: ban_list.pop(b"a"),
+               lambda: ban_list.__ior__({b"c": 3}), lambda: ban_list.setdefault(b"d", 4), lambda: ban_list.popitem(),
+               lambda: ban_list.__delitem__(b"b"), ban_list.clear]
+    for change in changes:
+        version = ban_list.version
+        change()
+        assert ban_list.version > version
+    ban_list |= {b"e": 5}
+    assert b"e" in ban_list and isinstance(ban_list, BanList) and ban_list.version == len(changes) + 1
+
+
+def test_verification_cache():
+    idps, openers, aggr_vk = setup_entities()
+    client, _ = issue_credential(idps, openers, aggr_vk)
+    now = [0]
+    cache = VerificationCache(size=2, ttl=10, clock=lambda: now[0])
+    rp = RP(b"Domain", verification_cache=cache)
+    proof = client.prove_id(rp.domain)
+    assert rp.verify_id(proof, aggr_vk) and rp.verify_id(CredProof.from_bytes(proof.to_bytes()), aggr_vk)
+    assert (cache.hits, cache.misses) == (1, 1) and cache.saved_time > 0
+    now[0] = 11  # Expired
+    assert rp.verify_id(proof, aggr_vk) and cache.misses == 2
+    # Banning the user drops the cached result
+    deanonymize(openers, proof, aggr_vk)
+    assert not rp.verify_id(proof, aggr_vk) and cache.misses == 3
+    assert not rp.verify_id(proof, aggr_vk) and cache.hits == 2
+
+
+def test_op_counter():
+    idps, openers, aggr_vk = setup_entities(count_ops=True)
+    client, request = issue_credential(idps, openers, aggr_vk)
+    rp = RP(b"Domain")
+    assert rp.verify_id(client.prove_id(rp.domain), aggr_vk)
+    report = BpGroupHelper.counter.report()
+    assert report["provide_id"]["calls"] == 3 and report["verify_id"]["calls"] == 1
+    assert report["verify_id"]["pairing"] >= 3 and report["verify_id"]["challenge"] == 1
+    assert report["request_id"]["hash_g1"] == 1 and report["request_id"]["g2_mul"] > 0
+    idps[0].provide_ids([request, request], aggr_vk)
+    report = BpGroupHelper.counter.report()
+    assert report["provide_ids"]["calls"] == 1 and report["provide_ids"]["pairing"] > 0
+    assert report["provide_id"]["calls"] == 3  # Not counted again inside the batch
+    # Off by default and the plain bplib functions are back
+    BpGroupHelper.setup(3)
+    assert BpGroupHelper.counter is None and BpGroupHelper.e == BpGroupHelper.G.pair
+
+
+def test_stage_timer():
+    idps, openers, aggr_vk = setup_entities()
+    client = Client(helper.sort_attributes(ATTRIBUTES), aggr_vk)
+    request = client.request_id(2, openers)
+    timer = BpGroupHelper.stage_timer = StageTimer()
+    try:
+        timer.begin()
+        with timer.stage("total"):
+            sig_prime = idps[0].provide_id(request, aggr_vk)
+        stages = timer.end()
+    finally:
+        BpGroupHelper.stage_timer = None
+    assert sig_prime != 0 and set(stages) == {"total", "zkp", "pairing", "sign"}
+    assert all(seconds > 0 for seconds in stages.values())
+    assert timer.end() == {}  # Outside of a request nothing is timed
+
+
+def test_servers_reject_bad_binary_request():
+    import server
+    import async_server
+    BpGroupHelper.stage_timer = None  # server.py times the stages of its requests
+    idps = setup_idps(1, 1)
+    aggr_vk = helper.agg_key([idp.vk for idp in idps])
+    client = Client(helper.sort_attributes(ATTRIBUTES), aggr_vk)
+    request = client.request_id(2, [Opener() for _ in range(3)])
+    request.zkp = (request.zkp[0] + 1,) + tuple(request.zkp[1:])  # Tamper with the challenge
+    headers = {"Content-Type": wire.CONTENT_TYPE, "Accept": wire.CONTENT_TYPE}
+    keys = json.dumps({"sk": helper.pack(idps[0].sk), "vk": helper.pack(idps[0].vk), "aggr_vk": helper.pack(aggr_vk)})
+
+    flask_client = server.app.test_client()
+    assert json.loads(flask_client.post("/idp/set", data=keys).data)["status"] == "OK"
+    response = flask_client.post("/idp/provideid", data=request.to_bytes(), headers=headers)
+    assert json.loads(response.data) == {"status": "Request Rejected"}
+    errors = server.metrics.report()["/idp/provideid"]["errors"]
+    assert errors == {"key_error": 0, "error": 0, "rejected": 1}
+
+    async_server.keys = None
+    content_type, answer = async_server.handle(async_server.provide_id_wrapper, request.to_bytes(), True, True)
+    assert json.loads(answer)["status"] == "ERROR"  # No keys yet
+    async_server.set_keys_wrapper(keys.encode(), False, False)
+    content_type, answer = async_server.handle(async_server.provide_id_wrapper, request.to_bytes(), True, True)
+    assert json.loads(answer) == {"status": "Request Rejected"}
+
+
+@pytest.mark.parametrize("threshold_opener, total_opener", [(3, 5), (16, 20)])
+def test_opener_threshold_above_two(threshold_opener, total_opener):
+    idps, openers, aggr_vk = setup_entities(total_opener=total_opener)
+    client = Client(helper.sort_attributes(ATTRIBUTES), aggr_vk)
+    request = client.request_id(threshold_opener, openers)
+    sigs_prime = [idp.provide_id(request, aggr_vk) for idp in idps]
+    assert 0 not in sigs_prime
+    client.agg_cred([client.unbind_sig(sig_prime) for sig_prime in sigs_prime])
+    assert client.verify_sig()
+    rp = RP(b"Domain")
+    proof = client.prove_id(rp.domain)
+    assert rp.verify_id(proof, aggr_vk)
+    assert deanonymize(openers, proof, aggr_vk) == request.user_id
+    assert not rp.verify_id(proof, aggr_vk)